@@ -0,0 +1,157 @@
+import json
+import logging
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from api.mesures import commencer, conserver_lente, instrumenter_connexions, mesures_en_cours, ms, terminer
+
+
+# ------------------------
+# Instrumentation des requêtes (Server-Timing)
+# ------------------------
+# Pour chaque requête : nombre et durée totale des requêtes SQL, requête la
+# plus lente, temps d'authentification, de sérialisation, de rendu JSON et
+# durée totale. Les mesures partent dans l'en-tête Server-Timing (visible
+# dans l'onglet réseau du navigateur) et dans une ligne JSON du logger
+# `terrabia.perf`. Les mesures elles-mêmes (SQL, segments) sont dans
+# api/mesures.py.
+#
+# Echantillonnage des requêtes lentes (PERF_LENTES_SEUIL_MS > 0) : pour une
+# fraction PERF_LENTES_TAUX des requêtes, le texte de chaque requête SQL est
+# conservé ; si la requête HTTP dépasse le seuil, elle est gardée avec ses
+# requêtes SQL dans un tampon circulaire de PERF_LENTES_MAX entrées, consultable
+# par le staff (/api/perf/lentes/). Sans échantillonnage, seuls deux compteurs
+# et la requête la plus lente sont tenus à jour par requête SQL.
+
+logger = logging.getLogger("terrabia.perf")
+
+
+class InstrumentationMiddleware:
+    """A placer en tête de MIDDLEWARE pour que `total` couvre toute la chaîne (WSGI ou ASGI)."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.connexions_instrumentees = False
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not getattr(settings, "PERF_INSTRUMENTATION", True):
+            return self.get_response(request)
+        instrumenter_connexions()
+        mesures, jeton = self.debut()
+        try:
+            response = self.get_response(request)
+        finally:
+            terminer(jeton)
+        return self.fin(request, response, mesures)
+
+    async def __acall__(self, request):
+        if not getattr(settings, "PERF_INSTRUMENTATION", True):
+            return await self.get_response(request)
+        if not self.connexions_instrumentees:
+            # Thread de l'ORM asynchrone : une fois, les connexions créées
+            # ensuite sont instrumentées par le signal connection_created
+            await sync_to_async(instrumenter_connexions)()
+            self.connexions_instrumentees = True
+        mesures, jeton = self.debut()
+        try:
+            response = await self.get_response(request)
+        finally:
+            terminer(jeton)
+        return self.fin(request, response, mesures)
+
+    @staticmethod
+    def debut():
+        seuil = getattr(settings, "PERF_LENTES_SEUIL_MS", 0)
+        return commencer(echantillon=seuil > 0 and random.random() < getattr(settings, "PERF_LENTES_TAUX", 1.0))
+
+    def fin(self, request, response, mesures):
+        total = time.perf_counter() - mesures.debut
+        seuil = getattr(settings, "PERF_LENTES_SEUIL_MS", 0) / 1000
+
+        if getattr(settings, "PERF_SERVER_TIMING", True):
+            response["Server-Timing"] = self.en_tete(mesures, total)
+        ligne = self.ligne(request, response, mesures, total)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({**ligne, "sql_max": ligne["sql_max"][:300]}, ensure_ascii=False))
+        if mesures.requetes is not None and total >= seuil:
+            ligne["requetes"] = [{"sql": sql, "ms": ms(duree)} for sql, duree in mesures.requetes]
+            conserver_lente(ligne)
+        return response
+
+    def process_template_response(self, request, response):
+        # Appelé juste avant response.render() (Response de DRF) : le rendu
+        # JSON est mesuré jusqu'au rappel post-rendu
+        mesures = mesures_en_cours()
+        if mesures is not None:
+            mesures.rendu_debut = time.perf_counter()
+            response.add_post_render_callback(
+                lambda rendue: mesures.ajouter("rendu", time.perf_counter() - mesures.rendu_debut)
+            )
+        return response
+
+    @staticmethod
+    def en_tete(mesures, total):
+        parties = [f'db;dur={ms(mesures.sql_duree)};desc="{mesures.sql_n} req"']
+        if mesures.sql_n:
+            parties.append(f"db-max;dur={ms(mesures.sql_max)}")
+        parties += [f"{segment};dur={ms(duree)}" for segment, duree in mesures.segments.items()]
+        parties.append(f"total;dur={ms(total)}")
+        return ", ".join(parties)
+
+    @staticmethod
+    def ligne(request, response, mesures, total):
+        utilisateur = getattr(request, "user", None)
+        return {
+            "methode": request.method,
+            "chemin": request.path,
+            "statut": response.status_code,
+            "utilisateur": getattr(utilisateur, "pk", None),
+            "total_ms": ms(total),
+            "sql_n": mesures.sql_n,
+            "sql_ms": ms(mesures.sql_duree),
+            "sql_max_ms": ms(mesures.sql_max),
+            "sql_max": mesures.sql_max_texte,
+            **{f"{segment}_ms": ms(duree) for segment, duree in mesures.segments.items()},
+        }
+
+
+# ------------------------
+# Fichiers statiques (WhiteNoise) sous WSGI et ASGI
+# ------------------------
+# WhiteNoiseMiddleware est synchrone : sous ASGI, Django ferait passer toute
+# la chaîne (et les vues asynchrones) par un thread à chaque requête. Seul le
+# service d'un fichier statique reste synchrone ici.
+
+class FichiersStatiquesMiddleware(WhiteNoiseMiddleware):
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings=settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            fichier = self.find_file(request.path_info)
+        else:
+            fichier = self.files.get(request.path_info)
+        if fichier is not None:
+            return self.serve(fichier, request)
+        return await self.get_response(request)
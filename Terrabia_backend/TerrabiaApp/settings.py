@@ -49,8 +49,11 @@ INSTALLED_APPS = [
 # 3. MIDDLEWARE
 # ----------------------------------------------------
 MIDDLEWARE = [
+    # En premier : mesure toute la chaîne (voir TerrabiaApp/middleware.py)
+    "TerrabiaApp.middleware.InstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
-    "whitenoise.middleware.WhiteNoiseMiddleware",
+    # WhiteNoise, utilisable sans thread sous ASGI
+    "TerrabiaApp.middleware.FichiersStatiquesMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -65,14 +68,92 @@ MIDDLEWARE = [
 # ----------------------------------------------------
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # JWTAuthentication avec l'utilisateur en cache (voir api.authentication)
+        'api.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DATE_INPUT_FORMATS': ['%d/%m/%Y'],
+    # Nombre de proxys devant l'application : l'IP client est lue dans
+    # X-Forwarded-For (limitation des connexions, api.throttling).
+    # Non défini : REMOTE_ADDR, l'en-tête pouvant être forgé par le client
+    'NUM_PROXIES': int(os.environ['API_NUM_PROXIES']) if os.environ.get('API_NUM_PROXIES') else None,
 }
 
+# Taille de page des listes paginées par curseur (api.pagination)
+API_PAGE_SIZE = int(os.environ.get('API_PAGE_SIZE', '50'))
+
+# Pagination par curseur activée par défaut sur les listes du catalogue.
+# A False, les clients reçoivent une liste brute tant qu'ils n'envoient
+# pas `cursor` ou `page_size` (compatibilité avec l'ancien frontend).
+API_CURSOR_PAGINATION_DEFAULT = os.environ.get('API_CURSOR_PAGINATION_DEFAULT', 'False') == 'True'
+
+# Listes produits / catégories / agences rendues sans ModelSerializer
+# (values() + conversion précompilée, sortie identique ; voir api.lecture).
+# `manage.py bench_lecture` mesure le gain.
+API_LECTURE_RAPIDE = os.environ.get('API_LECTURE_RAPIDE', 'False') == 'True'
+
+# Liste et détail des produits, catégories, agences et panier servis par des
+# vues asynchrones (ORM async, voir api.asynchrone). A activer quand l'API
+# tourne sous ASGI (uvicorn TerrabiaApp.asgi:application) ; sous WSGI chaque
+# requête paierait une boucle d'événements. `manage.py bench_asgi` compare.
+API_VUES_ASYNC = os.environ.get('API_VUES_ASYNC', 'False') == 'True'
+
+# ----------------------------------------------------
+# CACHES
+# ----------------------------------------------------
+# `catalogue` : réponses du catalogue et facettes (api.cache, api.facets).
+# `utilisateurs` : utilisateurs résolus depuis le JWT (api.authentication),
+# durée de vie courte (AUTH_UTILISATEUR_TTL secondes).
+# LocMem LRU borné pour un seul nœud ; définir CATALOGUE_CACHE_URL
+# (redis://...) pour partager ces caches entre plusieurs nœuds.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "catalogue": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CATALOGUE_CACHE_URL"],
+        "TIMEOUT": 600,
+    } if os.environ.get("CATALOGUE_CACHE_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "catalogue",
+        "TIMEOUT": 600,
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("CATALOGUE_CACHE_MAX_ENTRIES", "5000"))},
+    },
+    "utilisateurs": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ["CATALOGUE_CACHE_URL"],
+        "KEY_PREFIX": "utilisateurs",
+        "TIMEOUT": int(os.environ.get("AUTH_UTILISATEUR_TTL", "60")),
+    } if os.environ.get("CATALOGUE_CACHE_URL") else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "utilisateurs",
+        "TIMEOUT": int(os.environ.get("AUTH_UTILISATEUR_TTL", "60")),
+        "OPTIONS": {"MAX_ENTRIES": int(os.environ.get("AUTH_UTILISATEUR_MAX_ENTRIES", "10000"))},
+    },
+}
+
+# Limitation des connexions / inscriptions / jetons (api.throttling).
+# AUTH_LIMITES : (capacité du seau, jetons rechargés par minute) par IP et
+# par email. Au-delà de AUTH_ECHECS_TOLERES échecs consécutifs, blocage de
+# AUTH_BLOCAGE_BASE secondes doublé à chaque échec (max AUTH_BLOCAGE_MAX).
+# Backend "cache" (alias AUTH_LIMITE_CACHE) pour partager l'état entre nœuds.
+AUTH_LIMITE_BACKEND = os.environ.get(
+    'AUTH_LIMITE_BACKEND', 'cache' if os.environ.get('CATALOGUE_CACHE_URL') else 'memoire'
+)
+AUTH_LIMITE_CACHE = "utilisateurs"
+AUTH_LIMITES = {"ip": (20, 10), "email": (5, 5)}
+AUTH_ECHECS_TOLERES = {"ip": 50, "email": 3}
+AUTH_BLOCAGE_BASE = 1
+AUTH_BLOCAGE_MAX = 900
+
+# Facettes du catalogue (api.facets) : bornes des tranches de prix (FCFA)
+# et durée de vie des comptes en cache (secondes)
+CATALOGUE_TRANCHES_PRIX = [500, 1000, 5000, 10000]
+CATALOGUE_FACETTES_TTL = 300
+
 # ----------------------------------------------------
 # 5. SIMPLE JWT CONFIGURATION
 # ----------------------------------------------------
@@ -121,7 +202,9 @@ DATABASES = {
     "default": dj_database_url.config(
         default=os.getenv("DATABASE_URL", "postgresql://localhost/terrabia"),
         conn_max_age=600,
-        ssl_require=not DEBUG  # SSL seulement en production
+        # SSL seulement en production ; DATABASE_SSL_REQUIRE=False pour une base
+        # locale servie avec DEBUG=False (banc de charge, manage.py bench_charge)
+        ssl_require=os.environ.get('DATABASE_SSL_REQUIRE', str(not DEBUG)) == 'True'
     )
 }
 
@@ -172,6 +255,15 @@ STATICFILES_STORAGE = "whitenoise.storage.CompressedManifestStaticFilesStorage"
 MEDIA_URL = "/media/"
 MEDIA_ROOT = BASE_DIR / "media"
 
+# Dérivés WebP générés à l'envoi (api.images) : nom -> largeur maximale (px)
+IMAGES_TAILLES = {"miniature": 200, "moyenne": 600, "grande": 1280}
+IMAGES_QUALITE_WEBP = 80
+
+# Pool de threads des tâches d'arrière-plan (api.tasks).
+# TACHES_SYNCHRONES exécute les tâches dans la requête, après le commit (debug).
+TACHES_WORKERS = int(os.environ.get('TACHES_WORKERS', '2'))
+TACHES_SYNCHRONES = os.environ.get('TACHES_SYNCHRONES', 'False') == 'True'
+
 # ----------------------------------------------------
 # 12. CORS CONFIGURATION
 # ----------------------------------------------------
@@ -220,7 +312,8 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 # 14. SECURITY SETTINGS FOR PRODUCTION
 # ----------------------------------------------------
 if not DEBUG:
-    SECURE_SSL_REDIRECT = True
+    # Désactivable pour servir en HTTP local (banc de charge, manage.py bench_charge)
+    SECURE_SSL_REDIRECT = os.environ.get('SECURE_SSL_REDIRECT', 'True') == 'True'
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
     SECURE_BROWSER_XSS_FILTER = True
@@ -228,3 +321,36 @@ if not DEBUG:
     SECURE_HSTS_SECONDS = 31536000  # 1 year
     SECURE_HSTS_INCLUDE_SUBDOMAINS = True
     SECURE_HSTS_PRELOAD = True
+
+# ----------------------------------------------------
+# 15. INSTRUMENTATION ET LOGS
+# ----------------------------------------------------
+# Mesures par requête (SQL, auth, sérialisation, rendu, total) dans
+# l'en-tête Server-Timing et une ligne JSON du logger terrabia.perf
+PERF_INSTRUMENTATION = os.environ.get('PERF_INSTRUMENTATION', 'True') == 'True'
+PERF_SERVER_TIMING = os.environ.get('PERF_SERVER_TIMING', 'True') == 'True'
+# Requêtes lentes gardées avec leurs requêtes SQL (/api/perf/lentes/) :
+# seuil en ms (0 = désactivé), fraction des requêtes échantillonnées,
+# taille du tampon
+PERF_LENTES_SEUIL_MS = int(os.environ.get('PERF_LENTES_SEUIL_MS', '0'))
+PERF_LENTES_TAUX = float(os.environ.get('PERF_LENTES_TAUX', '1.0'))
+PERF_LENTES_MAX = int(os.environ.get('PERF_LENTES_MAX', '50'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'terrabia.perf': {
+            'handlers': ['console'],
+            'level': os.environ.get('PERF_LOG_NIVEAU', 'INFO'),
+            'propagate': False,
+        },
+        'api': {
+            'handlers': ['console'],
+            'level': os.environ.get('API_LOG_NIVEAU', 'INFO'),
+        },
+    },
+}
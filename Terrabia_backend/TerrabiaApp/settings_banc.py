@@ -0,0 +1,33 @@
+"""
+Réglages du serveur lancé par le banc de charge (manage.py bench_asgi,
+bench_charge) : ceux du projet, plus une attente ajoutée à chaque requête
+SQL pour simuler l'aller-retour réseau d'une base distante avec SQLite en
+local (bench_asgi --latence-sql, BANC_LATENCE_SQL_MS en ms). Jamais en
+production.
+"""
+
+import os
+import time
+
+from django.db.backends.signals import connection_created
+
+from .settings import *  # noqa: F401,F403
+
+BANC_LATENCE_SQL_MS = float(os.environ.get('BANC_LATENCE_SQL_MS', '0'))
+
+
+def latence_sql(execute, sql, params, many, context):
+    time.sleep(BANC_LATENCE_SQL_MS / 1000)
+    return execute(sql, params, many, context)
+
+
+def ralentir(sender, connection, **kwargs):
+    from api.mesures import instrumenter
+
+    # Après mesurer_sql : l'attente est comptée dans la durée SQL
+    instrumenter(connection)
+    connection.execute_wrappers.append(latence_sql)
+
+
+if BANC_LATENCE_SQL_MS:
+    connection_created.connect(ralentir)
@@ -26,10 +26,12 @@ urlpatterns = [
     # Routes de ton app API
     path("", include("api.urls")),
 ]
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.views import TokenRefreshView
+from api.views import TokenObtainView
 
 urlpatterns += [
-    path("api/token/", TokenObtainPairView.as_view(), name="token_obtain_pair"),
+    # Limité par IP et par email comme /api/login/ (api/throttling.py)
+    path("api/token/", TokenObtainView.as_view(), name="token_obtain_pair"),
     path("api/token/refresh/", TokenRefreshView.as_view(), name="token_refresh"),
 ]
 
@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
+
+
+def installer_index_recherche(sender, using, **kwargs):
+    from django.db import connections
+    from .search import installer_index_sqlite
+
+    installer_index_sqlite(connections[using])
 
 
 class ApiConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        post_migrate.connect(installer_index_recherche, sender=self)
@@ -0,0 +1,310 @@
+import logging
+
+from asgiref.sync import sync_to_async
+from django.core.exceptions import ObjectDoesNotExist, SynchronousOnlyOperation
+from django.db import connection
+from django.db.models import Count, Max, aprefetch_related_objects
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.renderers import JSONRenderer
+
+from . import views
+from .cache import CatalogueCacheMixin, acle_reponse, get_cache, stats
+from .conditional import ConditionalGetMixin, valider, validateurs
+from .fieldsets import objets_etendus
+from .lecture import LectureRapideMixin, convertisseur, lignes_du_plan
+from .mesures import chrono
+from .models import Panier
+from .search import fts5_disponible
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------
+# Vues de lecture asynchrones (API_VUES_ASYNC, sous ASGI)
+# ------------------------
+# Sous ASGI, une vue synchrone occupe un thread du serveur pendant toute la
+# requête. Les lectures les plus fréquentes (liste et détail des produits,
+# catégories, agences, panier de l'utilisateur) sont servies ici avec l'ORM
+# asynchrone : la boucle d'événements reste libre pendant l'attente de la
+# base et des clients lents.
+#
+# Les vues réutilisent le viewset DRF d'origine (queryset, filtres,
+# pagination, permissions, serializers, lecture rapide, cache du catalogue,
+# GET conditionnels) sans exécuter son dispatch : mêmes octets, mêmes
+# en-têtes, mêmes entrées de cache. Tout ce qui sort du chemin nominal
+# (écriture, jeton absent ou refusé, rendu HTML, paramètre invalide,
+# objet introuvable) est confié à la vue DRF synchrone, dans un thread.
+#
+# L'ORM asynchrone de Django exécute encore les requêtes SQL dans un thread
+# unique par connexion : le gain porte sur le nombre de connexions
+# simultanées qu'un processus tient, pas sur le débit SQL.
+
+
+class Repli(Exception):
+    """Requête laissée à la vue DRF synchrone."""
+
+    def __init__(self, limite_verifiee=False):
+        super().__init__()
+        # Débit déjà compté par check_throttles : la vue DRF ne le recompte pas
+        self.limite_verifiee = limite_verifiee
+
+
+def sans_limitation(repli):
+    """La vue DRF `repli`, sans throttle_classes."""
+    initkwargs = {**repli.initkwargs, "throttle_classes": ()}
+    actions = getattr(repli, "actions", None)
+    if actions is not None:
+        return repli.cls.as_view(actions, **initkwargs)
+    return repli.cls.as_view(**initkwargs)
+
+
+def vue_asynchrone(lecture, repli):
+    """
+    Vue Django asynchrone : les GET / HEAD passent par `lecture(vue, request,
+    **kwargs)`, le reste (et toute Repli) par la vue DRF `repli`.
+    """
+    repli_async = sync_to_async(repli)
+    repli_sans_limitation = sync_to_async(sans_limitation(repli))
+
+    # Les écritures déléguées à `repli` gardent leur propre contrôle CSRF (DRF)
+    @csrf_exempt
+    async def vue(request, **kwargs):
+        if request.method in ("GET", "HEAD"):
+            try:
+                return await servir(lecture, repli, request, kwargs)
+            except Repli as e:
+                if e.limite_verifiee:
+                    return await repli_sans_limitation(request, **kwargs)
+        return await repli_async(request, **kwargs)
+
+    return vue
+
+
+def instancier(repli, request, kwargs):
+    """Vue DRF de `repli` initialisée comme par as_view() puis APIView.dispatch()."""
+    vue = repli.cls(**repli.initkwargs)
+    actions = getattr(repli, "actions", None)
+    if actions is not None:
+        actions = {**actions, "head": actions["get"]} if "head" not in actions else actions
+        vue.action_map = actions
+        for methode, action in actions.items():
+            setattr(vue, methode, getattr(vue, action))
+    vue.setup(request, **kwargs)
+    vue.request = vue.initialize_request(request, **kwargs)
+    vue.headers = vue.default_response_headers
+    vue.format_kwarg = vue.get_format_suffix(**kwargs)
+    return vue
+
+
+async def servir(lecture, repli, django_request, kwargs):
+    vue = instancier(repli, django_request, kwargs)
+    request = vue.request
+    limite_verifiee = False
+    try:
+        # APIView.initial(), authentification asynchrone comprise
+        renderer, media_type = vue.perform_content_negotiation(request)
+        if type(renderer) is not JSONRenderer:
+            raise Repli
+        request.accepted_renderer, request.accepted_media_type = renderer, media_type
+        request.version, request.versioning_scheme = vue.determine_version(request, **kwargs)
+        await authentifier(request)
+        vue.check_permissions(request)
+        vue.check_throttles(request)
+        limite_verifiee = True
+
+        response = await lecture(vue, request, **kwargs)
+    except (Repli, APIException, ObjectDoesNotExist, ValueError):
+        # Réponse d'erreur construite par la vue DRF
+        raise Repli(limite_verifiee)
+    except SynchronousOnlyOperation:
+        # Accès paresseux à la base non préchargé : la vue synchrone sait le servir
+        logger.warning("Lecture synchrone dans %s, repli sur la vue DRF", django_request.path)
+        raise Repli(limite_verifiee)
+    return finaliser(vue, response)
+
+
+async def authentifier(request):
+    for authenticator in request.authenticators:
+        if not hasattr(authenticator, "aauthenticate"):
+            raise Repli
+        identite = await authenticator.aauthenticate(request)
+        if identite is not None:
+            request._authenticator = authenticator
+            request.user, request.auth = identite
+            return
+    # Anonyme : la vue DRF répond (401, ou contenu public)
+    raise Repli
+
+
+def rendre(vue, request, data):
+    with chrono("rendu"):
+        contenu = request.accepted_renderer.render(data, request.accepted_media_type, vue.get_renderer_context())
+    return HttpResponse(contenu, content_type=request.accepted_renderer.media_type)
+
+
+def finaliser(vue, response):
+    # En-têtes de APIView.finalize_response (Allow, Vary)
+    en_tetes = dict(vue.headers)
+    vary = en_tetes.pop("Vary", None)
+    if vary is not None:
+        patch_vary_headers(response, [valeur.strip() for valeur in vary.split(",")])
+    for cle, valeur in en_tetes.items():
+        response[cle] = valeur
+    return response
+
+
+# ------------------------
+# GET conditionnels et cache du catalogue
+# ------------------------
+
+async def repondre(vue, request, validation, etiquettes, calcul):
+    """
+    ConditionalGetMixin puis CatalogueCacheMixin puis `calcul()`, selon les
+    mixins du viewset. `validation()` renvoie (dernière modification, total).
+    """
+    if objets_etendus(request):
+        # Objets liés hors des validateurs et des étiquettes du cache
+        return rendre(vue, request, await calcul())
+
+    etag = last_modified = None
+    if isinstance(vue, ConditionalGetMixin):
+        etag, last_modified = validateurs(request, *await validation())
+        non_modifie = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if non_modifie is not None:
+            return non_modifie
+
+    if isinstance(vue, CatalogueCacheMixin):
+        cache = get_cache()
+        cle = await acle_reponse(request, etiquettes)
+        data = await cache.aget(cle)
+        if data is not None:
+            stats.incr("hits")
+        else:
+            stats.incr("misses")
+            data = await calcul()
+            await cache.aset(cle, data, vue.cache_timeout)
+    else:
+        data = await calcul()
+
+    response = rendre(vue, request, data)
+    if etag is not None:
+        valider(response, etag, last_modified)
+    return response
+
+
+async def preparer_recherche(request):
+    # Sonde FTS5 (api.search) faite hors de la boucle, une fois par connexion
+    if "q" in request.query_params and connection.vendor == "sqlite":
+        await sync_to_async(fts5_disponible)(connection)
+
+
+# ------------------------
+# Liste et détail d'un viewset
+# ------------------------
+
+async def lire_liste(vue, request):
+    await preparer_recherche(request)
+
+    async def validation():
+        queryset = vue.filter_queryset(vue.get_queryset()).order_by()
+        agregat = await queryset.aaggregate(derniere=Max("updated_at"), total=Count("id"))
+        return agregat["derniere"], agregat["total"]
+
+    return await repondre(vue, request, validation, [getattr(vue, "cache_etiquette", None)], lambda: donnees_liste(vue, request))
+
+
+async def donnees_liste(vue, request):
+    queryset = vue.filter_queryset(vue.get_queryset())
+    plan = vue.plan_rapide(request, queryset.model) if isinstance(vue, LectureRapideMixin) else None
+
+    if plan is not None:
+        lignes = lignes_du_plan(queryset.prefetch_related(None), plan)
+        page = await paginer(vue, request, lignes)
+        lignes = [ligne async for ligne in lignes] if page is None else page
+        convertir = convertisseur(plan, await vue.arendus_speciaux(request, lignes))
+        with chrono("serialisation"):
+            data = [convertir(ligne) for ligne in lignes]
+    else:
+        # async for charge aussi les prefetch_related (dans le thread de l'ORM)
+        page = await paginer(vue, request, queryset)
+        objets = [objet async for objet in queryset] if page is None else page
+        data = vue.get_serializer(objets, many=True).data
+
+    if page is not None:
+        return vue.get_paginated_response(data).data
+    return data
+
+
+async def paginer(vue, request, queryset):
+    if vue.paginator is None:
+        return None
+    if not hasattr(vue.paginator, "apaginate_queryset"):
+        raise Repli
+    return await vue.paginator.apaginate_queryset(queryset, request, view=vue)
+
+
+async def lire_detail(vue, request, pk):
+    async def validation():
+        derniere = await vue.get_queryset().filter(pk=pk).values_list("updated_at", flat=True).afirst()
+        if derniere is None:
+            # Introuvable : 404 de la vue DRF
+            raise Repli
+        return derniere, 1
+
+    async def calcul():
+        objet = await vue.filter_queryset(vue.get_queryset()).aget(pk=pk)
+        vue.check_object_permissions(request, objet)
+        return vue.get_serializer(objet).data
+
+    return await repondre(vue, request, validation, [f"{getattr(vue, 'cache_prefixe', None)}:{pk}"], calcul)
+
+
+# ------------------------
+# Panier de l'utilisateur (views.get_panier_utilisateur)
+# ------------------------
+
+async def lire_panier(vue, request):
+    try:
+        panier = await Panier.objects.filter(acheteur=request.user, statut="EN_COURS").afirst()
+        if panier is None:
+            data = {
+                "success": True,
+                "message": "Panier vide",
+                "panier_id": None,
+                "items": [],
+                "total": 0,
+                "count": 0
+            }
+        else:
+            await aprefetch_related_objects([panier], views.PANIER_ITEMS_PREFETCH)
+            data = views.contenu_panier(panier)
+    except Exception:
+        # La vue synchrone construit la réponse d'erreur (400)
+        raise Repli
+    return rendre(vue, request, data)
+
+
+# ------------------------
+# Vues exposées (api/urls.py)
+# ------------------------
+
+produits = vue_asynchrone(
+    lire_liste, views.ProduitViewSet.as_view({"get": "list", "post": "create"}, basename="produit", detail=False, suffix="List"),
+)
+produit = vue_asynchrone(
+    lire_detail,
+    views.ProduitViewSet.as_view(
+        {"get": "retrieve", "put": "update", "patch": "partial_update", "delete": "destroy"},
+        basename="produit", detail=True, suffix="Instance",
+    ),
+)
+categories = vue_asynchrone(
+    lire_liste, views.CategorieViewSet.as_view({"get": "list", "post": "create"}, basename="categorie", detail=False, suffix="List"),
+)
+agences = vue_asynchrone(
+    lire_liste, views.AgenceLivraisonViewSet.as_view({"get": "list", "post": "create"}, basename="agence", detail=False, suffix="List"),
+)
+panier_utilisateur = vue_asynchrone(lire_panier, views.get_panier_utilisateur)
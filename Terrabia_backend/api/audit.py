@@ -0,0 +1,213 @@
+import json
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from .models import Categorie, Panier, Produit, User
+
+
+# ------------------------
+# Audit des plans de requête (`manage.py query_audit`)
+# ------------------------
+# Chaque scénario appelle un endpoint de l'API sur la base courante (peuplée),
+# dans une transaction annulée à la fin, et capture les requêtes SQL émises.
+# Chaque SELECT / UPDATE / DELETE est ensuite passé à EXPLAIN (EXPLAIN QUERY
+# PLAN sous SQLite, EXPLAIN (FORMAT JSON) sous Postgres) pour signaler :
+#   - les parcours séquentiels d'une table d'au moins `seuil` lignes
+#   - les tris sans index (table temporaire / nœud Sort) sur ces tables
+# S'y ajoute un contrôle statique : les clés étrangères qu'aucun index ne
+# couvre en première colonne (jointures et suppressions en cascade).
+
+# (nom, méthode, url, données, utilisateur) ; {…} remplacé par references()
+SCENARIOS = [
+    ("categories", "get", "/api/categories/", None, "acheteur"),
+    ("produits", "get", "/api/produits/?page_size=50", None, "acheteur"),
+    ("produits par categorie, prix", "get", "/api/produits/?categorie={categorie}&ordering=prix&page_size=50", None, "acheteur"),
+    ("produits par prix", "get", "/api/produits/?ordering=-prix&page_size=50", None, "acheteur"),
+    ("produits d'un agriculteur", "get", "/api/produits/?agriculteur={agriculteur}&page_size=50", None, "acheteur"),
+    ("recherche", "get", "/api/produits/?q={mot}&page_size=50", None, "acheteur"),
+    ("facettes", "get", "/api/produits/facets/?categorie={categorie}", None, "acheteur"),
+    ("produit", "get", "/api/produits/{produit}/", None, "acheteur"),
+    ("photos", "get", "/api/photos/", None, "acheteur"),
+    ("avis", "get", "/api/avis/?page_size=50", None, "acheteur"),
+    ("agriculteurs", "get", "/api/agriculteurs/?page_size=50", None, "acheteur"),
+    ("agences", "get", "/api/agences/", None, "acheteur"),
+    ("paniers", "get", "/api/paniers/", None, "acheteur"),
+    ("lignes de panier", "get", "/api/items/", None, "acheteur"),
+    ("panier utilisateur", "get", "/api/panier/utilisateur/", None, "acheteur"),
+    ("ajout au panier", "post", "/api/panier/ajouter/", {"produit": "{produit}", "quantite": 1}, "acheteur"),
+    ("panier par lot", "post", "/api/panier/batch/", {"operations": [{"produit": "{produit}", "op": "add"}]}, "acheteur"),
+    ("commande", "post", "/api/commandes/", {}, "acheteur"),
+]
+
+EXPLICABLES = ("SELECT", "UPDATE", "DELETE")
+
+
+def references():
+    """Identifiants réels utilisés dans les URL des scénarios (None si la base est vide)."""
+    produit = Produit.objects.order_by("id").values("id", "nom", "categorie_id", "agriculteur_id").first()
+    if produit is None or not Categorie.objects.exists():
+        return None
+    acheteur_id = (
+        Panier.objects.filter(statut="EN_COURS").order_by("-nb_articles").values_list("acheteur_id", flat=True).first()
+        or User.objects.filter(role="ACHETEUR").values_list("id", flat=True).first()
+        or produit["agriculteur_id"]
+    )
+    return {
+        "produit": produit["id"],
+        "categorie": produit["categorie_id"],
+        "agriculteur": produit["agriculteur_id"],
+        "mot": produit["nom"].split()[0],
+        "utilisateurs": {"acheteur": User.objects.get(pk=acheteur_id)},
+    }
+
+
+def remplir(valeur, refs):
+    if isinstance(valeur, str):
+        texte = valeur.format(**refs)
+        return int(texte) if texte.isdigit() and valeur != texte else texte
+    if isinstance(valeur, dict):
+        return {cle: remplir(v, refs) for cle, v in valeur.items()}
+    if isinstance(valeur, list):
+        return [remplir(v, refs) for v in valeur]
+    return valeur
+
+
+def normaliser(sql):
+    """Forme de la requête sans les valeurs, pour ne l'expliquer qu'une fois."""
+    return re.sub(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b", "?", sql)
+
+
+# ------------------------
+# Plans
+# ------------------------
+
+def expliquer(sql):
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+            plan = cursor.fetchone()[0]
+            return json.loads(plan) if isinstance(plan, str) else plan
+        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+        return [ligne[-1] for ligne in cursor.fetchall()]
+
+
+def noeuds_postgres(noeud):
+    yield noeud
+    for enfant in noeud.get("Plans", ()):
+        yield from noeuds_postgres(enfant)
+
+
+def constats_plan(sql, plan, taille, seuil):
+    """[(type, table, détail)] ; `taille(table)` donne le nombre de lignes d'une table."""
+    constats = []
+    if connection.vendor == "postgresql":
+        for noeud in noeuds_postgres(plan[0]["Plan"]):
+            if noeud["Node Type"] == "Seq Scan" and taille(noeud["Relation Name"]) >= seuil:
+                constats.append(("parcours séquentiel", noeud["Relation Name"], noeud.get("Filter", "")))
+            elif noeud["Node Type"] == "Sort" and noeud.get("Plan Rows", 0) >= seuil:
+                constats.append(("tri sans index", "", ", ".join(noeud.get("Sort Key", ()))))
+        return constats
+
+    # Sans WHERE, un SCAN suivi d'un LIMIT sans table temporaire parcourt la
+    # table dans l'ordre de sa clé et s'arrête après quelques lignes
+    borne = " LIMIT " in sql and " WHERE " not in sql and not any(d.startswith("USE TEMP B-TREE") for d in plan)
+    tables = []
+    for detail in plan:
+        trouve = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)", detail)
+        if trouve:
+            tables.append(trouve.group(2))
+            # "SCAN t USING [COVERING] INDEX" parcourt un index, pas la table ;
+            # une table virtuelle (plein texte) utilise son propre index
+            sequentiel = trouve.group(1) == "SCAN" and "USING" not in detail and "VIRTUAL TABLE" not in detail
+            if sequentiel and not borne and taille(trouve.group(2)) >= seuil:
+                constats.append(("parcours séquentiel", trouve.group(2), detail))
+        elif detail.startswith("USE TEMP B-TREE") and any(taille(table) >= seuil for table in tables):
+            constats.append(("tri sans index", "", detail))
+    return constats
+
+
+# ------------------------
+# Index des clés étrangères
+# ------------------------
+
+def cles_etrangeres_sans_index():
+    """[(table, colonne)] des clés étrangères des modèles de `api` sans index qui commence par elles."""
+    manquants = []
+    with connection.cursor() as cursor:
+        for model in apps.get_app_config("api").get_models():
+            table = model._meta.db_table
+            contraintes = connection.introspection.get_constraints(cursor, table).values()
+            premieres = {c["columns"][0] for c in contraintes if c["columns"] and (c["index"] or c["unique"] or c["primary_key"])}
+            for field in model._meta.concrete_fields:
+                if field.is_relation and field.column not in premieres:
+                    manquants.append((table, field.column))
+    return manquants
+
+
+# ------------------------
+# Rejeu
+# ------------------------
+
+def auditer(seuil=1000, noms=None):
+    """
+    Rejoue les scénarios et renvoie le rapport
+    {"moteur", "seuil", "scenarios": [...], "cles_sans_index": [...]}.
+    """
+    tailles = {}
+
+    def taille(table):
+        if table not in tailles:
+            try:
+                with transaction.atomic(), connection.cursor() as cursor:
+                    cursor.execute(f"SELECT COUNT(*) FROM {connection.ops.quote_name(table)}")
+                    tailles[table] = cursor.fetchone()[0]
+            except Exception:
+                # Sous-requête, CTE... : pas une table
+                tailles[table] = -1
+        return tailles[table]
+
+    rapport = {"moteur": connection.vendor, "seuil": seuil, "scenarios": [], "cles_sans_index": []}
+    # Pas de cache : chaque endpoint émet réellement ses requêtes
+    sans_cache = {alias: {"BACKEND": "django.core.cache.backends.dummy.DummyCache"} for alias in settings.CACHES}
+    hotes = [*settings.ALLOWED_HOSTS, "testserver"]
+    with override_settings(CACHES=sans_cache, ALLOWED_HOSTS=hotes), transaction.atomic():
+        refs = references()
+        if refs is None:
+            raise ValueError("Base vide : peupler la base avant l'audit (produits et catégories).")
+        client = APIClient()
+        for nom, methode, url, donnees, utilisateur in SCENARIOS:
+            if noms and nom not in noms:
+                continue
+            client.force_authenticate(refs["utilisateurs"][utilisateur])
+            url = url.format(**refs)
+            with transaction.atomic(), CaptureQueriesContext(connection) as capture:
+                response = getattr(client, methode)(url, remplir(donnees, refs), format="json")
+                requetes = list(capture.captured_queries)
+                transaction.set_rollback(True)
+
+            vues, resultats = set(), []
+            for requete in requetes:
+                sql = requete["sql"]
+                forme = normaliser(sql)
+                if not sql.lstrip().upper().startswith(EXPLICABLES) or forme in vues:
+                    continue
+                vues.add(forme)
+                constats = constats_plan(sql, expliquer(sql), taille, seuil)
+                if constats:
+                    resultats.append({"sql": sql, "constats": constats})
+            rapport["scenarios"].append({
+                "nom": nom,
+                "requete": f"{methode.upper()} {url}",
+                "statut": response.status_code,
+                "nb_requetes": len(requetes),
+                "problemes": resultats,
+            })
+        rapport["cles_sans_index"] = cles_etrangeres_sans_index()
+        transaction.set_rollback(True)
+    return rapport
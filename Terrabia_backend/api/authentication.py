@@ -0,0 +1,108 @@
+from asgiref.sync import sync_to_async
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .mesures import chrono
+
+
+# ------------------------
+# Authentification JWT avec utilisateur en cache
+# ------------------------
+# JWTAuthentication relit l'utilisateur en base à chaque requête. On garde
+# ici (id, email, role, is_active, is_staff) par user_id dans le cache
+# `utilisateurs` (TTL court, taille bornée). L'entrée est supprimée à chaque
+# save/delete de User (api/signals.py) : une désactivation par l'admin ou le
+# modèle s'applique à la requête suivante. Un UPDATE en masse (sans signal)
+# s'applique au plus tard à l'expiration de l'entrée.
+#
+# L'utilisateur reconstruit a ses autres champs (mot de passe, last_login...)
+# différés : ils sont lus en base seulement si on y accède, et un save() ne
+# réécrit que les champs chargés.
+
+CHAMPS = ("id", "email", "role", "is_active", "is_staff")
+
+
+def get_cache():
+    return caches["utilisateurs"]
+
+
+def cle_utilisateur(user_id):
+    return f"utilisateur:{user_id}"
+
+
+def invalider_utilisateur(user_id):
+    get_cache().delete(cle_utilisateur(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        # Segment `auth` de Server-Timing (api/mesures.py)
+        with chrono("auth"):
+            return super().authenticate(request)
+
+    def get_user(self, validated_token):
+        # La vérification du hash de mot de passe a besoin de la ligne complète
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != "id":
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = get_cache()
+        cle = cle_utilisateur(user_id)
+        valeurs = cache.get(cle)
+        if valeurs is None:
+            valeurs = self.user_model.objects.filter(id=user_id).values_list(*CHAMPS).first()
+            if valeurs is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(cle, valeurs)
+        return self.reconstruire(valeurs)
+
+    # Vues asynchrones (api.asynchrone) : même jeton, même cache
+
+    async def aauthenticate(self, request):
+        with chrono("auth"):
+            header = self.get_header(request)
+            if header is None:
+                return None
+            raw_token = self.get_raw_token(header)
+            if raw_token is None:
+                return None
+            validated_token = self.get_validated_token(raw_token)
+            return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if api_settings.CHECK_REVOKE_TOKEN or api_settings.USER_ID_FIELD != "id":
+            return await sync_to_async(super().get_user)(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = get_cache()
+        cle = cle_utilisateur(user_id)
+        valeurs = await cache.aget(cle)
+        if valeurs is None:
+            valeurs = await self.user_model.objects.filter(id=user_id).values_list(*CHAMPS).afirst()
+            if valeurs is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            await cache.aset(cle, valeurs)
+        return self.reconstruire(valeurs)
+
+    def reconstruire(self, valeurs):
+        user = self.user_model.from_db(DEFAULT_DB_ALIAS, CHAMPS, self.dans_l_ordre(valeurs))
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        return user
+
+    def dans_l_ordre(self, valeurs):
+        # from_db attend les valeurs dans l'ordre des colonnes du modèle
+        par_champ = dict(zip(CHAMPS, valeurs))
+        return [par_champ[champ.attname] for champ in self.user_model._meta.concrete_fields if champ.attname in par_champ]
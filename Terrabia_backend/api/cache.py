@@ -0,0 +1,137 @@
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from rest_framework.response import Response
+
+from .fieldsets import objets_etendus
+
+
+# ------------------------
+# Cache de réponses du catalogue
+# ------------------------
+# Les réponses GET de list/retrieve sont mises en cache dans l'alias
+# `catalogue` de CACHES (LocMem LRU borné par défaut, Redis si
+# CATALOGUE_CACHE_URL est défini). Chaque entrée dépend d'étiquettes
+# ("produits", "produit:12", ...) dont la version fait partie de la clé :
+# invalider une étiquette rend inaccessibles exactement les entrées
+# concernées, sans parcourir le cache. Les signaux (api/signals.py)
+# invalident les étiquettes quand Produit, ProduitPhoto ou Categorie changent.
+# Les réponses avec ?expand= embarquent d'autres lignes (catégorie,
+# agriculteur) que ces étiquettes ne suivent pas : elles ne sont pas mises en cache.
+
+def get_cache():
+    return caches["catalogue"]
+
+
+class CacheStats:
+    """Compteurs du processus courant (exposés par /api/cache/stats/)."""
+
+    def __init__(self, noms=("hits", "misses", "invalidations")):
+        self._lock = threading.Lock()
+        self.noms = noms
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.compteurs = dict.fromkeys(self.noms, 0)
+
+    def incr(self, nom, n=1):
+        with self._lock:
+            self.compteurs[nom] += n
+
+    def as_dict(self):
+        with self._lock:
+            return dict(self.compteurs)
+
+
+stats = CacheStats()
+
+
+def versions_etiquettes(etiquettes):
+    cache = get_cache()
+    cles = [f"tag:{etiquette}" for etiquette in etiquettes]
+    versions = cache.get_many(cles)
+    manquantes = {cle: time.time_ns() for cle in cles if cle not in versions}
+    if manquantes:
+        cache.set_many(manquantes, None)
+        versions.update(manquantes)
+    return [versions[cle] for cle in cles]
+
+
+async def aversions_etiquettes(etiquettes):
+    cache = get_cache()
+    cles = [f"tag:{etiquette}" for etiquette in etiquettes]
+    versions = await cache.aget_many(cles)
+    manquantes = {cle: time.time_ns() for cle in cles if cle not in versions}
+    if manquantes:
+        await cache.aset_many(manquantes, None)
+        versions.update(manquantes)
+    return [versions[cle] for cle in cles]
+
+
+def invalider(*etiquettes):
+    cache = get_cache()
+    for etiquette in etiquettes:
+        try:
+            cache.incr(f"tag:{etiquette}")
+        except ValueError:
+            # Etiquette jamais utilisée ou expulsée : aucune entrée à invalider
+            continue
+        stats.incr("invalidations")
+
+
+def cle_reponse(request, etiquettes):
+    """
+    Clé construite à partir de l'URL (les images sont sérialisées en URL
+    absolues, donc l'hôte compte), des paramètres et de la portée d'authentification.
+    """
+    return cle_versionnee(request, versions_etiquettes(etiquettes))
+
+
+async def acle_reponse(request, etiquettes):
+    """cle_reponse pour les vues asynchrones (mêmes clés : les entrées sont partagées)."""
+    return cle_versionnee(request, await aversions_etiquettes(etiquettes))
+
+
+def cle_versionnee(request, versions):
+    user = request.user
+    portee = getattr(user, "role", "AUTH") if user.is_authenticated else "ANONYME"
+    params = sorted((cle, sorted(valeurs)) for cle, valeurs in request.query_params.lists())
+    brut = repr((request.build_absolute_uri(request.path), params, portee, versions))
+    return "reponse:" + hashlib.sha1(brut.encode()).hexdigest()
+
+
+class CatalogueCacheMixin:
+    """
+    Met en cache les réponses de list/retrieve d'un ModelViewSet.
+    `cache_etiquette` nomme la liste ; le détail dépend de `<cache_prefixe>:<pk>`.
+    """
+    cache_etiquette = None
+    cache_prefixe = None
+    cache_timeout = DEFAULT_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.reponse_en_cache(request, [self.cache_etiquette], super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        etiquette = f"{self.cache_prefixe}:{kwargs[self.lookup_url_kwarg or self.lookup_field]}"
+        return self.reponse_en_cache(request, [etiquette], super().retrieve, *args, **kwargs)
+
+    def reponse_en_cache(self, request, etiquettes, vue, *args, **kwargs):
+        if objets_etendus(request):
+            return vue(request, *args, **kwargs)
+        cache = get_cache()
+        cle = cle_reponse(request, etiquettes)
+        en_cache = cache.get(cle)
+        if en_cache is not None:
+            stats.incr("hits")
+            return Response(en_cache)
+
+        stats.incr("misses")
+        response = vue(request, *args, **kwargs)
+        if response.status_code == 200:
+            cache.set(cle, response.data, self.cache_timeout)
+        return response
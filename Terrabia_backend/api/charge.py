@@ -0,0 +1,497 @@
+import http.client
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.utils import timezone
+
+
+# ------------------------
+# Banc de charge HTTP (`manage.py bench_charge`)
+# ------------------------
+# Des utilisateurs virtuels (un thread et une connexion keep-alive chacun)
+# enchaînent des parcours sur un serveur déjà démarré :
+#   - acheteur : connexion, navigation (liste, catégorie, recherche, fiche
+#     produit), ajout au panier, consultation du panier, commande
+#   - agriculteur : connexion, ses produits, annuaire, mise en vente
+# Comptes et mot de passe : ceux générés par `seed_terrabia --seed GRAINE_JEU`.
+# Chaque utilisateur virtuel envoie sa propre adresse dans X-Forwarded-For
+# (serveur lancé avec API_NUM_PROXIES=1) pour ne pas partager le seau de
+# connexions d'une seule IP (api.throttling).
+#
+# Par endpoint : req/s, statuts, percentiles de latence, et requêtes SQL par
+# requête lues dans l'en-tête Server-Timing (TerrabiaApp.middleware). Les
+# requêtes de la période d'échauffement ne sont pas comptées.
+
+GRAINE_JEU = 42
+MOT_DE_PASSE = "bench-terrabia"
+PERCENTILES = (50, 90, 95, 99)
+
+
+def percentile(valeurs_triees, p):
+    if not valeurs_triees:
+        return 0.0
+    rang = max(0, min(len(valeurs_triees) - 1, round(p / 100 * len(valeurs_triees) + 0.5) - 1))
+    return valeurs_triees[rang]
+
+
+def sql_de(server_timing):
+    """(nombre de requêtes SQL, durée SQL en ms) de l'en-tête Server-Timing ; (None, None) s'il manque."""
+    trouve = re.search(r'db;dur=([\d.]+);desc="(\d+) req"', server_timing or "")
+    if not trouve:
+        return None, None
+    return int(trouve.group(2)), float(trouve.group(1))
+
+
+def email_acheteur(i):
+    return f"client{i}.s{GRAINE_JEU}@seed.terrabia.local"
+
+
+def email_agriculteur(i):
+    return f"agri{i}.s{GRAINE_JEU}@seed.terrabia.local"
+
+
+def adresse(i):
+    """Adresse X-Forwarded-For du i-ème utilisateur virtuel."""
+    return f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"
+
+
+# ------------------------
+# Base et serveur du banc (bench_charge, bench_asgi)
+# ------------------------
+
+def port_libre():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def preparer_base(produits, acheteurs, agriculteurs, regenerer=False, journal=print):
+    """URL d'une copie neuve de la base SQLite du banc, générée par seed_terrabia au premier appel."""
+    jeu = f"{produits}p-{acheteurs}a-{agriculteurs}f"
+    modele = Path(tempfile.gettempdir()) / f"terrabia-bench-{jeu}.sqlite3"
+    if regenerer or not modele.exists():
+        modele.unlink(missing_ok=True)
+        journal(f"Génération de la base {modele}...")
+        env = {**os.environ, "DATABASE_URL": f"sqlite:///{modele}"}
+        manage(env, "migrate", "-v", "0")
+        manage(
+            env, "seed_terrabia", "--seed", str(GRAINE_JEU), "--password", MOT_DE_PASSE,
+            "--products", str(produits), "--buyers", str(acheteurs), "--farmers", str(agriculteurs),
+            "--carts", str(acheteurs * 2), "--reviews", str(acheteurs * 2),
+        )
+    # Chaque mesure part du même état (stocks, paniers, commandes)
+    copie = modele.with_name(f"terrabia-bench-{jeu}-run.sqlite3")
+    shutil.copyfile(modele, copie)
+    return f"sqlite:///{copie}"
+
+
+def manage(env, *arguments):
+    subprocess.run([sys.executable, "manage.py", *arguments], cwd=settings.BASE_DIR, env=env, check=True)
+
+
+# nom -> (commande, vues asynchrones) ; un worker = un processus
+SERVEURS = {
+    # WSGI, workers synchrones : une requête à la fois par processus
+    "gunicorn": (lambda port, workers: [
+        "gunicorn", "TerrabiaApp.wsgi:application",
+        "--bind", f"127.0.0.1:{port}", "--workers", str(workers), "--log-level", "warning",
+    ], False),
+    # ASGI avec les vues de api.asynchrone
+    "uvicorn": (lambda port, workers: [
+        "uvicorn", "TerrabiaApp.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ], True),
+    # ASGI avec les vues DRF synchrones (chacune dans un thread)
+    "uvicorn-sync": (lambda port, workers: [
+        "uvicorn", "TerrabiaApp.asgi:application", "--host", "127.0.0.1", "--port", str(port),
+        "--workers", str(workers), "--log-level", "warning", "--no-access-log",
+    ], False),
+}
+
+
+def demarrer(serveur, port, database_url, workers, journal=print, latence_sql=0):
+    commande, vues_async = SERVEURS[serveur]
+    env = {
+        **os.environ,
+        "DATABASE_URL": database_url,
+        "DEBUG": "False",
+        # Servi en HTTP sur la boucle locale
+        "SECURE_SSL_REDIRECT": "False",
+        "DATABASE_SSL_REQUIRE": "False",
+        # Adresse client lue dans X-Forwarded-For (voir plus haut)
+        "API_NUM_PROXIES": "1",
+        # Mesures dans Server-Timing sans une ligne de log par requête
+        "PERF_LOG_NIVEAU": "WARNING",
+        "API_LOG_NIVEAU": "WARNING",
+        "API_VUES_ASYNC": str(vues_async),
+        # Réglages du projet plus la latence SQL simulée (TerrabiaApp/settings_banc.py)
+        "DJANGO_SETTINGS_MODULE": "TerrabiaApp.settings_banc",
+        "BANC_LATENCE_SQL_MS": str(latence_sql),
+    }
+    journal(f"{serveur} sur 127.0.0.1:{port} ({workers} workers)")
+    return subprocess.Popen([sys.executable, "-m", *commande(port, workers)], cwd=settings.BASE_DIR, env=env)
+
+
+def attendre(hote, port, serveur=None, delai=30):
+    limite = time.monotonic() + delai
+    while time.monotonic() < limite:
+        if serveur is not None and serveur.poll() is not None:
+            raise ValueError("Le serveur s'est arrêté au démarrage")
+        try:
+            connexion = http.client.HTTPConnection(hote, port, timeout=2)
+            connexion.request("GET", "/api/categories/")
+            connexion.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise ValueError(f"Serveur injoignable sur {hote}:{port}")
+
+
+def arreter(serveur):
+    if serveur is not None:
+        serveur.terminate()
+        serveur.wait(timeout=30)
+
+
+# ------------------------
+# Client HTTP d'un utilisateur virtuel
+# ------------------------
+
+class Client:
+    def __init__(self, hote, port, ip, debut_mesure=float("inf")):
+        self.hote, self.port, self.ip = hote, port, ip
+        self.debut_mesure = debut_mesure
+        # [(endpoint, statut, durée en s, requêtes SQL, durée SQL en ms)]
+        self.mesures = []
+        self.jeton = None
+        self.connexion = None
+
+    def requete(self, endpoint, methode, chemin, corps=None):
+        entetes = {"X-Forwarded-For": self.ip, "Accept": "application/json"}
+        if self.jeton:
+            entetes["Authorization"] = f"Bearer {self.jeton}"
+        donnees = None
+        if corps is not None:
+            donnees = json.dumps(corps).encode()
+            entetes["Content-Type"] = "application/json"
+
+        debut = time.perf_counter()
+        try:
+            if self.connexion is None:
+                self.connexion = http.client.HTTPConnection(self.hote, self.port, timeout=60)
+            self.connexion.request(methode, chemin, body=donnees, headers=entetes)
+            reponse = self.connexion.getresponse()
+            contenu = reponse.read()
+            statut, timing = reponse.status, reponse.getheader("Server-Timing", "")
+        except (OSError, http.client.HTTPException):
+            # Statut 0 : erreur réseau, comptée comme une erreur
+            self.connexion = None
+            statut, contenu, timing = 0, b"", ""
+        duree = time.perf_counter() - debut
+
+        if debut >= self.debut_mesure:
+            self.mesures.append((endpoint, statut, duree, *sql_de(timing)))
+        try:
+            return statut, json.loads(contenu) if contenu else None
+        except ValueError:
+            return statut, None
+
+    def connecter(self, email):
+        """Utilisateur connecté ({"id", "email", "role"}) ou None."""
+        self.jeton = None
+        statut, reponse = self.requete("POST /api/login/", "POST", "/api/login/", {"email": email, "password": MOT_DE_PASSE})
+        if statut != 200:
+            return None
+        self.jeton = reponse["access"]
+        return reponse["user"]
+
+
+# ------------------------
+# Parcours
+# ------------------------
+
+def decouvrir(hote, port, graine):
+    """Produits, catégories et mots de recherche lus par l'API avec un compte acheteur généré."""
+    client = Client(hote, port, "10.255.0.1")
+    if client.connecter(email_acheteur(0)) is None:
+        raise ValueError("Connexion impossible avec les comptes générés (base non issue de seed_terrabia --seed 42 ?)")
+    _, produits = client.requete("", "GET", "/api/produits/?page_size=200&fields=id,nom")
+    _, categories = client.requete("", "GET", "/api/categories/?fields=id")
+    produits = produits["results"] if produits else []
+    if not produits:
+        raise ValueError("Aucun produit dans la base")
+    random.Random(graine).shuffle(produits)
+    return {
+        "produits": [p["id"] for p in produits],
+        # Poids cumulés en 1/rang : quelques produits concentrent les visites
+        "poids": [sum(1 / rang for rang in range(1, i + 2)) for i in range(len(produits))],
+        "categories": [c["id"] for c in categories],
+        "mots": sorted({p["nom"].split()[0] for p in produits}),
+    }
+
+
+class Parcours:
+    def __init__(self, catalogue, nb_acheteurs, nb_agriculteurs, fin, rng):
+        self.catalogue = catalogue
+        self.nb_acheteurs = nb_acheteurs
+        self.nb_agriculteurs = nb_agriculteurs
+        self.fin = fin
+        self.rng = rng
+
+    def produit(self):
+        return self.rng.choices(self.catalogue["produits"], cum_weights=self.catalogue["poids"])[0]
+
+    def mot(self):
+        return quote(self.rng.choice(self.catalogue["mots"]))
+
+    def lecture(self):
+        """(endpoint, chemin) d'une lecture servie par les vues asynchrones (bench_asgi)."""
+        rng = self.rng
+        tirage = rng.random()
+        if tirage < 0.3:
+            return "GET /api/produits/", "/api/produits/?page_size=20"
+        if tirage < 0.45:
+            return (
+                "GET /api/produits/?categorie=",
+                f"/api/produits/?categorie={rng.choice(self.catalogue['categories'])}&ordering=prix&page_size=20",
+            )
+        if tirage < 0.6:
+            return "GET /api/produits/?q=", f"/api/produits/?q={self.mot()}&page_size=20"
+        if tirage < 0.85:
+            return "GET /api/produits/{id}/", f"/api/produits/{self.produit()}/"
+        if tirage < 0.9:
+            return "GET /api/categories/", "/api/categories/"
+        if tirage < 0.95:
+            return "GET /api/agences/", "/api/agences/?page_size=20"
+        return "GET /api/panier/utilisateur/", "/api/panier/utilisateur/"
+
+    def acheteur(self, client):
+        rng = self.rng
+        if client.connecter(email_acheteur(rng.randrange(self.nb_acheteurs))) is None:
+            return
+        for _ in range(rng.randint(2, 5)):
+            if time.perf_counter() > self.fin:
+                return
+            if rng.random() < 0.5:
+                client.requete("GET /api/produits/", "GET", "/api/produits/?page_size=20")
+            else:
+                client.requete(
+                    "GET /api/produits/?categorie=", "GET",
+                    f"/api/produits/?categorie={rng.choice(self.catalogue['categories'])}&ordering=prix&page_size=20",
+                )
+            if rng.random() < 0.6:
+                client.requete("GET /api/produits/?q=", "GET", f"/api/produits/?q={self.mot()}&page_size=20")
+            client.requete("GET /api/produits/{id}/", "GET", f"/api/produits/{self.produit()}/")
+        for _ in range(rng.randint(1, 3)):
+            client.requete(
+                "POST /api/panier/ajouter/", "POST", "/api/panier/ajouter/",
+                {"produit": self.produit(), "quantite": rng.randint(1, 3)},
+            )
+        client.requete("GET /api/panier/utilisateur/", "GET", "/api/panier/utilisateur/")
+        if rng.random() < 0.4:
+            client.requete("POST /api/commandes/", "POST", "/api/commandes/", {})
+
+    def agriculteur(self, client):
+        rng = self.rng
+        utilisateur = client.connecter(email_agriculteur(rng.randrange(self.nb_agriculteurs)))
+        if utilisateur is None:
+            return
+        client.requete(
+            "GET /api/produits/?agriculteur=", "GET",
+            f"/api/produits/?agriculteur={utilisateur['id']}&page_size=50",
+        )
+        client.requete("GET /api/agriculteurs/", "GET", "/api/agriculteurs/?page_size=20")
+        if rng.random() < 0.5:
+            client.requete("POST /api/produits/", "POST", "/api/produits/", {
+                "nom": f"{rng.choice(self.catalogue['mots'])} bench",
+                "quantite": rng.randint(1, 200),
+                "prix": f"{rng.randint(1, 400) * 25}.00",
+                "etat": "Frais",
+                "categorie": rng.choice(self.catalogue["categories"]),
+            })
+
+
+# ------------------------
+# Mesure
+# ------------------------
+
+def executer(hote, port, utilisateurs=20, duree=30, echauffement=5, part_agriculteurs=0.2,
+             nb_acheteurs=2000, nb_agriculteurs=200, graine=1):
+    """Fait tourner les parcours et renvoie {"total": {...}, "endpoints": {endpoint: statistiques}}."""
+    catalogue = decouvrir(hote, port, graine)
+    debut_mesure = time.perf_counter() + echauffement
+    fin = debut_mesure + duree
+    clients = [
+        # Une adresse par utilisateur virtuel
+        Client(hote, port, adresse(i), debut_mesure)
+        for i in range(utilisateurs)
+    ]
+
+    def utilisateur(i):
+        rng = random.Random(graine * 1000 + i)
+        parcours = Parcours(catalogue, nb_acheteurs, nb_agriculteurs, fin, rng)
+        while time.perf_counter() < fin:
+            if rng.random() < part_agriculteurs:
+                parcours.agriculteur(clients[i])
+            else:
+                parcours.acheteur(clients[i])
+
+    threads = [threading.Thread(target=utilisateur, args=(i,)) for i in range(utilisateurs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    par_endpoint = defaultdict(list)
+    for client in clients:
+        for mesure in client.mesures:
+            par_endpoint[mesure[0]].append(mesure)
+    toutes = [mesure for lignes in par_endpoint.values() for mesure in lignes]
+    return {
+        "date": timezone.now().isoformat(),
+        "total": {
+            "requetes": len(toutes),
+            "rps": round(len(toutes) / duree, 1),
+            "erreurs": sum(1 for m in toutes if m[1] == 0 or m[1] >= 500),
+        },
+        "endpoints": {endpoint: statistiques(lignes, duree) for endpoint, lignes in sorted(par_endpoint.items())},
+    }
+
+
+# ------------------------
+# Connexions simultanées (`manage.py bench_asgi`)
+# ------------------------
+# Chaque connexion virtuelle ouvre une connexion TCP par requête (les workers
+# synchrones de gunicorn ne gardent pas les connexions) et peut simuler un
+# client lent : la dernière ligne d'en-têtes n'arrive qu'après `lenteur`
+# secondes, comme sur un réseau mobile. Un worker synchrone qui a déjà
+# accepté la connexion attend pendant ce temps ; une boucle d'événements sert
+# les autres. La latence mesurée exclut cette pause. L'attente d'une base
+# distante se simule côté serveur (demarrer(latence_sql=...), voir
+# TerrabiaApp/settings_banc.py).
+
+def requete_lente(hote, port, chemin, jeton, ip, lenteur=0, delai=30):
+    """(statut, Server-Timing) d'un GET ; statut 0 sur erreur réseau ou délai dépassé."""
+    entetes = (
+        f"GET {chemin} HTTP/1.1\r\nHost: {hote}:{port}\r\nAuthorization: Bearer {jeton}\r\n"
+        f"X-Forwarded-For: {ip}\r\nAccept: application/json\r\nConnection: close\r\n"
+    )
+    try:
+        with socket.create_connection((hote, port), timeout=delai) as connexion:
+            connexion.sendall(entetes.encode())
+            if lenteur:
+                time.sleep(lenteur)
+            connexion.sendall(b"\r\n")
+            reponse = http.client.HTTPResponse(connexion)
+            reponse.begin()
+            reponse.read()
+            return reponse.status, reponse.getheader("Server-Timing", "")
+    except (OSError, http.client.HTTPException):
+        return 0, ""
+
+
+def jetons_acheteurs(hote, port, nombre):
+    """Jetons d'accès de `nombre` acheteurs générés (connexions faites avant la mesure)."""
+    jetons = []
+    for i in range(nombre):
+        client = Client(hote, port, adresse(60000 + i))
+        if client.connecter(email_acheteur(i)) is None:
+            raise ValueError("Connexion impossible avec les comptes générés (base non issue de seed_terrabia --seed 42 ?)")
+        jetons.append(client.jeton)
+    return jetons
+
+
+def palier(hote, port, connexions, catalogue, jetons, duree=10, echauffement=2, lenteur=0, delai=30, graine=1):
+    """Statistiques de `connexions` connexions simultanées qui enchaînent des lectures."""
+    debut_mesure = time.perf_counter() + echauffement
+    fin = debut_mesure + duree
+    mesures = [[] for _ in range(connexions)]
+
+    def connexion(i):
+        rng = random.Random(graine * 1000 + i)
+        parcours = Parcours(catalogue, 0, 0, fin, rng)
+        while time.perf_counter() < fin:
+            endpoint, chemin = parcours.lecture()
+            debut = time.perf_counter()
+            statut, timing = requete_lente(hote, port, chemin, jetons[i % len(jetons)], adresse(i), lenteur, delai)
+            if debut >= debut_mesure:
+                duree_requete = max(0.0, time.perf_counter() - debut - lenteur)
+                mesures[i].append((endpoint, statut, duree_requete, *sql_de(timing)))
+
+    threads = [threading.Thread(target=connexion, args=(i,)) for i in range(connexions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    lignes = [mesure for par_connexion in mesures for mesure in par_connexion]
+    if not lignes:
+        return {"connexions": connexions, "requetes": 0, "rps": 0.0, "erreurs": 0, "statuts": {}, "latence_ms": None}
+    return {"connexions": connexions, **statistiques(lignes, duree)}
+
+
+def capacite(paliers, slo_ms):
+    """Plus grand nombre de connexions servi sans erreur avec un p99 sous `slo_ms` (0 si aucun)."""
+    tenus = [
+        stats["connexions"] for stats in paliers
+        if stats["requetes"] and not stats["erreurs"] and stats["latence_ms"]["p99"] <= slo_ms
+    ]
+    return max(tenus, default=0)
+
+
+def statistiques(lignes, duree):
+    durees = sorted(ligne[2] * 1000 for ligne in lignes)
+    sql = [ligne[3] for ligne in lignes if ligne[3] is not None]
+    sql_ms = [ligne[4] for ligne in lignes if ligne[4] is not None]
+    return {
+        "requetes": len(lignes),
+        "rps": round(len(lignes) / duree, 2),
+        "erreurs": sum(1 for ligne in lignes if ligne[1] == 0 or ligne[1] >= 500),
+        "statuts": dict(sorted(Counter(str(ligne[1]) for ligne in lignes).items())),
+        "latence_ms": {
+            "moyenne": round(sum(durees) / len(durees), 2),
+            **{f"p{p}": round(percentile(durees, p), 2) for p in PERCENTILES},
+            "max": round(durees[-1], 2),
+        },
+        "sql_par_requete": round(sum(sql) / len(sql), 2) if sql else None,
+        "sql_ms": round(sum(sql_ms) / len(sql_ms), 2) if sql_ms else None,
+    }
+
+
+def comparer(resultats, reference, tolerance=0.2, echantillon_min=20):
+    """
+    Régressions par rapport à `reference` : p50 / p99 plus lents, débit plus
+    faible, plus de requêtes SQL. Les endpoints mesurés moins de
+    `echantillon_min` fois d'un côté ou de l'autre sont ignorés (percentiles
+    trop bruités).
+    """
+    regressions = []
+    for endpoint, stats in resultats["endpoints"].items():
+        avant = reference["endpoints"].get(endpoint)
+        if avant is None or min(stats["requetes"], avant["requetes"]) < echantillon_min:
+            continue
+        for p in ("p50", "p99"):
+            if stats["latence_ms"][p] > avant["latence_ms"][p] * (1 + tolerance):
+                regressions.append(f"{endpoint} : {p} {avant['latence_ms'][p]} -> {stats['latence_ms'][p]} ms")
+        if stats["rps"] < avant["rps"] * (1 - tolerance):
+            regressions.append(f"{endpoint} : débit {avant['rps']} -> {stats['rps']} req/s")
+        # Le nombre de requêtes SQL ne dépend pas de la machine : pas de tolérance relative
+        if None not in (stats["sql_par_requete"], avant["sql_par_requete"]) \
+                and stats["sql_par_requete"] > avant["sql_par_requete"] + 0.5:
+            regressions.append(
+                f"{endpoint} : {avant['sql_par_requete']} -> {stats['sql_par_requete']} requêtes SQL"
+            )
+    return regressions
@@ -0,0 +1,116 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Sum, Value, When
+from django.db.models.functions import Now
+
+from . import cache
+from .facets import invalider_facettes
+from .models import AgenceLivraison, Panier, PanierItem, Produit
+
+
+# ------------------------
+# Validation de commande (checkout)
+# ------------------------
+# Une seule transaction :
+#   0. résout l'agence de livraison demandée (id ou nom) : inconnue, rien n'est validé
+#   1. verrouille le panier EN_COURS de l'acheteur (pas de double validation)
+#   2. verrouille les produits concernés par ordre d'id croissant : deux
+#      commandes concurrentes prennent toujours les verrous dans le même
+#      ordre, donc pas d'interblocage
+#   3. vérifie le stock, décrémente toutes les quantités en un seul
+#      UPDATE ... CASE, calcule le montant avec un SUM côté base
+# Les verrous ne sont tenus que le temps de ces quelques requêtes.
+
+class CommandeError(Exception):
+    pass
+
+
+class PanierIntrouvable(CommandeError):
+    pass
+
+
+class PanierVide(CommandeError):
+    pass
+
+
+class AgenceInconnue(CommandeError):
+    pass
+
+
+class StockInsuffisant(CommandeError):
+    def __init__(self, details):
+        super().__init__("Stock insuffisant")
+        self.details = details
+
+
+def resoudre_agence(reference):
+    """Agence de livraison par id ou par nom (le frontend envoie le nom) ; None sans référence."""
+    if not reference:
+        return None
+    agences = AgenceLivraison.objects.only("id", "nom_agence", "localite")
+    if str(reference).isdigit():
+        agence = agences.filter(id=reference).first()
+    else:
+        agence = agences.filter(nom_agence=reference).first()
+    if agence is None:
+        raise AgenceInconnue(f"Agence de livraison inconnue : {reference}")
+    return agence
+
+
+def passer_commande(acheteur, agence=None):
+    """
+    Valide le panier en cours de `acheteur` pour l'agence de livraison
+    `agence` (id ou nom) et renvoie (Panier validé, AgenceLivraison ou None).
+    """
+    with transaction.atomic():
+        agence = resoudre_agence(agence)
+        panier = Panier.objects.select_for_update().filter(acheteur=acheteur, statut="EN_COURS").first()
+        if panier is None:
+            raise PanierIntrouvable("Aucun panier en cours")
+
+        demandes = dict(PanierItem.objects.filter(panier=panier).values_list("produit_id", "quantite"))
+        if not demandes:
+            raise PanierVide("Le panier est vide")
+
+        stocks = (
+            Produit.objects.select_for_update()
+            .filter(id__in=demandes)
+            .order_by("id")
+            .values_list("id", "nom", "quantite")
+        )
+        manquants = [
+            {"produit": produit_id, "nom": nom, "disponible": disponible, "demande": demandes[produit_id]}
+            for produit_id, nom, disponible in stocks
+            if disponible < demandes[produit_id]
+        ]
+        if manquants:
+            raise StockInsuffisant(manquants)
+
+        Produit.objects.filter(id__in=demandes).update(
+            quantite=F("quantite") - Case(
+                *[When(id=produit_id, then=Value(quantite)) for produit_id, quantite in demandes.items()],
+                default=Value(0),
+            ),
+            updated_at=Now(),
+        )
+
+        montant_total = PanierItem.objects.filter(panier=panier).aggregate(
+            total=Sum(ExpressionWrapper(
+                F("quantite") * F("produit__prix"),
+                output_field=DecimalField(max_digits=12, decimal_places=2),
+            ))
+        )["total"].quantize(Decimal("0.01"))
+
+        panier.statut = "VALIDE"
+        panier.montant_total = montant_total
+        panier.save(update_fields=["statut", "montant_total"])
+
+        # Le stock fait partie de la représentation des produits
+        transaction.on_commit(lambda: stock_modifie(list(demandes)))
+    return panier, agence
+
+
+def stock_modifie(produit_ids):
+    cache.invalider("produits", *(f"produit:{produit_id}" for produit_id in produit_ids))
+    invalider_facettes()
@@ -0,0 +1,65 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+from .fieldsets import objets_etendus
+
+
+# ------------------------
+# GET conditionnels (ETag / Last-Modified)
+# ------------------------
+# Les validateurs sont calculés sans sérialiser la réponse :
+# - détail : updated_at de la ligne (une requête sur une colonne)
+# - liste : MAX(updated_at) + COUNT(*) sur le queryset filtré (un agrégat)
+# Une suppression change le compte, une modification change le maximum.
+# Si le client possède déjà cette version, on répond 304 sans passer par le serializer.
+# Les réponses avec ?expand= dépendent d'autres lignes : ni ETag ni 304.
+
+class ConditionalGetMixin:
+    def list(self, request, *args, **kwargs):
+        if objets_etendus(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).order_by()
+        agregat = queryset.aggregate(derniere=Max("updated_at"), total=Count("id"))
+        return self.reponse_conditionnelle(request, agregat["derniere"], agregat["total"], super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if objets_etendus(request):
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        try:
+            derniere = self.get_queryset().filter(pk=pk).values_list("updated_at", flat=True).first()
+        except (TypeError, ValueError, ValidationError):
+            # Clé mal formée (/api/produits/abc/) : 404 de get_object()
+            derniere = None
+        if derniere is None:
+            return super().retrieve(request, *args, **kwargs)
+        return self.reponse_conditionnelle(request, derniere, 1, super().retrieve, *args, **kwargs)
+
+    def reponse_conditionnelle(self, request, derniere, total, vue, *args, **kwargs):
+        etag, last_modified = validateurs(request, derniere, total)
+        non_modifie = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if non_modifie is not None:
+            return non_modifie
+
+        response = vue(request, *args, **kwargs)
+        if response.status_code == 200:
+            valider(response, etag, last_modified)
+        return response
+
+
+def validateurs(request, derniere, total):
+    """(ETag, Last-Modified en secondes ou None) d'une réponse ; aussi utilisé par api.asynchrone."""
+    # L'URL absolue compte : les images sont sérialisées avec l'hôte
+    empreinte = repr((request.build_absolute_uri(), derniere and derniere.isoformat(), total))
+    etag = quote_etag(hashlib.sha1(empreinte.encode()).hexdigest())
+    return etag, int(derniere.timestamp()) if derniere else None
+
+
+def valider(response, etag, last_modified):
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified)
@@ -0,0 +1,202 @@
+import csv
+import io
+import zlib
+from datetime import datetime
+from itertools import groupby
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Avis, PanierItem, Produit
+
+
+# ------------------------
+# Exports en flux (NDJSON / CSV)
+# ------------------------
+# Les lignes sont lues avec QuerySet.iterator(chunk_size=...) (curseur côté
+# serveur sous Postgres) et écrites une par une, regroupées en blocs de
+# quelques dizaines de Ko : la mémoire reste constante quelle que soit la
+# taille de l'export. La compression gzip se fait au fil de l'eau.
+
+FORMATS = ("ndjson", "csv")
+TAILLE_LOT = 2000
+TAILLE_BLOC = 64 * 1024
+
+
+class FiltreInvalide(ValueError):
+    pass
+
+
+def borne(valeur):
+    """`2024-05-01` ou un datetime ISO ; une date seule couvre toute la journée."""
+    if not valeur:
+        return None
+    try:
+        moment = parse_date(valeur) or parse_datetime(valeur)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise FiltreInvalide(f"Date invalide : {valeur}")
+    return moment
+
+
+def identifiants(filtres, parametre):
+    """`1,2,3` -> [1, 2, 3] ; liste vide si le paramètre est absent."""
+    valeurs = [valeur.strip() for valeur in (filtres.get(parametre) or "").split(",") if valeur.strip()]
+    try:
+        return [int(valeur) for valeur in valeurs]
+    except ValueError:
+        raise FiltreInvalide(f"{parametre} : entiers séparés par des virgules attendus")
+
+
+def filtrer_periode(queryset, champ, filtres):
+    for parametre, operateur in (("depuis", "gte"), ("jusqu_a", "lte")):
+        valeur = borne(filtres.get(parametre))
+        if valeur is not None:
+            cle = f"{champ}__{operateur}" if isinstance(valeur, datetime) else f"{champ}__date__{operateur}"
+            queryset = queryset.filter(**{cle: valeur})
+    return queryset
+
+
+# ------------------------
+# Ressources exportables
+# ------------------------
+
+COLONNES_COMMANDES = [
+    "commande", "acheteur", "date_creation", "statut", "montant_total",
+    "produit", "nom", "quantite", "prix",
+]
+
+
+def lignes_commandes(filtres):
+    # Une seule requête sur les lignes, triées par commande : les commandes
+    # se reconstituent au fil du flux sans tout garder en mémoire
+    statuts = [s for s in (filtres.get("statut") or "VALIDE").split(",") if s]
+    queryset = filtrer_periode(
+        PanierItem.objects.filter(panier__statut__in=statuts),
+        "panier__date_creation",
+        filtres,
+    )
+    return (
+        queryset.order_by("panier_id", "id")
+        .values_list(
+            "panier_id", "panier__acheteur__email", "panier__date_creation", "panier__statut",
+            "panier__montant_total", "produit_id", "produit__nom", "quantite", "produit__prix",
+        )
+        .iterator(chunk_size=TAILLE_LOT)
+    )
+
+
+def commandes_ndjson(filtres):
+    for panier_id, lignes in groupby(lignes_commandes(filtres), key=lambda ligne: ligne[0]):
+        premiere = next(lignes)
+        _, acheteur, date_creation, statut, montant_total = premiere[:5]
+        yield {
+            "id": panier_id,
+            "acheteur": acheteur,
+            "date_creation": date_creation,
+            "statut": statut,
+            "montant_total": montant_total,
+            "lignes": [
+                {"produit": produit_id, "nom": nom, "quantite": quantite, "prix": prix}
+                for *_, produit_id, nom, quantite, prix in (premiere, *lignes)
+            ],
+        }
+
+
+def commandes_csv(filtres):
+    # Une ligne CSV par article commandé
+    yield from lignes_commandes(filtres)
+
+
+COLONNES_PRODUITS = ["id", "nom", "quantite", "prix", "etat", "categorie", "agriculteur", "updated_at"]
+
+
+def produits(filtres):
+    queryset = filtrer_periode(Produit.objects.all(), "updated_at", filtres)
+    if categories := identifiants(filtres, "categorie"):
+        queryset = queryset.filter(categorie_id__in=categories)
+    return (
+        queryset.order_by("id")
+        .values_list("id", "nom", "quantite", "prix", "etat", "categorie__nom", "agriculteur__email", "updated_at")
+        .iterator(chunk_size=TAILLE_LOT)
+    )
+
+
+COLONNES_AVIS = ["id", "auteur", "cible", "note", "commentaire"]
+
+
+def avis(filtres):
+    # Avis n'a pas de date : filtres par note et par agriculteur uniquement
+    queryset = Avis.objects.all()
+    if notes := identifiants(filtres, "note"):
+        queryset = queryset.filter(note__in=notes)
+    if cibles := identifiants(filtres, "cible"):
+        queryset = queryset.filter(cible_id__in=cibles)
+    return (
+        queryset.order_by("id")
+        .values_list("id", "auteur__email", "cible_id", "note", "commentaire")
+        .iterator(chunk_size=TAILLE_LOT)
+    )
+
+
+def en_dicts(colonnes, source):
+    def lignes(filtres):
+        for ligne in source(filtres):
+            yield dict(zip(colonnes, ligne))
+    return lignes
+
+
+# ressource -> (colonnes CSV, lignes NDJSON, lignes CSV)
+RESSOURCES = {
+    "commandes": (COLONNES_COMMANDES, commandes_ndjson, commandes_csv),
+    "produits": (COLONNES_PRODUITS, en_dicts(COLONNES_PRODUITS, produits), produits),
+    "avis": (COLONNES_AVIS, en_dicts(COLONNES_AVIS, avis), avis),
+}
+
+
+# ------------------------
+# Encodage du flux
+# ------------------------
+
+def flux_texte(ressource, format, filtres):
+    """Itère sur les lignes de texte de l'export (en-tête CSV compris)."""
+    colonnes, lignes_ndjson, lignes_csv = RESSOURCES[ressource]
+    if format == "ndjson":
+        encodeur = DjangoJSONEncoder(ensure_ascii=False)
+        for objet in lignes_ndjson(filtres):
+            yield encodeur.encode(objet) + "\n"
+        return
+
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon)
+    ecrivain.writerow(colonnes)
+    for ligne in lignes_csv(filtres):
+        ecrivain.writerow(ligne)
+        if tampon.tell() >= TAILLE_BLOC:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def flux_octets(lignes, compresser=False):
+    """Regroupe les lignes en blocs d'environ TAILLE_BLOC octets, compressés en gzip si demandé."""
+    compresseur = zlib.compressobj(6, zlib.DEFLATED, 31) if compresser else None
+    bloc, taille = [], 0
+    for ligne in lignes:
+        donnees = ligne.encode("utf-8")
+        bloc.append(donnees)
+        taille += len(donnees)
+        if taille >= TAILLE_BLOC:
+            donnees = b"".join(bloc)
+            bloc, taille = [], 0
+            if compresseur is not None:
+                donnees = compresseur.compress(donnees)
+            if donnees:
+                yield donnees
+    donnees = b"".join(bloc)
+    if compresseur is not None:
+        donnees = compresseur.compress(donnees) + compresseur.flush()
+    if donnees:
+        yield donnees
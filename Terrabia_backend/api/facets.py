@@ -0,0 +1,97 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .cache import get_cache
+
+
+# ------------------------
+# Facettes du catalogue (/api/produits/facets/)
+# ------------------------
+# Comptes par catégorie, état, spécialité de l'agriculteur et tranche de prix
+# pour l'ensemble de filtres actif. Les résultats sont mis en cache par jeu
+# de filtres normalisé ; toute modification d'un produit incrémente la
+# version (voir api/signals.py), ce qui invalide toutes les entrées d'un coup.
+
+VERSION_KEY = "facettes:version"
+
+# Paramètres qui ne changent pas l'ensemble des produits comptés
+PARAMS_IGNORES = {"ordering", "cursor", "page_size", "pagination", "format"}
+
+
+def tranches_prix():
+    """Bornes des tranches : [0, b1), [b1, b2), ..., [bn, +inf)."""
+    bornes = sorted(getattr(settings, "CATALOGUE_TRANCHES_PRIX", [500, 1000, 5000, 10000]))
+    return list(zip([0, *bornes], [*bornes, None]))
+
+
+def calculer_facettes(queryset):
+    """Quatre requêtes d'agrégat, quel que soit le nombre de produits."""
+    queryset = queryset.order_by()
+
+    tranches = tranches_prix()
+    agregats = {"total": Count("id")}
+    for i, (minimum, maximum) in enumerate(tranches):
+        condition = Q(prix__gte=minimum)
+        if maximum is not None:
+            condition &= Q(prix__lt=maximum)
+        agregats[f"tranche_{i}"] = Count("id", filter=condition)
+    comptes = queryset.aggregate(**agregats)
+
+    categories = queryset.values("categorie", "categorie__nom").annotate(count=Count("id")).order_by("categorie")
+    etats = queryset.values("etat").annotate(count=Count("id")).order_by("etat")
+    specialites = (
+        queryset.filter(agriculteur__agriculteur_profile__isnull=False)
+        .values("agriculteur__agriculteur_profile__specialite")
+        .annotate(count=Count("id"))
+        .order_by("agriculteur__agriculteur_profile__specialite")
+    )
+
+    return {
+        "total": comptes["total"],
+        "categories": [
+            {"id": ligne["categorie"], "nom": ligne["categorie__nom"], "count": ligne["count"]}
+            for ligne in categories
+        ],
+        "etats": [{"etat": ligne["etat"], "count": ligne["count"]} for ligne in etats],
+        "specialites": [
+            {"specialite": ligne["agriculteur__agriculteur_profile__specialite"], "count": ligne["count"]}
+            for ligne in specialites
+        ],
+        "prix": [
+            {"min": minimum, "max": maximum, "count": comptes[f"tranche_{i}"]}
+            for i, (minimum, maximum) in enumerate(tranches)
+        ],
+    }
+
+
+def cle_facettes(params):
+    filtres = sorted(
+        (cle, ",".join(sorted(v.strip() for v in valeur.split(","))))
+        for cle, valeur in params.items()
+        if cle not in PARAMS_IGNORES and valeur.strip()
+    )
+    empreinte = hashlib.sha1(repr(filtres).encode()).hexdigest()
+    cache = get_cache()
+    return f"facettes:{cache.get_or_set(VERSION_KEY, time.time_ns, None)}:{empreinte}"
+
+
+def facettes_en_cache(queryset, params):
+    cache = get_cache()
+    cle = cle_facettes(params)
+    facettes = cache.get(cle)
+    if facettes is None:
+        facettes = calculer_facettes(queryset)
+        cache.set(cle, facettes, getattr(settings, "CATALOGUE_FACETTES_TTL", 300))
+    return facettes
+
+
+def invalider_facettes():
+    cache = get_cache()
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        # Version expulsée du cache : repartir d'une valeur jamais utilisée
+        cache.set(VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,192 @@
+import time
+
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.serializers import BaseSerializer, ListSerializer
+
+from .mesures import mesures_en_cours
+
+
+# ------------------------
+# Champs à la demande (?fields= / ?omit= / ?expand=)
+# ------------------------
+# Sur les lectures (GET), le client choisit ce qui est rendu :
+#   ?fields=id,nom,prix,images.miniature   seuls ces champs (chemins pointés
+#                                          pour les objets imbriqués)
+#   ?omit=images,agriculteur               tout sauf ces champs
+#   ?expand=categorie                      objet complet au lieu de l'id
+# Les champs écartés sont retirés du serializer avant le rendu (rien n'est
+# calculé) et les vues n'en chargent ni les colonnes ni les relations.
+# Sans paramètre, la représentation est inchangée.
+
+def arbre(valeur):
+    """`"a,b.c"` -> `{"a": None, "b": {"c": None}}` ; None = le champ entier."""
+    racine = {}
+    for chemin in filter(None, (morceau.strip() for morceau in (valeur or "").split(","))):
+        noeud = racine
+        *parents, feuille = chemin.split(".")
+        for nom in parents:
+            if nom in noeud and noeud[nom] is None:
+                break
+            noeud = noeud.setdefault(nom, {})
+        else:
+            noeud[feuille] = None
+    return racine
+
+
+class Selection:
+    def __init__(self, champs=None, omis=None, etendus=None):
+        self.champs = champs      # None : tous les champs
+        self.omis = omis or {}
+        self.etendus = etendus or {}
+
+    @classmethod
+    def depuis_requete(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return cls()
+        params = request.query_params
+        return cls(arbre(params.get("fields")) or None, arbre(params.get("omit")), arbre(params.get("expand")))
+
+    @property
+    def complete(self):
+        return self.champs is None and not self.omis and not self.etendus
+
+    def inclut(self, nom):
+        if nom in self.omis and self.omis[nom] is None:
+            return False
+        return self.champs is None or nom in self.champs
+
+    def sous(self, nom):
+        return Selection(
+            None if self.champs is None else self.champs.get(nom),
+            self.omis.get(nom),
+            self.etendus.get(nom),
+        )
+
+    def rendu(self, chemin):
+        selection = self
+        for nom in chemin.split("."):
+            if not selection.inclut(nom):
+                return False
+            selection = selection.sous(nom)
+        return True
+
+    def etendu(self, chemin):
+        noeud = self.etendus
+        for nom in chemin.split("."):
+            if nom not in (noeud or {}):
+                return False
+            noeud = noeud[nom]
+        return True
+
+
+def objets_etendus(request):
+    """
+    Vrai si la requête étend des relations (?expand=). Les objets liés
+    (catégorie, agriculteur) n'entrent ni dans les étiquettes du cache du
+    catalogue ni dans les validateurs ETag / Last-Modified : ces réponses
+    ne sont ni mises en cache ni servies en 304.
+    """
+    return bool(Selection.depuis_requete(request).etendus)
+
+
+# ------------------------
+# Serializers
+# ------------------------
+
+class ChampsDynamiquesMixin:
+    # champ -> serializer qui remplace la clé primaire avec ?expand=<champ>
+    extensions = {}
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selection = getattr(self, "_selection", None) or Selection.depuis_requete(self.context.get("request"))
+        for nom, serializer in self.extensions.items():
+            if nom in fields and selection.etendu(nom):
+                fields[nom] = serializer(read_only=True)
+        for nom in list(fields):
+            if not selection.inclut(nom):
+                del fields[nom]
+                continue
+            # La sélection descend dans les serializers imbriqués (many=True compris)
+            imbrique = getattr(fields[nom], "child", fields[nom])
+            if isinstance(imbrique, ChampsDynamiquesMixin):
+                imbrique._selection = selection.sous(nom)
+        return fields
+
+    def to_representation(self, instance):
+        # Temps de sérialisation (Server-Timing), mesuré au premier niveau
+        # seulement : les serializers imbriqués sont compris dedans
+        mesures = mesures_en_cours()
+        parent = self.parent
+        if mesures is None or not (parent is None or isinstance(parent, ListSerializer) and parent.parent is None):
+            return super().to_representation(instance)
+        debut = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            mesures.ajouter("serialisation", time.perf_counter() - debut)
+
+
+def colonnes_rendues(serializer, model):
+    """
+    Colonnes de `model` lues par les champs rendus de `serializer`, pour only().
+    None si un champ dépend d'autre chose qu'une colonne ou une relation
+    (méthode, propriété) : tout est chargé.
+    """
+    colonnes = []
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        try:
+            champ = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if champ.concrete:
+            colonnes.append(champ.name)
+        elif not (champ.is_relation and isinstance(field, BaseSerializer)):
+            return None
+    return colonnes
+
+
+# ------------------------
+# Vues
+# ------------------------
+
+class ChampsClairsemesMixin:
+    # chemin du champ rendu -> lookup prefetch_related / select_related
+    prefetch_champs = {}
+    select_champs = {}
+    # chemin du champ étendu (?expand=) -> lookup select_related
+    extension_champs = {}
+    # colonnes toujours chargées (tri, pagination par curseur)
+    colonnes_requises = ()
+
+    def selection(self):
+        # Les autres actions (écriture, actions personnalisées) chargent tout
+        if self.action in ("list", "retrieve"):
+            return Selection.depuis_requete(self.request)
+        return Selection()
+
+    def relations(self):
+        selection = self.selection()
+        select = [lookup for chemin, lookup in self.select_champs.items() if selection.rendu(chemin)]
+        select += [
+            lookup for chemin, lookup in self.extension_champs.items()
+            if selection.rendu(chemin) and selection.etendu(chemin)
+        ]
+        prefetch = [lookup for chemin, lookup in self.prefetch_champs.items() if selection.rendu(chemin)]
+        return select, prefetch
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        select, prefetch = self.relations()
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        if not self.selection().complete:
+            colonnes = colonnes_rendues(self.get_serializer(), queryset.model)
+            if colonnes is not None:
+                queryset = queryset.only(queryset.model._meta.pk.name, *self.colonnes_requises, *colonnes)
+        return queryset
@@ -0,0 +1,71 @@
+from decimal import Decimal, InvalidOperation
+
+from rest_framework.exceptions import ValidationError
+from rest_framework.filters import BaseFilterBackend
+
+from .search import rechercher
+
+
+# ------------------------
+# Recherche et filtres du catalogue
+# ------------------------
+
+class ProduitFilterBackend(BaseFilterBackend):
+    """
+    Filtres serveur de /api/produits/ :
+
+    - `q` : recherche plein texte (nom du produit, nom et description de la catégorie)
+    - `prix_min`, `prix_max`, `quantite_min`, `quantite_max` : bornes incluses
+    - `etat`, `categorie`, `agriculteur` : égalité (plusieurs valeurs séparées par des virgules)
+    - `ordering` : prix, quantite, nom, id ou pertinence (préfixe `-` pour décroissant).
+      Avec `q` et sans `ordering`, les résultats sont classés par pertinence.
+    """
+    ordering_fields = ("prix", "quantite", "nom", "id", "pertinence")
+
+    def filter_queryset(self, request, queryset, view):
+        params = request.query_params
+
+        bornes = {
+            "prix__gte": ("prix_min", Decimal),
+            "prix__lte": ("prix_max", Decimal),
+            "quantite__gte": ("quantite_min", int),
+            "quantite__lte": ("quantite_max", int),
+        }
+        for lookup, (param, conversion) in bornes.items():
+            if params.get(param):
+                queryset = queryset.filter(**{lookup: self.convertir(params, param, conversion)})
+
+        if params.get("etat"):
+            queryset = queryset.filter(etat__in=params["etat"].split(","))
+        for param in ("categorie", "agriculteur"):
+            if params.get(param):
+                valeurs = [self.convertir({param: v}, param, int) for v in params[param].split(",")]
+                queryset = queryset.filter(**{f"{param}__in": valeurs})
+
+        if "q" in params:
+            queryset = rechercher(queryset, params["q"])
+
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
+
+    def get_ordering(self, request, queryset, view):
+        # Aussi utilisé par KeysetPagination pour construire ses curseurs
+        recherche = bool(request.query_params.get("q"))
+        champ = request.query_params.get("ordering")
+        if champ and champ.lstrip("-") in self.ordering_fields:
+            if champ.lstrip("-") == "pertinence" and not recherche:
+                return ("id",)
+            if champ.lstrip("-") == "id":
+                return (champ,)
+            # Départage dans le même sens : un seul parcours (avant ou arrière)
+            # des index (prix, id), (categorie, prix, id), sans tri
+            return (champ, "-id" if champ.startswith("-") else "id")
+        if recherche:
+            return ("-pertinence", "id")
+        return ("id",)
+
+    @staticmethod
+    def convertir(params, param, conversion):
+        try:
+            return conversion(params[param])
+        except (ValueError, InvalidOperation):
+            raise ValidationError({param: "Valeur numérique invalide."})
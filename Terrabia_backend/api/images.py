@@ -0,0 +1,99 @@
+import logging
+from io import BytesIO
+from pathlib import PurePosixPath
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------
+# Dérivés d'images (miniatures, WebP, tailles responsives)
+# ------------------------
+# Pour chaque image envoyée (ProduitPhoto.image, photos de profil), on produit
+# des versions WebP de largeur bornée, sans EXIF (orientation appliquée puis
+# métadonnées supprimées, y compris la position GPS des téléphones).
+# Le résultat est stocké dans un JSONField `derives` :
+#   {"source": "produits/x.jpg", "largeur": 4000, "hauteur": 3000,
+#    "tailles": {"miniature": {"fichier": "...", "largeur": 200, "hauteur": 150}, ...}}
+# Une image plus petite qu'une taille n'est pas agrandie : la taille reprend
+# le dérivé précédent. Les dérivés remplacés ou d'une photo supprimée sont
+# effacés du stockage (api/tasks.py, api/signals.py).
+
+def tailles():
+    return getattr(settings, "IMAGES_TAILLES", {"miniature": 200, "moyenne": 600, "grande": 1280})
+
+
+def generer_derives(fichier):
+    """
+    Génère et enregistre les dérivés de `fichier` (FieldFile). Renvoie le dict
+    `derives`, ou None si l'image est illisible ou refusée par Pillow.
+    """
+    try:
+        fichier.open("rb")
+        with Image.open(fichier) as original:
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except Exception as e:
+        # Pillow ne lève pas que des OSError : DecompressionBombError (image
+        # trop grande), ValueError, SyntaxError sur des fichiers corrompus...
+        logger.warning("Image illisible %s : %s", fichier.name, e)
+        return None
+    finally:
+        fichier.close()
+
+    chemin = PurePosixPath(fichier.name)
+    derives = {"source": fichier.name, "largeur": image.width, "hauteur": image.height, "tailles": {}}
+    precedent = None
+    try:
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        for nom, largeur_max in sorted(tailles().items(), key=lambda taille: taille[1]):
+            copie = image.copy()
+            copie.thumbnail((largeur_max, largeur_max * 4), Image.Resampling.LANCZOS)
+            if precedent is not None and (copie.width, copie.height) == (precedent["largeur"], precedent["hauteur"]):
+                # Image plus petite que cette taille : pas d'agrandissement ni
+                # de fichier en double, la taille renvoie au dérivé précédent
+                derives["tailles"][nom] = precedent
+                continue
+            tampon = BytesIO()
+            copie.save(tampon, "WEBP", quality=getattr(settings, "IMAGES_QUALITE_WEBP", 80), method=4)
+            nom_fichier = default_storage.save(
+                str(chemin.parent / "derives" / f"{chemin.stem}_{largeur_max}.webp"),
+                ContentFile(tampon.getvalue()),
+            )
+            derives["tailles"][nom] = precedent = {"fichier": nom_fichier, "largeur": copie.width, "hauteur": copie.height}
+    except Exception as e:
+        logger.warning("Dérivés impossibles pour %s : %s", fichier.name, e)
+        supprimer_derives(derives)
+        return None
+    return derives
+
+
+def supprimer_derives(derives, conserves=None):
+    """Supprime du stockage les fichiers de `derives` absents de `conserves` (autres dérivés)."""
+    gardes = {taille["fichier"] for taille in ((conserves or {}).get("tailles") or {}).values()}
+    for fichier in {taille["fichier"] for taille in ((derives or {}).get("tailles") or {}).values()} - gardes:
+        try:
+            default_storage.delete(fichier)
+        except OSError as e:
+            logger.warning("Dérivé non supprimé %s : %s", fichier, e)
+
+
+def derives_a_jour(fichier, derives):
+    return bool(derives) and derives.get("source") == fichier.name
+
+
+def srcset(derives, request=None):
+    """Map `"<largeur>w" -> URL` des dérivés, pour un attribut srcset côté client."""
+    if not derives:
+        return {}
+    resultat = {}
+    for taille in derives["tailles"].values():
+        url = default_storage.url(taille["fichier"])
+        resultat[f"{taille['largeur']}w"] = request.build_absolute_uri(url) if request else url
+    return resultat
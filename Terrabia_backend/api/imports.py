@@ -0,0 +1,173 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import transaction
+from rest_framework import serializers
+
+from . import cache
+from .facets import invalider_facettes
+from .models import Categorie, Produit
+from .serializers import ProduitSerializer
+
+
+# ------------------------
+# Import de produits en masse (CSV / NDJSON)
+# ------------------------
+# Le fichier est lu ligne à ligne et traité par lots de `taille_lot` lignes :
+# validation avec les règles de ProduitSerializer, puis un bulk_create par lot
+# dans sa propre transaction. Une ligne invalide est signalée sans interrompre
+# le fichier. Seuls le lot courant et les premières erreurs restent en
+# mémoire, quelle que soit la taille du fichier.
+
+FORMATS = ("csv", "ndjson")
+ERREURS_MAX = 1000
+
+
+class FormatInvalide(ValueError):
+    pass
+
+
+class ProduitImportSerializer(ProduitSerializer):
+    # Catégorie par nom (ou id), résolue dans une table chargée une seule fois
+    categorie = serializers.CharField()
+    photos = None
+    images = None
+
+    class Meta(ProduitSerializer.Meta):
+        fields = ["nom", "quantite", "prix", "etat", "categorie"]
+
+    def validate_categorie(self, valeur):
+        categories = self.context["categories"]
+        categorie = categories.get(valeur.strip().lower())
+        if categorie is None and valeur.strip().isdigit():
+            categorie = categories.get(int(valeur))
+        if categorie is None:
+            raise serializers.ValidationError(f"Catégorie inconnue : {valeur}")
+        return categorie
+
+
+def table_categories():
+    table = {}
+    for categorie in Categorie.objects.only("id", "nom", "description"):
+        table[categorie.nom.strip().lower()] = categorie
+        table[categorie.id] = categorie
+    return table
+
+
+def detecter_format(nom_fichier, format=None):
+    if format:
+        if format not in FORMATS:
+            raise FormatInvalide(f"Format inconnu : {format} (attendu : {', '.join(FORMATS)})")
+        return format
+    extension = (nom_fichier or "").rsplit(".", 1)[-1].lower()
+    if extension in ("ndjson", "jsonl"):
+        return "ndjson"
+    if extension == "csv":
+        return "csv"
+    raise FormatInvalide("Format non reconnu : préciser csv ou ndjson")
+
+
+class LigneIllisible(ValueError):
+    """Ligne non décodable (encodage, guillemets) : signalée comme erreur de la ligne."""
+
+
+def lignes_texte(fichier, illisibles):
+    """
+    Lignes décodées de `fichier` (binaire). Une ligne qui n'est pas de
+    l'UTF-8 est décodée avec remplacement et son numéro ajouté à `illisibles`.
+    """
+    for numero, brut in enumerate(fichier, start=1):
+        try:
+            yield brut.decode("utf-8-sig" if numero == 1 else "utf-8")
+        except UnicodeDecodeError:
+            illisibles.append(numero)
+            yield brut.decode("utf-8", errors="replace")
+
+
+def lire_lignes(fichier, format):
+    """
+    Itère (numéro de ligne, dict) sur un fichier binaire, sans le charger en
+    entier. Les lignes illisibles sont rendues sous forme de LigneIllisible.
+    """
+    illisibles = []
+    texte = lignes_texte(fichier, illisibles)
+    encodage = LigneIllisible("Encodage invalide : le fichier doit être en UTF-8.")
+    if format == "csv":
+        lecteur = csv.DictReader(texte)
+        fin = 1
+        while True:
+            debut = fin + 1
+            try:
+                ligne = next(lecteur)
+                fin = lecteur.line_num
+            except StopIteration:
+                return
+            except csv.Error as e:
+                # Guillemet non fermé, champ trop long : le lecteur reprend à la ligne suivante
+                illisibles.clear()
+                yield debut, LigneIllisible(f"CSV mal formé : {e}")
+                continue
+            # Les lignes lues jusqu'ici sont celles de cet enregistrement
+            if illisibles:
+                ligne = encodage
+                illisibles.clear()
+            yield fin, ligne
+    else:
+        for numero, ligne in enumerate(texte, start=1):
+            if illisibles:
+                illisibles.clear()
+                yield numero, encodage
+                continue
+            if not ligne.strip():
+                continue
+            try:
+                donnees = json.loads(ligne)
+            except json.JSONDecodeError as e:
+                donnees = e
+            yield numero, donnees
+
+
+def importer_produits(lignes, agriculteur, taille_lot=500):
+    """
+    Importe les produits de `lignes` (itérable de (numéro, dict)) pour
+    `agriculteur`. Renvoie le rapport {"lignes", "crees", "nb_erreurs", "erreurs"}.
+    """
+    validation = ProduitImportSerializer(context={"categories": table_categories()})
+    rapport = {"lignes": 0, "crees": 0, "nb_erreurs": 0, "erreurs": []}
+
+    def erreur(numero, details):
+        rapport["nb_erreurs"] += 1
+        if len(rapport["erreurs"]) < ERREURS_MAX:
+            rapport["erreurs"].append({"ligne": numero, "erreurs": details})
+
+    lignes = iter(lignes)
+    while lot := list(islice(lignes, taille_lot)):
+        produits = []
+        for numero, donnees in lot:
+            rapport["lignes"] += 1
+            if isinstance(donnees, LigneIllisible):
+                erreur(numero, {"non_field_errors": [str(donnees)]})
+                continue
+            if not isinstance(donnees, dict):
+                erreur(numero, {"non_field_errors": ["Ligne illisible : objet JSON attendu."]})
+                continue
+            try:
+                valeurs = validation.run_validation(donnees)
+            except serializers.ValidationError as e:
+                erreur(numero, e.detail)
+                continue
+            produit = Produit(agriculteur=agriculteur, **valeurs)
+            # bulk_create ne passe pas par Produit.save()
+            produit.recherche = produit.construire_recherche()
+            produits.append(produit)
+        if produits:
+            with transaction.atomic():
+                Produit.objects.bulk_create(produits)
+            rapport["crees"] += len(produits)
+
+    if rapport["crees"]:
+        # bulk_create n'envoie pas post_save : invalider une fois pour tout l'import
+        cache.invalider("produits")
+        invalider_facettes()
+    return rapport
@@ -0,0 +1,162 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+from rest_framework.response import Response
+
+from .fieldsets import Selection
+from .images import srcset
+from .mesures import chrono
+from .models import ProduitPhoto
+
+
+# ------------------------
+# Lecture rapide des listes (API_LECTURE_RAPIDE)
+# ------------------------
+# Le rendu champ par champ d'un ModelSerializer (get_attribute,
+# to_representation, OrderedDict par objet) domine le temps CPU des grandes
+# listes. Ici, on lit les lignes avec values() (pas d'instances de
+# modèle) et on les convertit avec une fonction préparée une fois par requête
+# à partir des champs du serializer : mêmes clés, même ordre, mêmes
+# conversions (décimaux, dates), donc une sortie identique octet pour octet.
+# Les champs qui ne se réduisent pas à une colonne (méthodes, propriétés)
+# renvoient vers le chemin normal.
+
+# Champs dont to_representation() rend la valeur telle que lue en base
+IDENTITE = (serializers.IntegerField, serializers.CharField, serializers.PrimaryKeyRelatedField)
+
+
+class NonCompilable(Exception):
+    pass
+
+
+def plan_de_lecture(serializer, model, speciaux=None):
+    """
+    [(clé, colonne, rendu)] pour les champs lisibles de `serializer`, dans
+    l'ordre du serializer. `rendu` vaut None quand la valeur lue est déjà
+    la représentation. `speciaux` associe un champ (relation, méthode...) à
+    la colonne passée à son rendu dédié, fourni au moment de la conversion.
+    """
+    speciaux = speciaux or {}
+    plan = []
+    for nom, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if nom in speciaux:
+            plan.append((nom, speciaux[nom], None))
+            continue
+        try:
+            colonne = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise NonCompilable(nom)
+        if not colonne.concrete:
+            raise NonCompilable(nom)
+        plan.append((nom, colonne.attname, None if isinstance(field, IDENTITE) else field.to_representation))
+    return plan
+
+
+def convertisseur(plan, rendus=None):
+    """Fonction `ligne (dict de values()) -> dict rendu`, préparée une fois pour toute la liste."""
+    rendus = rendus or {}
+    etapes = [(nom, colonne, rendus.get(nom, rendu)) for nom, colonne, rendu in plan]
+
+    def convertir(ligne):
+        resultat = {}
+        for nom, colonne, rendu in etapes:
+            valeur = ligne[colonne]
+            resultat[nom] = valeur if rendu is None or valeur is None else rendu(valeur)
+        return resultat
+
+    return convertir
+
+
+# ------------------------
+# Photos des produits (équivalent de ProduitPhotoSerializer)
+# ------------------------
+
+def requete_photos(produit_ids):
+    return ProduitPhoto.objects.filter(produit_id__in=produit_ids).values_list(
+        "id", "produit_id", "image", "statut", "derives"
+    )
+
+
+def rendre_photos(lignes, request):
+    url_absolue = request.build_absolute_uri if request else (lambda url: url)
+    photos = defaultdict(list)
+    for photo_id, produit_id, image, statut, derives in lignes:
+        url = url_absolue(default_storage.url(image)) if image else None
+        tailles = srcset(derives, request)
+        photos[produit_id].append({
+            "id": photo_id,
+            "image": url,
+            "statut": statut,
+            "miniature": next(iter(tailles.values()), None) or url,
+            "srcset": tailles,
+            "largeur": derives.get("largeur"),
+            "hauteur": derives.get("hauteur"),
+        })
+    return photos
+
+
+def photos_par_produit(produit_ids, request):
+    return rendre_photos(requete_photos(produit_ids), request)
+
+
+async def aphotos_par_produit(produit_ids, request):
+    return rendre_photos([ligne async for ligne in requete_photos(produit_ids)], request)
+
+
+# ------------------------
+# Vues
+# ------------------------
+
+class LectureRapideMixin:
+    """
+    Remplace le rendu de `list` par values() + conversion précompilée quand
+    API_LECTURE_RAPIDE est activé et qu'aucun ?fields= / ?omit= / ?expand=
+    n'est demandé. Se place juste avant le ModelViewSet : le cache et les GET
+    conditionnels s'appliquent toujours.
+    """
+    # champ -> colonne passée au rendu fourni par rendus_speciaux()
+    lecture_speciale = {}
+
+    def rendus_speciaux(self, request, lignes):
+        return {}
+
+    async def arendus_speciaux(self, request, lignes):
+        # Version des vues asynchrones (api/asynchrone.py)
+        return self.rendus_speciaux(request, lignes)
+
+    def plan_rapide(self, request, model):
+        """Plan de lecture de la liste, ou None s'il faut passer par le serializer."""
+        if not getattr(settings, "API_LECTURE_RAPIDE", False) or not Selection.depuis_requete(request).complete:
+            return None
+        try:
+            return plan_de_lecture(self.get_serializer(), model, self.lecture_speciale)
+        except NonCompilable:
+            return None
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        plan = self.plan_rapide(request, queryset.model)
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+
+        lignes = lignes_du_plan(queryset, plan)
+        page = self.paginate_queryset(lignes)
+        lignes = list(lignes) if page is None else page
+
+        convertir = convertisseur(plan, self.rendus_speciaux(request, lignes))
+        with chrono("serialisation"):
+            data = [convertir(ligne) for ligne in lignes]
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+
+def lignes_du_plan(queryset, plan):
+    colonnes = list(dict.fromkeys(colonne for _, colonne, _ in plan))
+    # Les annotations (ex. pertinence) servent au curseur de pagination
+    return queryset.values(*colonnes, *(nom for nom in queryset.query.annotations if nom not in colonnes))
@@ -0,0 +1,128 @@
+import json
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.charge import (
+    SERVEURS, arreter, attendre, capacite, decouvrir, demarrer, jetons_acheteurs, palier, port_libre, preparer_base,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Connexions simultanées tenues par un processus : sert l'API avec gunicorn "
+        "(workers synchrones), uvicorn (vues asynchrones, API_VUES_ASYNC) et uvicorn "
+        "avec les vues synchrones, monte "
+        "le nombre de connexions qui enchaînent les lectures du catalogue et du panier "
+        "(base distante et clients lents simulables) et relève req/s, p50 / p99 et "
+        "erreurs par palier."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--serveurs", default="gunicorn,uvicorn,uvicorn-sync",
+            help=f"Serveurs comparés, parmi {', '.join(SERVEURS)}",
+        )
+        parser.add_argument("--workers", type=int, default=1, help="Processus par serveur")
+        parser.add_argument("--paliers", default="8,32,128,256", help="Nombres de connexions simultanées")
+        parser.add_argument("--duree", type=float, default=10, help="Durée de mesure par palier (secondes)")
+        parser.add_argument("--echauffement", type=float, default=2, help="Secondes non comptées par palier")
+        parser.add_argument(
+            "--lenteur-client", type=float, default=0,
+            help="Secondes avant la fin des en-têtes de chaque requête (0 : client rapide)",
+        )
+        parser.add_argument(
+            "--latence-sql", type=float, default=0,
+            help="Millisecondes ajoutées à chaque requête SQL (base distante simulée sur le serveur du banc)",
+        )
+        parser.add_argument("--delai", type=float, default=30, help="Délai d'attente d'une réponse (secondes)")
+        parser.add_argument("--slo-ms", type=float, default=1000, help="p99 maximal pour qu'un palier soit tenu")
+        parser.add_argument("--comptes", type=int, default=20, help="Acheteurs connectés (jetons partagés)")
+        parser.add_argument(
+            "--database-url",
+            help="Base à servir, déjà générée par seed_terrabia --seed 42 (par défaut : SQLite dans le dossier temporaire)",
+        )
+        parser.add_argument("--regenerer", action="store_true", help="Régénérer la base SQLite du banc")
+        parser.add_argument("--produits", type=int, default=20000)
+        parser.add_argument("--acheteurs", type=int, default=2000)
+        parser.add_argument("--agriculteurs", type=int, default=200)
+        parser.add_argument("--graine", type=int, default=1, help="Graine des lectures")
+        parser.add_argument("--sortie", help="Fichier JSON des résultats (par défaut bench-asgi-<date>.json)")
+
+    def handle(self, *args, **options):
+        serveurs = [nom.strip() for nom in options["serveurs"].split(",") if nom.strip()]
+        inconnus = [nom for nom in serveurs if nom not in SERVEURS]
+        if inconnus:
+            raise CommandError(f"Serveur(s) inconnu(s) : {', '.join(inconnus)}")
+        try:
+            paliers = sorted({int(n) for n in options["paliers"].split(",")})
+        except ValueError:
+            raise CommandError("--paliers : nombres entiers séparés par des virgules")
+
+        resultats = {
+            "date": timezone.now().isoformat(),
+            "parametres": {
+                cle: options[cle] for cle in (
+                    "workers", "duree", "echauffement", "lenteur_client", "latence_sql", "delai", "slo_ms", "comptes",
+                    "produits", "acheteurs", "agriculteurs", "graine",
+                )
+            },
+            "serveurs": {},
+        }
+        for i, nom in enumerate(serveurs):
+            # Base régénérée au plus une fois, recopiée pour chaque serveur
+            resultats["serveurs"][nom] = self.mesurer(nom, paliers, options, regenerer=options["regenerer"] and i == 0)
+
+        self.afficher(resultats)
+        sortie = Path(options["sortie"] or f"bench-asgi-{timezone.now():%Y%m%d-%H%M%S}.json")
+        sortie.write_text(json.dumps(resultats, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Résultats : {sortie}")
+
+    def mesurer(self, nom, paliers, options, regenerer):
+        hote, port = "127.0.0.1", port_libre()
+        serveur = None
+        try:
+            database_url = options["database_url"] or preparer_base(
+                options["produits"], options["acheteurs"], options["agriculteurs"], regenerer, self.stdout.write,
+            )
+            serveur = demarrer(
+                nom, port, database_url, options["workers"], self.stdout.write, latence_sql=options["latence_sql"],
+            )
+            attendre(hote, port, serveur)
+            catalogue = decouvrir(hote, port, options["graine"])
+            jetons = jetons_acheteurs(hote, port, min(options["comptes"], options["acheteurs"]))
+
+            mesures = []
+            for connexions in paliers:
+                self.stdout.write(f"  {connexions} connexions...")
+                mesures.append(palier(
+                    hote, port, connexions, catalogue, jetons,
+                    duree=options["duree"], echauffement=options["echauffement"],
+                    lenteur=options["lenteur_client"], delai=options["delai"], graine=options["graine"],
+                ))
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            arreter(serveur)
+        return {"paliers": mesures, "capacite": capacite(mesures, options["slo_ms"])}
+
+    # ------------------------
+    # Rapport
+    # ------------------------
+
+    def afficher(self, resultats):
+        slo = resultats["parametres"]["slo_ms"]
+        for nom, mesures in resultats["serveurs"].items():
+            self.stdout.write(f"\n{nom} ({resultats['parametres']['workers']} processus)")
+            self.stdout.write(f"{'connexions':>10} {'req/s':>8} {'p50':>9} {'p99':>9} {'erreurs':>8}  statuts")
+            for stats in mesures["paliers"]:
+                latence = stats["latence_ms"] or {"p50": "-", "p99": "-"}
+                self.stdout.write(
+                    f"{stats['connexions']:>10} {stats['rps']:>8} {latence['p50']:>9} {latence['p99']:>9} "
+                    f"{stats['erreurs']:>8}  {stats['statuts']}"
+                )
+            self.stdout.write(
+                f"Capacité : {mesures['capacite']} connexions simultanées (sans erreur, p99 <= {slo:g} ms)"
+            )
+        self.stdout.write("")
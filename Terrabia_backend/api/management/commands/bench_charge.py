@@ -0,0 +1,118 @@
+import json
+from pathlib import Path
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.charge import arreter, attendre, comparer, demarrer, executer, port_libre, preparer_base
+
+
+class Command(BaseCommand):
+    help = (
+        "Banc de charge HTTP : sert l'API avec gunicorn sur une base générée par "
+        "seed_terrabia, fait tourner des parcours acheteur / agriculteur en parallèle "
+        "et mesure req/s, latences (p50..p99) et requêtes SQL par endpoint. Résultats "
+        "en JSON, comparés à une référence (--reference)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--utilisateurs", type=int, default=20, help="Utilisateurs virtuels simultanés")
+        parser.add_argument("--duree", type=float, default=30, help="Durée de la mesure (secondes)")
+        parser.add_argument("--echauffement", type=float, default=5, help="Secondes non comptées au début")
+        parser.add_argument("--part-agriculteurs", type=float, default=0.2, help="Part des parcours agriculteur")
+        parser.add_argument("--workers", type=int, default=4, help="Workers gunicorn")
+        parser.add_argument("--url", help="Serveur déjà démarré (ni gunicorn ni génération de base)")
+        parser.add_argument(
+            "--database-url",
+            help="Base à servir, déjà générée par seed_terrabia --seed 42 (par défaut : SQLite dans le dossier temporaire)",
+        )
+        parser.add_argument("--regenerer", action="store_true", help="Régénérer la base SQLite du banc")
+        parser.add_argument("--produits", type=int, default=20000)
+        parser.add_argument("--acheteurs", type=int, default=2000)
+        parser.add_argument("--agriculteurs", type=int, default=200)
+        parser.add_argument("--graine", type=int, default=1, help="Graine des parcours")
+        parser.add_argument("--sortie", help="Fichier JSON des résultats (par défaut bench-<date>.json)")
+        parser.add_argument("--reference", help="Résultats de référence à comparer")
+        parser.add_argument(
+            "--enregistrer-reference", action="store_true",
+            help="Ecrire les résultats dans --reference au lieu de comparer",
+        )
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Dégradation tolérée (0.2 = 20 %%)")
+
+    def handle(self, *args, **options):
+        reference = options["reference"]
+        if reference and not options["enregistrer_reference"] and not Path(reference).exists():
+            raise CommandError(f"Référence introuvable : {reference} (--enregistrer-reference pour la créer)")
+
+        serveur = None
+        try:
+            if options["url"]:
+                url = urlsplit(options["url"])
+                hote, port = url.hostname, url.port or 80
+            else:
+                hote, port = "127.0.0.1", port_libre()
+                serveur = demarrer("gunicorn", port, self.base(options), options["workers"], self.stdout.write)
+            attendre(hote, port, serveur)
+            self.stdout.write(f"{options['utilisateurs']} utilisateurs virtuels, {options['duree']:g} s de mesure...")
+            resultats = executer(
+                hote, port,
+                utilisateurs=options["utilisateurs"], duree=options["duree"],
+                echauffement=options["echauffement"], part_agriculteurs=options["part_agriculteurs"],
+                nb_acheteurs=options["acheteurs"], nb_agriculteurs=options["agriculteurs"],
+                graine=options["graine"],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            arreter(serveur)
+
+        resultats["parametres"] = {
+            cle: options[cle] for cle in (
+                "utilisateurs", "duree", "echauffement", "part_agriculteurs", "workers",
+                "produits", "acheteurs", "agriculteurs", "graine",
+            )
+        }
+        self.afficher(resultats)
+        sortie = Path(options["sortie"] or f"bench-{timezone.now():%Y%m%d-%H%M%S}.json")
+        sortie.write_text(json.dumps(resultats, ensure_ascii=False, indent=2))
+        self.stdout.write(f"Résultats : {sortie}")
+
+        if reference and options["enregistrer_reference"]:
+            Path(reference).write_text(json.dumps(resultats, ensure_ascii=False, indent=2))
+            self.stdout.write(f"Référence enregistrée : {reference}")
+        elif reference:
+            regressions = comparer(resultats, json.loads(Path(reference).read_text()), options["tolerance"])
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f"Régression - {regression}"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} régression(s) par rapport à {reference}")
+            self.stdout.write(self.style.SUCCESS("Aucune régression par rapport à la référence"))
+
+    # ------------------------
+    # Base et serveur
+    # ------------------------
+
+    def base(self, options):
+        if options["database_url"]:
+            return options["database_url"]
+        return preparer_base(
+            options["produits"], options["acheteurs"], options["agriculteurs"], options["regenerer"], self.stdout.write,
+        )
+
+    # ------------------------
+    # Rapport
+    # ------------------------
+
+    def afficher(self, resultats):
+        total = resultats["total"]
+        self.stdout.write(f"\n{total['requetes']} requêtes, {total['rps']} req/s, {total['erreurs']} erreurs\n")
+        self.stdout.write(f"{'endpoint':<32} {'req/s':>7} {'p50':>8} {'p95':>8} {'p99':>8} {'sql':>5}  statuts")
+        for endpoint, stats in resultats["endpoints"].items():
+            latence = stats["latence_ms"]
+            sql = "-" if stats["sql_par_requete"] is None else f"{stats['sql_par_requete']:g}"
+            self.stdout.write(
+                f"{endpoint:<32} {stats['rps']:>7} {latence['p50']:>8} {latence['p95']:>8} {latence['p99']:>8} "
+                f"{sql:>5}  {stats['statuts']}"
+            )
+        self.stdout.write("")
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api import cache
+from api.models import Categorie, Produit, User
+from api.views import ProduitViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare le rendu de GET /api/produits/ avec et sans API_LECTURE_RAPIDE "
+        "pour plusieurs tailles de liste. Les lignes de test sont créées dans une "
+        "transaction annulée à la fin : la base n'est pas modifiée."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tailles", default="1000,10000,100000")
+        parser.add_argument("--repetitions", type=int, default=3)
+
+    def handle(self, *args, tailles, repetitions, **options):
+        tailles = [int(taille) for taille in tailles.split(",")]
+        vue = ProduitViewSet.as_view({"get": "list"})
+
+        self.stdout.write(f"{'lignes':>8}  {'serializer':>12}  {'rapide':>12}  {'gain':>6}")
+        with transaction.atomic():
+            utilisateur = User.objects.create_user("bench-lecture@terrabia.local", None, role="AGRICULTEUR")
+            categorie = Categorie.objects.create(nom="bench-lecture")
+            # Seuls les produits de la catégorie de test sont listés
+            requete = APIRequestFactory().get("/api/produits/", {"pagination": "off", "categorie": categorie.id})
+            force_authenticate(requete, user=utilisateur)
+
+            for taille in tailles:
+                manquants = taille - Produit.objects.filter(categorie=categorie).count()
+                Produit.objects.bulk_create(
+                    [
+                        Produit(
+                            nom=f"Produit {i}", quantite=i % 100, prix=f"{i % 5000}.50", etat="frais",
+                            categorie=categorie, agriculteur=utilisateur, recherche=f"Produit {i} bench-lecture",
+                        )
+                        for i in range(manquants)
+                    ],
+                    batch_size=2000,
+                )
+                durees = {}
+                for rapide in (False, True):
+                    with override_settings(API_LECTURE_RAPIDE=rapide):
+                        durees[rapide] = min(self.mesurer(vue, requete) for _ in range(repetitions))
+                self.stdout.write(
+                    f"{taille:>8}  {durees[False] * 1000:>10.1f}ms  {durees[True] * 1000:>10.1f}ms  "
+                    f"{durees[False] / durees[True]:>5.1f}x"
+                )
+            transaction.set_rollback(True)
+
+    def mesurer(self, vue, requete):
+        # Nouvelle version de l'étiquette : la réponse ne vient pas du cache
+        cache.invalider("produits")
+        debut = time.perf_counter()
+        response = vue(requete)
+        response.render()
+        return time.perf_counter() - debut
@@ -0,0 +1,43 @@
+import gzip
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import FORMATS, RESSOURCES, FiltreInvalide, flux_texte
+
+
+class Command(BaseCommand):
+    help = "Exporte en flux les commandes, produits ou avis (NDJSON ou CSV), compressés si le fichier finit par .gz."
+
+    def add_arguments(self, parser):
+        parser.add_argument("ressource", choices=list(RESSOURCES))
+        parser.add_argument("--format", choices=FORMATS, default="ndjson")
+        parser.add_argument("--sortie", help="Fichier de sortie (sortie standard par défaut).")
+        parser.add_argument("--depuis")
+        parser.add_argument("--jusqu-a", dest="jusqu_a")
+        parser.add_argument("--statut", help="Statuts des commandes, séparés par des virgules (VALIDE par défaut).")
+        parser.add_argument("--categorie")
+        parser.add_argument("--note")
+        parser.add_argument("--cible")
+
+    def handle(self, *args, ressource, format="ndjson", sortie=None, **options):
+        filtres = {
+            cle: options.get(cle)
+            for cle in ("depuis", "jusqu_a", "statut", "categorie", "note", "cible")
+            if options.get(cle)
+        }
+        if sortie is None:
+            fichier = sys.stdout
+        elif sortie.endswith(".gz"):
+            fichier = gzip.open(sortie, "wt", encoding="utf-8", newline="")
+        else:
+            fichier = open(sortie, "w", encoding="utf-8", newline="")
+
+        try:
+            for ligne in flux_texte(ressource, format, filtres):
+                fichier.write(ligne)
+        except FiltreInvalide as e:
+            raise CommandError(str(e))
+        finally:
+            if fichier is not sys.stdout:
+                fichier.close()
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from api.images import derives_a_jour
+from api.models import AcheteurProfile, AgriculteurProfile, ProduitPhoto
+from api.tasks import traiter_photo_profil, traiter_photos
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les dérivés WebP manquants : photos envoyées avant le pipeline "
+        "ou restées EN_ATTENTE après un redémarrage du serveur."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=100)
+
+    def handle(self, *args, batch_size=100, **options):
+        photos = ProduitPhoto.objects.exclude(statut="PRET").exclude(image="")
+        ids = list(photos.values_list("id", flat=True))
+        for debut in range(0, len(ids), batch_size):
+            traiter_photos(ids[debut:debut + batch_size])
+        self.stdout.write(f"ProduitPhoto : {len(ids)} image(s) traitée(s)")
+
+        for model in (AcheteurProfile, AgriculteurProfile):
+            traites = 0
+            profils = model.objects.exclude(photo_profil="").exclude(photo_profil__isnull=True)
+            for profil in profils.only("id", "photo_profil", "photo_derives").iterator(chunk_size=200):
+                if not derives_a_jour(profil.photo_profil, profil.photo_derives):
+                    traiter_photo_profil(model, profil.pk)
+                    traites += 1
+            self.stdout.write(f"{model.__name__} : {traites} image(s) traitée(s)")
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import ERREURS_MAX, FormatInvalide, detecter_format, importer_produits, lire_lignes
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = "Importe des produits depuis un fichier CSV ou NDJSON pour un agriculteur."
+
+    def add_arguments(self, parser):
+        parser.add_argument("fichier")
+        parser.add_argument("--agriculteur", required=True, help="Email du compte agriculteur.")
+        parser.add_argument("--format", choices=["csv", "ndjson"])
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, fichier, agriculteur, format=None, batch_size=500, **options):
+        compte = User.objects.filter(email=agriculteur, role="AGRICULTEUR").first()
+        if compte is None:
+            raise CommandError(f"Aucun agriculteur avec l'email {agriculteur}")
+        try:
+            format = detecter_format(fichier, format)
+        except FormatInvalide as e:
+            raise CommandError(str(e))
+
+        try:
+            with open(fichier, "rb") as f:
+                rapport = importer_produits(lire_lignes(f, format), compte, taille_lot=batch_size)
+        except OSError as e:
+            raise CommandError(str(e))
+
+        for erreur in rapport["erreurs"]:
+            self.stdout.write(f"Ligne {erreur['ligne']} : {erreur['erreurs']}")
+        if rapport["nb_erreurs"] > ERREURS_MAX:
+            self.stdout.write(f"... {rapport['nb_erreurs'] - ERREURS_MAX} autre(s) erreur(s)")
+        self.stdout.write(self.style.SUCCESS(
+            f"{rapport['crees']} produit(s) créé(s) sur {rapport['lignes']} ligne(s), "
+            f"{rapport['nb_erreurs']} erreur(s)"
+        ))
@@ -0,0 +1,63 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.audit import SCENARIOS, auditer
+
+
+class Command(BaseCommand):
+    help = (
+        "Rejoue les endpoints de l'API sur la base courante (transaction annulée), "
+        "passe leurs requêtes à EXPLAIN et signale parcours séquentiels, tris sans "
+        "index et clés étrangères non indexées."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--seuil", type=int, default=1000,
+            help="Taille de table (lignes) à partir de laquelle un parcours séquentiel est signalé",
+        )
+        parser.add_argument(
+            "--scenario", action="append", dest="scenarios", choices=[s[0] for s in SCENARIOS],
+            help="Limiter l'audit à ce scénario (répétable)",
+        )
+        parser.add_argument("--json", action="store_true", dest="en_json", help="Rapport complet en JSON")
+        parser.add_argument("--strict", action="store_true", help="Code de sortie non nul si un problème est signalé")
+
+    def handle(self, *args, seuil, scenarios, en_json, strict, **options):
+        try:
+            rapport = auditer(seuil=seuil, noms=scenarios)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if en_json:
+            self.stdout.write(json.dumps(rapport, ensure_ascii=False, indent=2))
+        else:
+            self.afficher(rapport)
+
+        nb_problemes = sum(len(s["problemes"]) for s in rapport["scenarios"]) + len(rapport["cles_sans_index"])
+        if strict and nb_problemes:
+            raise CommandError(f"{nb_problemes} problème(s) d'index détecté(s)")
+
+    def afficher(self, rapport):
+        self.stdout.write(f"Moteur : {rapport['moteur']} ; seuil : {rapport['seuil']} lignes\n")
+        for scenario in rapport["scenarios"]:
+            entete = (
+                f"{scenario['nom']:<30} {scenario['requete']}  "
+                f"[{scenario['statut']}, {scenario['nb_requetes']} requêtes]"
+            )
+            if not scenario["problemes"]:
+                self.stdout.write(self.style.SUCCESS("OK   ") + entete)
+                continue
+            self.stdout.write(self.style.WARNING("PLAN ") + entete)
+            for probleme in scenario["problemes"]:
+                for type, table, detail in probleme["constats"]:
+                    self.stdout.write(f"       - {type} {table} : {detail}".rstrip(" :"))
+                self.stdout.write(f"         {probleme['sql']}")
+
+        if rapport["cles_sans_index"]:
+            self.stdout.write(self.style.WARNING("\nClés étrangères sans index :"))
+            for table, colonne in rapport["cles_sans_index"]:
+                self.stdout.write(f"  - {table}.{colonne}")
+        else:
+            self.stdout.write(self.style.SUCCESS("\nToutes les clés étrangères sont indexées."))
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import AgriculteurProfile
+from api.notes import NOTES, agregats_reels
+
+
+CHAMPS = ["nb_avis", "somme_notes", "note_moyenne", *(f"nb_avis_{note}" for note in NOTES)]
+
+
+class Command(BaseCommand):
+    help = "Recalcule les agrégats de notes des agriculteurs depuis la table Avis et signale les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verifier",
+            action="store_true",
+            help="Signale les écarts sans rien modifier (code de sortie non nul en cas d'écart).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, verifier=False, batch_size=500, **options):
+        agregats = agregats_reels()
+        vide = {champ: 0 for champ in CHAMPS}
+
+        a_corriger = []
+        for profil in AgriculteurProfile.objects.only("id", *CHAMPS).iterator(chunk_size=batch_size):
+            attendu = agregats.get(profil.pk, vide)
+            ecarts = [
+                champ for champ in CHAMPS
+                if abs(getattr(profil, champ) - attendu[champ]) > 1e-9
+            ]
+            if not ecarts:
+                continue
+            self.stdout.write(f"Agriculteur #{profil.pk} : écart sur {', '.join(ecarts)}")
+            for champ in CHAMPS:
+                setattr(profil, champ, attendu[champ])
+            a_corriger.append(profil)
+
+        if verifier:
+            if a_corriger:
+                raise CommandError(f"{len(a_corriger)} agriculteur(s) avec des agrégats faux")
+            self.stdout.write(self.style.SUCCESS("Aucun écart"))
+            return
+
+        with transaction.atomic():
+            AgriculteurProfile.objects.bulk_update(a_corriger, CHAMPS, batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"{len(a_corriger)} agriculteur(s) corrigé(s)"))
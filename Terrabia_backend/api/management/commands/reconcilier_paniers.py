@@ -0,0 +1,53 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from api.models import Panier
+
+
+class Command(BaseCommand):
+    help = "Compare montant_total / nb_articles des paniers en cours à leurs lignes et corrige les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verifier",
+            action="store_true",
+            help="Signale les écarts sans rien modifier (code de sortie non nul en cas d'écart).",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, verifier=False, batch_size=500, **options):
+        paniers = Panier.objects.filter(statut="EN_COURS").annotate(
+            montant_reel=Coalesce(
+                Sum(F("items__quantite") * F("items__produit__prix")),
+                Value(Decimal("0")),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            ),
+            nb_reel=Count("items"),
+        ).only("id", "montant_total", "nb_articles")
+
+        a_corriger = []
+        for panier in paniers.iterator(chunk_size=batch_size):
+            montant_reel = Decimal(panier.montant_reel).quantize(Decimal("0.01"))
+            if panier.montant_total == montant_reel and panier.nb_articles == panier.nb_reel:
+                continue
+            self.stdout.write(
+                f"Panier #{panier.pk} : montant {panier.montant_total} -> {montant_reel}, "
+                f"articles {panier.nb_articles} -> {panier.nb_reel}"
+            )
+            panier.montant_total = montant_reel
+            panier.nb_articles = panier.nb_reel
+            a_corriger.append(panier)
+
+        if verifier:
+            if a_corriger:
+                raise CommandError(f"{len(a_corriger)} panier(s) avec des totaux faux")
+            self.stdout.write(self.style.SUCCESS("Aucun écart"))
+            return
+
+        with transaction.atomic():
+            Panier.objects.bulk_update(a_corriger, ["montant_total", "nb_articles"], batch_size=batch_size)
+        self.stdout.write(self.style.SUCCESS(f"{len(a_corriger)} panier(s) corrigé(s)"))
@@ -0,0 +1,347 @@
+import random
+import secrets
+import time
+from collections import Counter, defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import DurationField, ExpressionWrapper, F, Value
+
+from api import cache
+from api.facets import invalider_facettes
+from api.models import (
+    AcheteurProfile,
+    AgenceLivraison,
+    AgriculteurProfile,
+    Avis,
+    Categorie,
+    Panier,
+    PanierItem,
+    Produit,
+    ProduitPhoto,
+    User,
+)
+from api.notes import NOTES
+
+
+# ------------------------
+# Données de référence
+# ------------------------
+
+# catégorie -> (description, [(produit, prix de base en FCFA)])
+CATALOGUE = {
+    "Fruits": ("Fruits frais de saison", [
+        ("Mangue", 500), ("Ananas", 700), ("Papaye", 600), ("Avocat", 250), ("Banane douce", 1000),
+        ("Orange", 300), ("Pastèque", 1500), ("Goyave", 200), ("Corossol", 1200), ("Prune (safou)", 800),
+    ]),
+    "Légumes": ("Légumes frais du jardin", [
+        ("Tomate", 400), ("Gombo", 300), ("Ndolé", 500), ("Piment", 200), ("Aubergine", 350),
+        ("Poivron", 500), ("Oignon", 600), ("Chou", 700), ("Carotte", 450), ("Folong", 250),
+    ]),
+    "Tubercules": ("Racines et tubercules", [
+        ("Manioc", 1500), ("Igname", 2500), ("Macabo", 2000), ("Patate douce", 1200), ("Taro", 2200),
+        ("Pomme de terre", 1800),
+    ]),
+    "Céréales": ("Céréales et graines", [
+        ("Maïs", 3000), ("Riz local", 6000), ("Mil", 4000), ("Sorgho", 3500),
+    ]),
+    "Légumineuses": ("Haricots, arachides et pois", [
+        ("Haricot rouge", 2500), ("Arachide", 2000), ("Niébé", 2200), ("Soja", 2800),
+    ]),
+    "Plantains": ("Bananes plantains", [("Plantain mûr", 2500), ("Plantain vert", 2000)]),
+    "Épices": ("Épices et condiments", [
+        ("Poivre de Penja", 8000), ("Gingembre", 1000), ("Ail", 1500), ("Djansang", 3000), ("Rondelle", 2000),
+    ]),
+    "Cacao et café": ("Produits de rente", [("Fèves de cacao", 15000), ("Café arabica", 12000), ("Café robusta", 9000)]),
+}
+QUALIFICATIFS = ["", "bio", "du Moungo", "de l'Ouest", "du Centre", "extra", "premier choix", "en gros", "en vrac"]
+ETATS = ["Frais", "Mûr", "Sec", "Bio"]
+VILLES = ["Douala", "Yaoundé", "Bafoussam", "Bamenda", "Garoua", "Maroua", "Ngaoundéré", "Bertoua", "Ebolowa", "Kribi", "Limbé", "Buea"]
+PRENOMS = ["Aïcha", "Boris", "Carine", "Didier", "Estelle", "Fabrice", "Grace", "Hervé", "Inès", "Jean", "Linda", "Marcel", "Nadège", "Paul", "Rose", "Serge", "Yannick", "Zacharie"]
+NOMS = ["Ateba", "Biya", "Eto'o", "Fotso", "Kamga", "Mbappe", "Ngono", "Nkoulou", "Onana", "Tchoupo", "Talla", "Wandji"]
+COMMENTAIRES = {
+    1: ["Produits abîmés à la livraison.", "Très déçu."],
+    2: ["Qualité moyenne, délai long.", "Pas conforme à la description."],
+    3: ["Correct sans plus.", "Bon produit mais un peu cher."],
+    4: ["Bons produits, je recommande.", "Livraison rapide, produits frais."],
+    5: ["Excellent agriculteur !", "Toujours parfait, merci.", "Les meilleurs produits du marché."],
+}
+POIDS_NOTES = [5, 7, 15, 33, 40]
+POIDS_STATUTS = {"VALIDE": 70, "ANNULE": 10}
+MINUTES_PAR_AN = 365 * 24 * 60
+
+
+def poids_zipf(n, exposant=1.1):
+    """Poids cumulés d'une loi de Zipf sur n rangs : quelques éléments très demandés, une longue traîne."""
+    return list(accumulate(1 / (rang ** exposant) for rang in range(1, n + 1)))
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données réaliste pour les tests de charge : agriculteurs, "
+        "acheteurs, catalogue avec photos, paniers dans tous les statuts, avis et "
+        "agences, avec des distributions asymétriques (produits et agriculteurs "
+        "populaires, longue traîne). Insertion par bulk_create, agrégats "
+        "(notes, totaux des paniers) cohérents."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--farmers", type=int, default=50)
+        parser.add_argument("--buyers", type=int, default=500)
+        parser.add_argument("--products", type=int, default=5000)
+        parser.add_argument("--carts", type=int, default=2000)
+        parser.add_argument("--reviews", type=int, default=3000)
+        parser.add_argument("--agences", type=int, default=10)
+        parser.add_argument("--photos", type=float, default=1.0, help="Nombre moyen de photos par produit")
+        parser.add_argument("--password", default="terrabia", help="Mot de passe de tous les comptes générés")
+        parser.add_argument("--seed", type=int, default=None, help="Graine aléatoire (jeu reproductible)")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError("Le moteur doit renvoyer les clés de bulk_create (PostgreSQL, SQLite >= 3.35).")
+        if options["products"] and not options["farmers"]:
+            raise CommandError("--products demande au moins un agriculteur (--farmers).")
+        if options["reviews"] and not (options["buyers"] and options["farmers"]):
+            raise CommandError("--reviews demande des acheteurs et des agriculteurs.")
+        if options["carts"] and not (options["buyers"] and options["products"]):
+            raise CommandError("--carts demande des acheteurs et des produits.")
+
+        self.rng = random.Random(options["seed"])
+        self.lot = options["batch_size"]
+        # Suffixe des emails : plusieurs exécutions cohabitent dans la même base
+        self.tag = secrets.token_hex(3) if options["seed"] is None else f"s{options['seed']}"
+        if User.objects.filter(email__endswith=f".{self.tag}@seed.terrabia.local").exists():
+            raise CommandError(f"Jeu déjà généré avec --seed {options['seed']} : choisir une autre graine.")
+
+        debut = time.perf_counter()
+        categories = self.etape("catégories", self.categories)
+        self.etape("agences", self.agences, options["agences"])
+        # Un seul hachage pour tous les comptes
+        mot_de_passe = make_password(options["password"])
+        agriculteurs = self.etape("agriculteurs", self.utilisateurs, "AGRICULTEUR", options["farmers"], mot_de_passe)
+        acheteurs = self.etape("acheteurs", self.utilisateurs, "ACHETEUR", options["buyers"], mot_de_passe)
+        self.etape("profils acheteurs", self.profils_acheteurs, acheteurs)
+        # Les avis sont tirés avant les profils : les agrégats de notes sont
+        # écrits avec les profils, sans recalcul
+        avis = self.tirer_avis(options["reviews"], acheteurs, len(agriculteurs))
+        profils = self.etape("profils agriculteurs", self.profils_agriculteurs, agriculteurs, avis)
+        self.etape("avis", self.avis, avis, acheteurs, profils)
+        produits = self.etape("produits", self.produits, options["products"], categories, agriculteurs)
+        self.etape("photos", self.photos, produits, options["photos"])
+        self.etape("paniers", self.paniers, options["carts"], acheteurs, produits)
+
+        # bulk_create n'envoie pas post_save : invalidation une fois pour tout le jeu
+        cache.invalider("produits", "categories")
+        invalider_facettes()
+        self.stdout.write(self.style.SUCCESS(
+            f"Jeu « {self.tag} » généré en {time.perf_counter() - debut:.1f}s "
+            f"(comptes *.{self.tag}@seed.terrabia.local, mot de passe « {options['password']} »)"
+        ))
+
+    def etape(self, nom, fonction, *args):
+        debut = time.perf_counter()
+        with transaction.atomic():
+            resultat = fonction(*args)
+        self.stdout.write(f"  {len(resultat)} {nom} en {time.perf_counter() - debut:.1f}s")
+        return resultat
+
+    def creer(self, model, objets):
+        """bulk_create par lots d'un itérable (jamais matérialisé en entier) ; renvoie les clés."""
+        cles = []
+        lot = []
+        for objet in objets:
+            lot.append(objet)
+            if len(lot) >= self.lot:
+                cles += [o.pk for o in model.objects.bulk_create(lot, batch_size=self.lot)]
+                lot = []
+        if lot:
+            cles += [o.pk for o in model.objects.bulk_create(lot, batch_size=self.lot)]
+        return cles
+
+    # ------------------------
+    # Référentiel
+    # ------------------------
+
+    def categories(self):
+        existantes = {c.nom: c for c in Categorie.objects.filter(nom__in=CATALOGUE)}
+        nouvelles = [
+            Categorie(nom=nom, description=description)
+            for nom, (description, _) in CATALOGUE.items() if nom not in existantes
+        ]
+        for categorie in Categorie.objects.bulk_create(nouvelles):
+            existantes[categorie.nom] = categorie
+        return [existantes[nom] for nom in CATALOGUE]
+
+    def agences(self, nombre):
+        return self.creer(AgenceLivraison, (
+            AgenceLivraison(
+                nom_agence=f"Agence {self.rng.choice(VILLES)} {i}",
+                numero_telephone=f"6{self.rng.randrange(10 ** 8):08d}",
+                localite=self.rng.choice(VILLES),
+                email=f"agence{i}.{self.tag}@seed.terrabia.local",
+            )
+            for i in range(nombre)
+        ))
+
+    # ------------------------
+    # Comptes
+    # ------------------------
+
+    def utilisateurs(self, role, nombre, mot_de_passe):
+        prefixe = "agri" if role == "AGRICULTEUR" else "client"
+        return self.creer(User, (
+            User(email=f"{prefixe}{i}.{self.tag}@seed.terrabia.local", role=role, password=mot_de_passe)
+            for i in range(nombre)
+        ))
+
+    def profils_acheteurs(self, acheteurs):
+        return self.creer(AcheteurProfile, (
+            AcheteurProfile(user_id=user_id, nom=self.rng.choice(NOMS), prenom=self.rng.choice(PRENOMS))
+            for user_id in acheteurs
+        ))
+
+    def tirer_avis(self, nombre, acheteurs, nb_agriculteurs):
+        """[(indice auteur, indice agriculteur, note)] ; les agriculteurs populaires reçoivent la plupart des avis."""
+        if not nombre:
+            return []
+        cibles = self.rng.choices(range(nb_agriculteurs), cum_weights=poids_zipf(nb_agriculteurs), k=nombre)
+        auteurs = self.rng.choices(range(len(acheteurs)), cum_weights=poids_zipf(len(acheteurs), 0.8), k=nombre)
+        notes = self.rng.choices(NOTES, weights=POIDS_NOTES, k=nombre)
+        return list(zip(auteurs, cibles, notes))
+
+    def profils_agriculteurs(self, agriculteurs, avis):
+        par_cible = defaultdict(Counter)
+        for _, cible, note in avis:
+            par_cible[cible][note] += 1
+
+        def profils():
+            specialites = [code for code, _ in AgriculteurProfile.SPECIALITE_CHOICES]
+            for indice, user_id in enumerate(agriculteurs):
+                notes = par_cible.get(indice, Counter())
+                nb_avis = sum(notes.values())
+                somme = sum(note * n for note, n in notes.items())
+                yield AgriculteurProfile(
+                    user_id=user_id,
+                    specialite=self.rng.choice(specialites),
+                    nb_avis=nb_avis,
+                    somme_notes=somme,
+                    note_moyenne=somme / nb_avis if nb_avis else 0,
+                    **{f"nb_avis_{note}": notes[note] for note in NOTES},
+                )
+
+        return self.creer(AgriculteurProfile, profils())
+
+    def avis(self, avis, acheteurs, profils):
+        return self.creer(Avis, (
+            Avis(
+                auteur_id=acheteurs[auteur],
+                cible_id=profils[cible],
+                note=note,
+                commentaire=self.rng.choice(COMMENTAIRES[note]),
+            )
+            for auteur, cible, note in avis
+        ))
+
+    # ------------------------
+    # Catalogue
+    # ------------------------
+
+    def produits(self, nombre, categories, agriculteurs):
+        # (catégorie, produit de base, prix de base), catégories et produits
+        # de base pondérés par popularité (Zipf)
+        modeles = [
+            (categorie, nom, prix)
+            for categorie in categories
+            for nom, prix in CATALOGUE[categorie.nom][1]
+        ]
+        self.rng.shuffle(modeles)
+        poids_modeles = poids_zipf(len(modeles), 0.9)
+        # Quelques gros producteurs, beaucoup de petits
+        poids_agriculteurs = poids_zipf(len(agriculteurs), 1.0)
+
+        def produits():
+            for i in range(nombre):
+                categorie, base, prix = self.rng.choices(modeles, cum_weights=poids_modeles)[0]
+                nom = f"{base} {self.rng.choice(QUALIFICATIFS)}".strip()
+                yield Produit(
+                    nom=nom,
+                    quantite=int(self.rng.expovariate(1 / 80)),
+                    prix=Decimal(max(25, round(prix * self.rng.lognormvariate(0, 0.35) / 25) * 25)),
+                    etat=self.rng.choice(ETATS),
+                    categorie_id=categorie.id,
+                    agriculteur_id=self.rng.choices(agriculteurs, cum_weights=poids_agriculteurs)[0],
+                    # bulk_create ne passe pas par Produit.save()
+                    recherche=f"{nom} {categorie.nom} {categorie.description}",
+                )
+
+        return self.creer(Produit, produits())
+
+    def photos(self, produits, moyenne):
+        if moyenne <= 0:
+            return []
+
+        def photos():
+            for produit_id in produits:
+                for j in range(min(5, int(self.rng.expovariate(1 / moyenne) + 0.5))):
+                    fichier = f"produits/seed/{produit_id}_{j}"
+                    yield ProduitPhoto(
+                        produit_id=produit_id,
+                        image=f"{fichier}.jpg",
+                        statut="PRET",
+                        derives={
+                            "source": f"{fichier}.jpg", "largeur": 800, "hauteur": 600,
+                            "tailles": {"miniature": {"fichier": f"{fichier}_200.webp", "largeur": 200, "hauteur": 150}},
+                        },
+                    )
+
+        return self.creer(ProduitPhoto, photos())
+
+    # ------------------------
+    # Paniers
+    # ------------------------
+
+    def paniers(self, nombre, acheteurs, produits):
+        if not nombre:
+            return []
+        # Un seul panier EN_COURS par acheteur : environ un panier sur cinq
+        en_cours = self.rng.sample(acheteurs, min(len(acheteurs), nombre // 5))
+        autres = self.rng.choices(acheteurs, cum_weights=poids_zipf(len(acheteurs), 0.8), k=nombre - len(en_cours))
+        statuts = self.rng.choices(list(POIDS_STATUTS), weights=list(POIDS_STATUTS.values()), k=len(autres))
+
+        cles = []
+        poids_produits = poids_zipf(len(produits))
+        commandes = [(acheteur, "EN_COURS") for acheteur in en_cours] + list(zip(autres, statuts))
+        for debut in range(0, len(commandes), self.lot):
+            lot = commandes[debut:debut + self.lot]
+            paniers = Panier.objects.bulk_create([Panier(acheteur_id=a, statut=s) for a, s in lot])
+            ids = [panier.pk for panier in paniers]
+            PanierItem.objects.bulk_create(self.lignes(ids, produits, poids_produits), batch_size=self.lot)
+            paniers = Panier.objects.filter(pk__gte=min(ids), pk__lte=max(ids))
+            # Montants et nombres d'articles depuis les lignes, un UPDATE par lot
+            paniers.update(**Panier.objects.totaux_reels())
+            # date_creation est auto_now_add : commandes réparties sur l'année
+            # écoulée (décalage pseudo-aléatoire en minutes, tiré de l'id)
+            paniers.exclude(statut="EN_COURS").update(
+                date_creation=F("date_creation") - ExpressionWrapper(
+                    Value(timedelta(minutes=1)) * ((F("id") * 7919) % MINUTES_PAR_AN), output_field=DurationField()
+                )
+            )
+            cles += ids
+        return cles
+
+    def lignes(self, paniers, produits, poids_produits):
+        lignes = []
+        for panier_id in paniers:
+            taille = 1 + min(19, int(self.rng.expovariate(1 / 2.5)))
+            # Produits populaires sur-représentés ; une seule ligne par produit
+            choisis = set(self.rng.choices(produits, cum_weights=poids_produits, k=taille))
+            lignes += [
+                PanierItem(panier_id=panier_id, produit_id=produit_id, quantite=self.rng.choice((1, 1, 1, 2, 2, 3, 5, 10)))
+                for produit_id in choisis
+            ]
+        return lignes
@@ -0,0 +1,127 @@
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+
+# ------------------------
+# Mesures de la requête en cours (Server-Timing)
+# ------------------------
+# InstrumentationMiddleware (TerrabiaApp/middleware.py) ouvre un objet
+# Mesures par requête HTTP ; le code de l'API y ajoute ses segments
+# (auth, serialisation, rendu) avec chrono() sans dépendre du middleware.
+#
+# Les requêtes SQL sont mesurées par un execute_wrapper posé une fois sur
+# chaque connexion, qui lit les mesures de la requête en cours dans une
+# ContextVar. Sous ASGI, l'ORM asynchrone exécute le SQL dans un autre thread
+# (sync_to_async), qui hérite du contexte : les requêtes SQL des vues
+# asynchrones sont comptées comme les autres.
+
+_mesures = contextvars.ContextVar("mesures_requete", default=None)
+
+_lentes = deque(maxlen=getattr(settings, "PERF_LENTES_MAX", 50))
+_lentes_lock = threading.Lock()
+
+
+class Mesures:
+    __slots__ = ("debut", "sql_n", "sql_duree", "sql_max", "sql_max_texte", "requetes", "segments", "rendu_debut")
+
+    def __init__(self, echantillon):
+        self.debut = time.perf_counter()
+        self.sql_n = 0
+        self.sql_duree = 0.0
+        self.sql_max = 0.0
+        self.sql_max_texte = ""
+        # [(sql, durée)] seulement pour les requêtes échantillonnées
+        self.requetes = [] if echantillon else None
+        self.segments = {}
+        self.rendu_debut = None
+
+    def ajouter(self, segment, duree):
+        self.segments[segment] = self.segments.get(segment, 0.0) + duree
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper de Django : appelé autour de chaque requête SQL
+        debut = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duree = time.perf_counter() - debut
+            self.sql_n += 1
+            self.sql_duree += duree
+            if duree > self.sql_max:
+                self.sql_max, self.sql_max_texte = duree, sql
+            if self.requetes is not None:
+                self.requetes.append((sql, duree))
+
+
+def mesurer_sql(execute, sql, params, many, context):
+    mesures = _mesures.get()
+    if mesures is None:
+        return execute(sql, params, many, context)
+    return mesures(execute, sql, params, many, context)
+
+
+def instrumenter(connexion):
+    if mesurer_sql not in connexion.execute_wrappers:
+        connexion.execute_wrappers.append(mesurer_sql)
+
+
+def instrumenter_connexions():
+    """Connexions du thread courant ouvertes avant le chargement du module."""
+    for connexion in connections.all(initialized_only=True):
+        instrumenter(connexion)
+
+
+def connexion_creee(sender, connection, **kwargs):
+    instrumenter(connection)
+
+
+connection_created.connect(connexion_creee)
+
+
+def mesures_en_cours():
+    return _mesures.get()
+
+
+@contextmanager
+def chrono(segment):
+    """Ajoute la durée du bloc au segment `segment` de la requête en cours (s'il y en a une)."""
+    mesures = _mesures.get()
+    if mesures is None:
+        yield
+        return
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        mesures.ajouter(segment, time.perf_counter() - debut)
+
+
+def commencer(echantillon):
+    """Ouvre les mesures d'une requête ; renvoie (mesures, jeton pour terminer())."""
+    mesures = Mesures(echantillon)
+    return mesures, _mesures.set(mesures)
+
+
+def terminer(jeton):
+    _mesures.reset(jeton)
+
+
+def conserver_lente(ligne):
+    with _lentes_lock:
+        _lentes.append(ligne)
+
+
+def requetes_lentes():
+    with _lentes_lock:
+        return list(reversed(_lentes))
+
+
+def ms(secondes):
+    return round(secondes * 1000, 2)
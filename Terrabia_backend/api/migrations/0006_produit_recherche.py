@@ -0,0 +1,53 @@
+# Generated by Django 6.0 on 2026-10-18 18:42
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Value
+from django.db.models.functions import Concat
+
+
+def remplir_recherche(apps, schema_editor):
+    Produit = apps.get_model("api", "Produit")
+    Categorie = apps.get_model("api", "Categorie")
+    categorie = Categorie.objects.filter(pk=OuterRef("categorie_id"))
+    Produit.objects.update(
+        recherche=Concat(
+            F("nom"),
+            Value(" "),
+            Subquery(categorie.values("nom")[:1]),
+            Value(" "),
+            Subquery(categorie.values("description")[:1]),
+            output_field=models.TextField(),
+        )
+    )
+
+
+def creer_index_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS api_produit_recherche_gin "
+        "ON api_produit USING gin (to_tsvector('french', recherche))"
+    )
+
+
+def supprimer_index_postgres(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS api_produit_recherche_gin")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_alter_produit_agriculteur'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produit',
+            name='recherche',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(remplir_recherche, migrations.RunPython.noop),
+        migrations.RunPython(creer_index_postgres, supprimer_index_postgres),
+    ]
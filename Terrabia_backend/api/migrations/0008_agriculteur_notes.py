@@ -0,0 +1,73 @@
+# Generated by Django 6.0 on 2026-10-18 18:46
+
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def remplir_notes(apps, schema_editor):
+    AgriculteurProfile = apps.get_model("api", "AgriculteurProfile")
+    Avis = apps.get_model("api", "Avis")
+    lignes = Avis.objects.order_by().values("cible").annotate(
+        nb_avis=Count("id"),
+        somme_notes=Sum("note"),
+        **{f"nb_avis_{note}": Count("id", filter=Q(note=note)) for note in range(1, 6)},
+    )
+    for ligne in lignes:
+        cible = ligne.pop("cible")
+        ligne["note_moyenne"] = ligne["somme_notes"] / ligne["nb_avis"]
+        AgriculteurProfile.objects.filter(pk=cible).update(**ligne)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis_1',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis_2',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis_3',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis_4',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='nb_avis_5',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='note_moyenne',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='somme_notes',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='agriculteurprofile',
+            index=models.Index(fields=['-note_moyenne', '-nb_avis', 'id'], name='agriculteur_classement_idx'),
+        ),
+        migrations.RunPython(remplir_notes, migrations.RunPython.noop),
+    ]
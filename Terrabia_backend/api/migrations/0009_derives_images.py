@@ -0,0 +1,28 @@
+# Generated by Django 6.0 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_agriculteur_notes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='acheteurprofile',
+            name='photo_derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='agriculteurprofile',
+            name='photo_derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='produitphoto',
+            name='derives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 18:49
+
+from django.db import migrations, models
+
+
+def marquer_photos_pretes(apps, schema_editor):
+    ProduitPhoto = apps.get_model("api", "ProduitPhoto")
+    ProduitPhoto.objects.exclude(derives={}).update(statut="PRET")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_derives_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='produitphoto',
+            name='statut',
+            field=models.CharField(choices=[('EN_ATTENTE', 'En attente'), ('PRET', 'Prêt'), ('ERREUR', 'Erreur')], default='EN_ATTENTE', editable=False, max_length=20),
+        ),
+        migrations.RunPython(marquer_photos_pretes, migrations.RunPython.noop),
+    ]
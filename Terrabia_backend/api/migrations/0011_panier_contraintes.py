@@ -0,0 +1,46 @@
+# Generated by Django 6.0 on 2026-10-18 18:50
+
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def fusionner_doublons(apps, schema_editor):
+    """Prépare les contraintes d'unicité : fusionne paniers en cours et lignes en double."""
+    Panier = apps.get_model("api", "Panier")
+    PanierItem = apps.get_model("api", "PanierItem")
+
+    doublons = (
+        Panier.objects.filter(statut="EN_COURS").values("acheteur")
+        .annotate(n=Count("id"), garde=Min("id")).filter(n__gt=1)
+    )
+    for ligne in doublons:
+        autres = Panier.objects.filter(acheteur=ligne["acheteur"], statut="EN_COURS").exclude(id=ligne["garde"])
+        PanierItem.objects.filter(panier__in=autres).update(panier_id=ligne["garde"])
+        autres.delete()
+
+    doublons = (
+        PanierItem.objects.values("panier", "produit")
+        .annotate(n=Count("id"), garde=Min("id"), total=Sum("quantite")).filter(n__gt=1)
+    )
+    for ligne in doublons:
+        PanierItem.objects.filter(id=ligne["garde"]).update(quantite=ligne["total"])
+        PanierItem.objects.filter(panier=ligne["panier"], produit=ligne["produit"]).exclude(id=ligne["garde"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_produitphoto_statut'),
+    ]
+
+    operations = [
+        migrations.RunPython(fusionner_doublons, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='panier',
+            constraint=models.UniqueConstraint(condition=models.Q(('statut', 'EN_COURS')), fields=('acheteur',), name='panier_en_cours_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='panieritem',
+            constraint=models.UniqueConstraint(fields=('panier', 'produit'), name='panier_item_unique'),
+        ),
+    ]
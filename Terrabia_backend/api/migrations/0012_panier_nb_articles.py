@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 18:53
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def remplir_totaux(apps, schema_editor):
+    Panier = apps.get_model("api", "Panier")
+    PanierItem = apps.get_model("api", "PanierItem")
+    lignes = PanierItem.objects.filter(panier=OuterRef("pk")).order_by().values("panier")
+    Panier.objects.update(
+        nb_articles=Coalesce(Subquery(lignes.annotate(n=Count("id")).values("n")), Value(0))
+    )
+    montant = lignes.annotate(
+        total=Sum(F("quantite") * F("produit__prix"), output_field=DecimalField(max_digits=10, decimal_places=2))
+    ).values("total")
+    Panier.objects.filter(statut="EN_COURS").update(
+        montant_total=Coalesce(Subquery(montant), Value(0), output_field=DecimalField(max_digits=10, decimal_places=2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_panier_contraintes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='panier',
+            name='nb_articles',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(remplir_totaux, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 6.0 on 2026-10-18 19:14
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_panier_nb_articles'),
+    ]
+
+    operations = [
+        # Les index composites d'abord : les requêtes ne perdent jamais leur index
+        migrations.AddIndex(
+            model_name='panier',
+            index=models.Index(fields=['acheteur', 'statut'], name='panier_acheteur_statut_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='panier',
+            index=models.Index(condition=models.Q(('statut', 'VALIDE')), fields=['date_creation'], name='panier_valide_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['categorie', 'prix', 'id'], name='produit_categorie_prix_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['agriculteur', 'id'], name='produit_agriculteur_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='produit',
+            index=models.Index(fields=['prix', 'id'], name='produit_prix_idx'),
+        ),
+        migrations.AlterField(
+            model_name='panier',
+            name='acheteur',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='paniers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='panieritem',
+            name='panier',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.panier'),
+        ),
+        migrations.AlterField(
+            model_name='produit',
+            name='agriculteur',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='produits', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='produit',
+            name='categorie',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='produits', to='api.categorie'),
+        ),
+    ]
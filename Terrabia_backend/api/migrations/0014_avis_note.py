@@ -0,0 +1,45 @@
+# Generated by Django 6.0 on 2026-10-18 20:45
+
+import django.core.validators
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+
+
+def ramener_notes(apps, schema_editor):
+    """Prépare la contrainte : notes hors de 1..5 ramenées à la borne, agrégats des cibles recalculés."""
+    AgriculteurProfile = apps.get_model("api", "AgriculteurProfile")
+    Avis = apps.get_model("api", "Avis")
+    cibles = set(Avis.objects.filter(Q(note__lt=1) | Q(note__gt=5)).values_list("cible", flat=True))
+    if not cibles:
+        return
+    Avis.objects.filter(note__lt=1).update(note=1)
+    Avis.objects.filter(note__gt=5).update(note=5)
+    lignes = Avis.objects.filter(cible__in=cibles).order_by().values("cible").annotate(
+        nb_avis=Count("id"),
+        somme_notes=Sum("note"),
+        **{f"nb_avis_{note}": Count("id", filter=Q(note=note)) for note in range(1, 6)},
+    )
+    for ligne in lignes:
+        cible = ligne.pop("cible")
+        ligne["note_moyenne"] = ligne["somme_notes"] / ligne["nb_avis"]
+        AgriculteurProfile.objects.filter(pk=cible).update(**ligne)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_index_audit'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='avis',
+            name='note',
+            field=models.IntegerField(validators=[django.core.validators.MinValueValidator(1), django.core.validators.MaxValueValidator(5)]),
+        ),
+        migrations.RunPython(ramener_notes, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='avis',
+            constraint=models.CheckConstraint(condition=models.Q(('note__gte', 1), ('note__lte', 5)), name='avis_note_1_a_5'),
+        ),
+    ]
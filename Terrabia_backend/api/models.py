@@ -1,5 +1,10 @@
-from django.db import models
+from decimal import Decimal
+
+from django.db import IntegrityError, connections, models, transaction
+from django.db.models import Count, ExpressionWrapper, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Concat, Now
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
+from django.core.validators import MaxValueValidator, MinValueValidator
 
 
 # ------------------------
@@ -50,6 +55,8 @@ class AcheteurProfile(models.Model):
     nom = models.CharField(max_length=100, blank=True)
     prenom = models.CharField(max_length=100, blank=True)
     photo_profil = models.ImageField(upload_to="acheteurs/", blank=True, null=True)
+    # Versions WebP redimensionnées de photo_profil (voir api/images.py)
+    photo_derives = models.JSONField(default=dict, blank=True, editable=False)
 
     def __str__(self):
         return f"{self.nom} {self.prenom}"
@@ -65,10 +72,32 @@ class AgriculteurProfile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="agriculteur_profile")
     specialite = models.CharField(max_length=20, choices=SPECIALITE_CHOICES)
     photo_profil = models.ImageField(upload_to="agriculteurs/", blank=True, null=True)
+    # Versions WebP redimensionnées de photo_profil (voir api/images.py)
+    photo_derives = models.JSONField(default=dict, blank=True, editable=False)
+
+    # Agrégats des avis reçus, maintenus par api/notes.py
+    # (recalculables avec `manage.py recalculer_notes`)
+    note_moyenne = models.FloatField(default=0)
+    nb_avis = models.PositiveIntegerField(default=0)
+    somme_notes = models.PositiveIntegerField(default=0)
+    nb_avis_1 = models.PositiveIntegerField(default=0)
+    nb_avis_2 = models.PositiveIntegerField(default=0)
+    nb_avis_3 = models.PositiveIntegerField(default=0)
+    nb_avis_4 = models.PositiveIntegerField(default=0)
+    nb_avis_5 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-note_moyenne", "-nb_avis", "id"], name="agriculteur_classement_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.email} - {self.specialite}"
 
+    @property
+    def histogramme(self):
+        return {note: getattr(self, f"nb_avis_{note}") for note in range(1, 6)}
+
 # ------------------------
 # Produits & Catégories
 # ------------------------
@@ -76,25 +105,78 @@ class AgriculteurProfile(models.Model):
 class Categorie(models.Model):
     nom = models.CharField(max_length=100)
     description = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return self.nom
 
+    def save(self, *args, **kwargs):
+        creation = self._state.adding
+        super().save(*args, **kwargs)
+        if creation:
+            return
+        # Le texte de recherche des produits embarque le nom et la description
+        self.produits.update(
+            recherche=Concat(F("nom"), Value(f" {self.nom} {self.description}"), output_field=models.TextField()),
+            updated_at=Now(),
+        )
+
 
 class Produit(models.Model):
     nom = models.CharField(max_length=100)
     quantite = models.IntegerField()
     prix = models.DecimalField(max_digits=10, decimal_places=2)
     etat = models.CharField(max_length=50)
-    categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name="produits")
-    agriculteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name="produits")  # ✅ User au lieu de AgriculteurProfile
+    # Index des clés étrangères remplacés par les index composites de Meta
+    categorie = models.ForeignKey(Categorie, on_delete=models.CASCADE, related_name="produits", db_index=False)
+    agriculteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name="produits", db_index=False)  # ✅ User au lieu de AgriculteurProfile
+    # Texte indexé pour la recherche plein texte (voir api/search.py)
+    recherche = models.TextField(blank=True, default="", editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        # Filtres et tris de api/filters.py, `id` en dernier pour la
+        # pagination par curseur (vérifiables avec `manage.py query_audit`)
+        indexes = [
+            models.Index(fields=["categorie", "prix", "id"], name="produit_categorie_prix_idx"),
+            models.Index(fields=["agriculteur", "id"], name="produit_agriculteur_idx"),
+            models.Index(fields=["prix", "id"], name="produit_prix_idx"),
+        ]
 
     def __str__(self):
         return f"{self.nom} - {self.agriculteur.email}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Prix chargé, pour répercuter un changement sur les paniers en cours
+        instance._prix_initial = instance.__dict__.get("prix")
+        return instance
+
+    def construire_recherche(self):
+        return f"{self.nom} {self.categorie.nom} {self.categorie.description}"
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"nom", "categorie"} & set(update_fields):
+            self.recherche = self.construire_recherche()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "recherche"}
+        super().save(*args, **kwargs)
+
 class ProduitPhoto(models.Model):
+    STATUT_CHOICES = [
+        ("EN_ATTENTE", "En attente"),
+        ("PRET", "Prêt"),
+        ("ERREUR", "Erreur"),
+    ]
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE, related_name="photos")
     image = models.ImageField(upload_to="produits/")
+    # Versions WebP redimensionnées et dimensions de l'original (voir api/images.py)
+    derives = models.JSONField(default=dict, blank=True, editable=False)
+    # Etat des dérivés, générés en arrière-plan (voir api/tasks.py)
+    statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default="EN_ATTENTE", editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"Photo de {self.produit.nom}"
@@ -107,45 +189,230 @@ class ProduitPhoto(models.Model):
 class Avis(models.Model):
     auteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name="avis_donnes")
     cible = models.ForeignKey(AgriculteurProfile, on_delete=models.CASCADE, related_name="avis_recus")
-    note = models.IntegerField()
+    note = models.IntegerField(validators=[MinValueValidator(1), MaxValueValidator(5)])
     commentaire = models.TextField()
 
+    class Meta:
+        constraints = [
+            # Les agrégats de notes (api/notes.py) ne comptent que les notes 1 à 5
+            models.CheckConstraint(condition=models.Q(note__gte=1, note__lte=5), name="avis_note_1_a_5"),
+        ]
+
     def __str__(self):
         return f"Avis {self.note}/5 par {self.auteur.email}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        # (cible, note) en base, pour corriger les agrégats de notes au prochain save/delete
+        etat = (self.__dict__.get("cible_id"), self.__dict__.get("note"))
+        self._initial = None if None in etat else etat
+
 
 # ------------------------
 # Panier
 # ------------------------
 
+class PanierManager(models.Manager):
+    def ajuster(self, panier_id, produit_id, delta_quantite, delta_lignes=0):
+        """
+        Met à jour montant_total et nb_articles d'un panier par delta, en un seul
+        UPDATE (le prix est lu par sous-requête, sans charger le produit).
+        """
+        prix = Produit.objects.filter(pk=produit_id).values("prix")[:1]
+        self.filter(pk=panier_id).update(
+            montant_total=F("montant_total") + ExpressionWrapper(
+                Coalesce(Subquery(prix), Value(Decimal("0"))) * delta_quantite,
+                output_field=models.DecimalField(max_digits=10, decimal_places=2),
+            ),
+            nb_articles=F("nb_articles") + delta_lignes,
+        )
+
+    def recalculer(self, panier_id):
+        """Recalcule montant_total et nb_articles depuis les lignes, en un seul UPDATE."""
+        self.filter(pk=panier_id).update(**self.totaux_reels())
+
+    def totaux_reels(self):
+        """Expressions montant_total / nb_articles calculées depuis les lignes, pour update()."""
+        lignes = PanierItem.objects.filter(panier=OuterRef("pk")).order_by().values("panier")
+        montant = lignes.annotate(
+            total=Sum(F("quantite") * F("produit__prix"), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+        ).values("total")
+        return {
+            "montant_total": Coalesce(Subquery(montant), Value(Decimal("0")), output_field=models.DecimalField(max_digits=10, decimal_places=2)),
+            "nb_articles": Coalesce(Subquery(lignes.annotate(n=Count("id")).values("n")), Value(0)),
+        }
+
+
 class Panier(models.Model):
     STATUT_CHOICES = [
         ("EN_COURS", "En cours"),
         ("VALIDE", "Validé"),
         ("ANNULE", "Annulé"),
     ]
-    acheteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name="paniers")
+    acheteur = models.ForeignKey(User, on_delete=models.CASCADE, related_name="paniers", db_index=False)
     date_creation = models.DateTimeField(auto_now_add=True)
     statut = models.CharField(max_length=20, choices=STATUT_CHOICES, default="EN_COURS")
+    # Tenus à jour à chaque modification des lignes (voir api/signals.py),
+    # recalculables avec `manage.py reconcilier_paniers`
     montant_total = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    nb_articles = models.IntegerField(default=0)
+
+    objects = PanierManager()
+
+    class Meta:
+        constraints = [
+            # Un seul panier en cours par acheteur
+            models.UniqueConstraint(
+                fields=["acheteur"],
+                condition=models.Q(statut="EN_COURS"),
+                name="panier_en_cours_unique",
+            ),
+        ]
+        indexes = [
+            # Paniers d'un acheteur, par statut (remplace l'index de la clé étrangère)
+            models.Index(fields=["acheteur", "statut"], name="panier_acheteur_statut_idx"),
+            # Commandes validées par période (exports), sans les paniers en cours
+            models.Index(fields=["date_creation"], condition=models.Q(statut="VALIDE"), name="panier_valide_date_idx"),
+        ]
 
     def __str__(self):
         return f"Panier {self.id} - {self.acheteur.email}"
 
 
+class PanierItemManager(models.Manager):
+    def ajouter(self, panier_id, produit_id, quantite):
+        """
+        Ajoute `quantite` au produit dans le panier en une seule instruction :
+        INSERT ... ON CONFLICT (panier, produit) DO UPDATE quantite = quantite + n.
+        Renvoie (id, nouvelle quantité, créé) ; créé vient de l'upsert
+        (PostgreSQL) ou d'une lecture dans la même transaction, jamais des
+        quantités. Sans ON CONFLICT ... RETURNING,
+        repli sur un UPDATE avec F() puis un INSERT.
+        """
+        connection = connections[self.db]
+        features = connection.features
+        with transaction.atomic(using=self.db):
+            if features.supports_update_conflicts_with_target and features.can_return_columns_from_insert:
+                table = connection.ops.quote_name(self.model._meta.db_table)
+                if connection.vendor == "postgresql":
+                    # xmax = 0 : ligne insérée, pas réécrite par DO UPDATE
+                    insertion, existait = "(xmax = 0)", None
+                else:
+                    # SQLite : lecture et upsert dans la même transaction ; une
+                    # écriture concurrente entre les deux fait échouer l'upsert
+                    # (base verrouillée) au lieu de fausser `cree`
+                    insertion = "NULL"
+                    existait = self.filter(panier_id=panier_id, produit_id=produit_id).exists()
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"INSERT INTO {table} (panier_id, produit_id, quantite) VALUES (%s, %s, %s) "
+                        f"ON CONFLICT (panier_id, produit_id) "
+                        f"DO UPDATE SET quantite = {table}.quantite + EXCLUDED.quantite "
+                        f"RETURNING id, quantite, {insertion}",
+                        [panier_id, produit_id, quantite],
+                    )
+                    item_id, nouvelle_quantite, inseree = cursor.fetchone()
+                cree = bool(inseree) if existait is None else not existait
+                Panier.objects.ajuster(panier_id, produit_id, quantite, int(cree))
+                return item_id, nouvelle_quantite, cree
+
+            lignes = self.filter(panier_id=panier_id, produit_id=produit_id)
+            if not lignes.update(quantite=F("quantite") + quantite):
+                try:
+                    with transaction.atomic(using=self.db):
+                        # post_save (api/signals.py) met à jour les totaux du panier
+                        item = self.create(panier_id=panier_id, produit_id=produit_id, quantite=quantite)
+                    return item.id, quantite, True
+                except IntegrityError:
+                    lignes.update(quantite=F("quantite") + quantite)
+            Panier.objects.ajuster(panier_id, produit_id, quantite)
+            item_id, nouvelle_quantite = lignes.values_list("id", "quantite").get()
+            return item_id, nouvelle_quantite, False
+
+    def appliquer(self, panier_id, operations):
+        """
+        Applique une suite d'opérations (produit_id, op, quantite), op parmi
+        add / set / remove, avec un nombre de requêtes fixe quelle que soit la
+        taille du lot : lecture verrouillée des lignes concernées, un INSERT
+        ... ON CONFLICT DO UPDATE pour les lignes créées ou modifiées, un
+        DELETE, puis un UPDATE des totaux du panier.
+        Renvoie les quantités finales {produit_id: quantite} (0 = ligne absente).
+        """
+        with transaction.atomic(using=self.db):
+            actuelles = dict(
+                self.select_for_update()
+                .filter(panier_id=panier_id, produit_id__in={produit_id for produit_id, _, _ in operations})
+                .values_list("produit_id", "quantite")
+            )
+            finales = dict(actuelles)
+            for produit_id, op, quantite in operations:
+                if op == "add":
+                    finales[produit_id] = finales.get(produit_id, 0) + quantite
+                elif op == "set":
+                    finales[produit_id] = quantite
+                else:
+                    finales[produit_id] = 0
+
+            a_ecrire = [
+                self.model(panier_id=panier_id, produit_id=produit_id, quantite=quantite)
+                for produit_id, quantite in finales.items()
+                if quantite > 0 and quantite != actuelles.get(produit_id)
+            ]
+            a_supprimer = [produit_id for produit_id, quantite in finales.items() if quantite <= 0 and produit_id in actuelles]
+            if a_ecrire:
+                self.bulk_create(
+                    a_ecrire,
+                    update_conflicts=True,
+                    unique_fields=["panier", "produit"],
+                    update_fields=["quantite"],
+                )
+            if a_supprimer:
+                self.filter(panier_id=panier_id, produit_id__in=a_supprimer).delete()
+            if a_ecrire or a_supprimer:
+                # bulk_create ne déclenche pas post_save : totaux recalculés une fois
+                Panier.objects.recalculer(panier_id)
+        return {produit_id: max(quantite, 0) for produit_id, quantite in finales.items()}
+
+
 class PanierItem(models.Model):
-    panier = models.ForeignKey(Panier, on_delete=models.CASCADE, related_name="items")
+    # Index de panier_item_unique (panier, produit) : pas d'index séparé sur panier
+    panier = models.ForeignKey(Panier, on_delete=models.CASCADE, related_name="items", db_index=False)
     produit = models.ForeignKey(Produit, on_delete=models.CASCADE)
     quantite = models.IntegerField()
 
+    objects = PanierItemManager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["panier", "produit"], name="panier_item_unique"),
+        ]
+
     def __str__(self):
         return f"{self.quantite} x {self.produit.nom}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.memoriser_etat()
+        return instance
+
+    def memoriser_etat(self):
+        # Etat en base, pour calculer le delta des totaux du panier au prochain save/delete.
+        # Lu dans __dict__ : un champ différé (only()) ne doit pas déclencher de requête.
+        etat = (self.__dict__.get("panier_id"), self.__dict__.get("produit_id"), self.__dict__.get("quantite"))
+        self._initial = None if None in etat else etat
+
 class AgenceLivraison(models.Model):
     nom_agence = models.CharField(max_length=150)
     numero_telephone = models.CharField(max_length=20)
     localite = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def __str__(self):
         return f"{self.nom_agence} ({self.localite})"
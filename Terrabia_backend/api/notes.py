@@ -0,0 +1,54 @@
+from django.db.models import Count, F, FloatField, Q, Sum, Value
+from django.db.models.functions import Cast, Coalesce, NullIf
+
+from .models import AgriculteurProfile, Avis
+
+
+# ------------------------
+# Agrégats des notes des agriculteurs
+# ------------------------
+# Chaque création / modification / suppression d'avis (API, admin,
+# suppressions en cascade : signaux de api/signals.py) applique un delta
+# en un seul UPDATE avec des expressions F() : pas de lecture préalable,
+# donc pas de mise à jour perdue entre deux requêtes concurrentes.
+# bulk_create / update() / _raw_delete ne passent pas par les signaux :
+# `manage.py recalculer_notes` corrige ensuite les agrégats.
+
+NOTES = range(1, 6)
+
+
+def appliquer_avis(cible_id, note, signe=1):
+    """Ajoute (signe=1) ou retire (signe=-1) une note des agrégats de `cible_id`."""
+    nb_avis = F("nb_avis") + signe
+    somme_notes = F("somme_notes") + signe * note
+    AgriculteurProfile.objects.filter(pk=cible_id).update(
+        nb_avis=nb_avis,
+        somme_notes=somme_notes,
+        note_moyenne=Coalesce(
+            Cast(somme_notes, FloatField()) / NullIf(Cast(nb_avis, FloatField()), Value(0.0)),
+            Value(0.0),
+        ),
+        **{f"nb_avis_{note}": F(f"nb_avis_{note}") + signe},
+    )
+
+
+def recalculer_avis(cible_id):
+    """Agrégats de `cible_id` recalculés depuis ses avis (état de départ inconnu)."""
+    vide = {"nb_avis": 0, "somme_notes": 0, "note_moyenne": 0, **{f"nb_avis_{note}": 0 for note in NOTES}}
+    agregats = agregats_reels(Avis.objects.filter(cible_id=cible_id)).get(cible_id, vide)
+    AgriculteurProfile.objects.filter(pk=cible_id).update(**agregats)
+
+
+def agregats_reels(avis=None):
+    """Agrégats recalculés depuis la table Avis (ou le queryset `avis`), par profil (une requête)."""
+    lignes = (Avis.objects.all() if avis is None else avis).order_by().values("cible").annotate(
+        nb_avis=Count("id"),
+        somme_notes=Sum("note"),
+        **{f"nb_avis_{note}": Count("id", filter=Q(note=note)) for note in NOTES},
+    )
+    agregats = {}
+    for ligne in lignes:
+        cible = ligne.pop("cible")
+        ligne["note_moyenne"] = ligne["somme_notes"] / ligne["nb_avis"]
+        agregats[cible] = ligne
+    return agregats
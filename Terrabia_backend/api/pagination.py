@@ -0,0 +1,122 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+# ------------------------
+# Pagination par curseur (keyset)
+# ------------------------
+
+class KeysetPagination(CursorPagination):
+    """
+    Pagination par curseur sur un ordre stable (par défaut `id`).
+    Les curseurs `next` / `previous` sont opaques : la page suivante est
+    obtenue par un `WHERE id > ...` indexé, jamais par un OFFSET.
+
+    Compatibilité : les anciens clients qui attendent une liste brute la
+    reçoivent tant qu'ils n'envoient ni `cursor` ni `page_size`
+    (sauf si API_CURSOR_PAGINATION_DEFAULT est activé).
+    `?pagination=off` force la liste brute dans tous les cas.
+    """
+    ordering = "id"
+    page_size_query_param = "page_size"
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        self.page_size = getattr(settings, "API_PAGE_SIZE", 50)
+        return super().get_page_size(request)
+
+    def pagination_active(self, request):
+        mode = request.query_params.get("pagination")
+        if mode == "off":
+            return False
+        if mode == "cursor":
+            return True
+        if self.cursor_query_param in request.query_params:
+            return True
+        if self.page_size_query_param in request.query_params:
+            return True
+        return getattr(settings, "API_CURSOR_PAGINATION_DEFAULT", False)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.pagination_active(request):
+            return None
+        tranche = self.preparer(queryset, request, view)
+        if tranche is None:
+            return None
+        return self.conclure(list(tranche))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """paginate_queryset pour les vues asynchrones : la page est lue avec l'ORM asynchrone."""
+        if not self.pagination_active(request):
+            return None
+        tranche = self.preparer(queryset, request, view)
+        if tranche is None:
+            return None
+        return self.conclure([ligne async for ligne in tranche])
+
+    # CursorPagination.paginate_queryset en deux temps, autour de la seule
+    # lecture en base : le queryset de la page (une ligne de plus pour savoir
+    # s'il y a une suite), puis les positions des curseurs.
+
+    def preparer(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            self.offset, self.reverse, self.current_position = 0, False, None
+        else:
+            self.offset, self.reverse, self.current_position = self.cursor
+
+        if self.reverse:
+            queryset = queryset.order_by(*_reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if self.current_position is not None:
+            order = self.ordering[0]
+            attribut = order.lstrip("-")
+            if self.cursor.reverse != order.startswith("-"):
+                queryset = queryset.filter(**{attribut + "__lt": self.current_position})
+            else:
+                queryset = queryset.filter(**{attribut + "__gt": self.current_position})
+
+        return queryset[self.offset:self.offset + self.page_size + 1]
+
+    def conclure(self, resultats):
+        self.page = list(resultats[:self.page_size])
+
+        if len(resultats) > len(self.page):
+            suite, position_suivante = True, self._get_position_from_instance(resultats[-1], self.ordering)
+        else:
+            suite, position_suivante = False, None
+
+        if self.reverse:
+            # Lu à l'envers : la page est remise dans l'ordre demandé
+            self.page = list(reversed(self.page))
+            self.has_next = self.current_position is not None or self.offset > 0
+            self.has_previous = suite
+            if self.has_next:
+                self.next_position = self.current_position
+            if self.has_previous:
+                self.previous_position = position_suivante
+        else:
+            self.has_next = suite
+            self.has_previous = self.current_position is not None or self.offset > 0
+            if self.has_next:
+                self.next_position = position_suivante
+            if self.has_previous:
+                self.previous_position = self.current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+
+class ClassementPagination(KeysetPagination):
+    """Agriculteurs du mieux noté au moins bien noté."""
+    ordering = ("-note_moyenne", "-nb_avis", "id")
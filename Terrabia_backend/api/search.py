@@ -0,0 +1,135 @@
+import re
+
+from django.db import OperationalError, connections
+from django.db.models import BooleanField, FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+
+# ------------------------
+# Recherche plein texte sur les produits
+# ------------------------
+# Le texte indexé est Produit.recherche (nom du produit + nom et description
+# de la catégorie), maintenu par Produit.save() et Categorie.save().
+#
+# - PostgreSQL : index GIN sur to_tsvector('french', recherche)
+#   (migration 0006), classement par ts_rank.
+# - SQLite : table FTS5 `api_produit_fts` synchronisée par triggers
+#   (installée par installer_index_sqlite au post_migrate), classement bm25.
+# - Autres moteurs : repli sur icontains, sans classement.
+
+FTS_TABLE = "api_produit_fts"
+PRODUIT_TABLE = "api_produit"
+
+_fts5_disponible = {}
+
+
+def termes(texte):
+    """Découpe la saisie utilisateur en mots (aucune syntaxe n'est transmise au moteur)."""
+    return re.findall(r"\w+", texte or "")
+
+
+def rechercher(queryset, texte):
+    """
+    Filtre `queryset` (Produit) sur `texte` et l'annote avec `pertinence`
+    (plus grand = plus pertinent). Chaque mot est cherché en préfixe,
+    tous les mots doivent être présents.
+    """
+    mots = termes(texte)
+    if not mots:
+        return queryset.annotate(pertinence=Value(0.0, output_field=FloatField()))
+
+    connection = connections[queryset.db]
+    if connection.vendor == "postgresql":
+        return _rechercher_postgres(queryset, mots)
+    if connection.vendor == "sqlite" and fts5_disponible(connection):
+        return _rechercher_sqlite(queryset, mots)
+    return _rechercher_icontains(queryset, mots)
+
+
+def _rechercher_postgres(queryset, mots):
+    tsquery = " & ".join(f"{mot}:*" for mot in mots)
+    vecteur = f"to_tsvector('french', \"{PRODUIT_TABLE}\".\"recherche\")"
+    requete = "to_tsquery('french', %s)"
+    return queryset.filter(
+        RawSQL(f"{vecteur} @@ {requete}", [tsquery], output_field=BooleanField())
+    ).annotate(
+        pertinence=RawSQL(f"ts_rank({vecteur}, {requete})", [tsquery], output_field=FloatField())
+    )
+
+
+def _rechercher_sqlite(queryset, mots):
+    match = " ".join(f'"{mot}"*' for mot in mots)
+    return queryset.filter(
+        id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match])
+    ).annotate(
+        pertinence=RawSQL(
+            f"SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH %s AND rowid = \"{PRODUIT_TABLE}\".\"id\"",
+            [match],
+            output_field=FloatField(),
+        )
+    )
+
+
+def _rechercher_icontains(queryset, mots):
+    condition = Q()
+    for mot in mots:
+        condition &= Q(recherche__icontains=mot)
+    return queryset.filter(condition).annotate(pertinence=Value(0.0, output_field=FloatField()))
+
+
+# ------------------------
+# Index FTS5 (SQLite, dev/local)
+# ------------------------
+
+SQLITE_TRIGGERS = {
+    f"{FTS_TABLE}_ai": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {PRODUIT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, recherche) VALUES (new.id, new.recherche);
+        END""",
+    f"{FTS_TABLE}_ad": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {PRODUIT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, recherche) VALUES ('delete', old.id, old.recherche);
+        END""",
+    f"{FTS_TABLE}_au": f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF recherche ON {PRODUIT_TABLE} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, recherche) VALUES ('delete', old.id, old.recherche);
+            INSERT INTO {FTS_TABLE}(rowid, recherche) VALUES (new.id, new.recherche);
+        END""",
+}
+
+
+def fts5_disponible(connection):
+    if connection.alias not in _fts5_disponible:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts5_disponible[connection.alias] = cursor.fetchone() is not None
+    return _fts5_disponible[connection.alias]
+
+
+def installer_index_sqlite(connection):
+    """
+    Crée (ou répare) la table FTS5 et ses triggers. Idempotent : appelé après
+    chaque migrate, car SQLite supprime les triggers quand Django reconstruit
+    la table api_produit (ALTER TABLE non supporté).
+    """
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger') AND name LIKE %s", [f"{FTS_TABLE}%"])
+        existants = {row[0] for row in cursor.fetchall()}
+        if FTS_TABLE in existants and existants.issuperset(SQLITE_TRIGGERS):
+            return
+        try:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"recherche, content='{PRODUIT_TABLE}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+        except OperationalError:
+            # SQLite compilé sans FTS5 : la recherche se replie sur icontains
+            return
+        for sql in SQLITE_TRIGGERS.values():
+            cursor.execute(sql)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts5_disponible.pop(connection.alias, None)
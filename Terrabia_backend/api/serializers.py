@@ -1,6 +1,9 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from .models import AgenceLivraison
+from .fieldsets import ChampsDynamiquesMixin
+from .images import srcset
+from .tasks import photos_modifiees, soumettre, traiter_photos
 
 from .models import (
     AcheteurProfile,
@@ -19,7 +22,7 @@ User = get_user_model()
 # User & Auth
 # ------------------------
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "email", "role"]
@@ -65,16 +68,58 @@ class LoginSerializer(serializers.Serializer):
     password = serializers.CharField()
 
 
+class AgriculteurSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    histogramme = serializers.ReadOnlyField()
+    photo_srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AgriculteurProfile
+        fields = ["id", "user", "specialite", "photo_profil", "photo_srcset", "note_moyenne", "nb_avis", "histogramme"]
+
+    def get_photo_srcset(self, obj):
+        return srcset(obj.photo_derives, self.context.get("request"))
+
+
 # ------------------------
 # Produits & Catégories
 # ------------------------
 
-class ProduitPhotoSerializer(serializers.ModelSerializer):
+class CategorieSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Categorie
+        fields = "__all__"
+
+
+class ProduitPhotoSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
+    # Versions WebP redimensionnées : {"200w": url, "600w": url, ...}
+    srcset = serializers.SerializerMethodField()
+    miniature = serializers.SerializerMethodField()
+    largeur = serializers.SerializerMethodField()
+    hauteur = serializers.SerializerMethodField()
+
     class Meta:
         model = ProduitPhoto
-        fields = ["id", "image"]
+        fields = ["id", "image", "statut", "miniature", "srcset", "largeur", "hauteur"]
+
+    def get_srcset(self, obj):
+        return srcset(obj.derives, self.context.get("request"))
 
-class ProduitSerializer(serializers.ModelSerializer):
+    def get_miniature(self, obj):
+        # Repli sur l'original tant que les dérivés n'existent pas
+        miniature = next(iter(self.get_srcset(obj).values()), None)
+        if miniature or not obj.image:
+            return miniature
+        request = self.context.get("request")
+        return request.build_absolute_uri(obj.image.url) if request else obj.image.url
+
+    def get_largeur(self, obj):
+        return obj.derives.get("largeur")
+
+    def get_hauteur(self, obj):
+        return obj.derives.get("hauteur")
+
+class ProduitSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     # Champ pour uploader les images en écriture
     photos = serializers.ListField(
         child=serializers.ImageField(max_length=None, allow_empty_file=False, use_url=True),
@@ -83,6 +128,7 @@ class ProduitSerializer(serializers.ModelSerializer):
     )
     # Champ read-only pour renvoyer les images liées au produit
     images = ProduitPhotoSerializer(many=True, read_only=True, source="photos")
+    extensions = {"categorie": CategorieSerializer, "agriculteur": UserSerializer}
 
     class Meta:
         model = Produit
@@ -92,23 +138,23 @@ class ProduitSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         photos_data = validated_data.pop("photos", [])
         produit = Produit.objects.create(**validated_data)
-        for photo in photos_data:
-            ProduitPhoto.objects.create(produit=produit, image=photo)
+        if photos_data:
+            # Une seule insertion ; les dérivés sont générés en arrière-plan
+            photos = ProduitPhoto.objects.bulk_create(
+                [ProduitPhoto(produit=produit, image=photo) for photo in photos_data]
+            )
+            photos_modifiees(produit.pk)
+            soumettre(traiter_photos, [photo.pk for photo in photos])
         return produit
 
 
-class CategorieSerializer(serializers.ModelSerializer):
-    class Meta:
-        model = Categorie
-        fields = "__all__"
-
-
 # ------------------------
 # Avis
 # ------------------------
 
-class AvisSerializer(serializers.ModelSerializer):
+class AvisSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     auteur = UserSerializer(read_only=True)
+    extensions = {"cible": AgriculteurSerializer}
 
     class Meta:
         model = Avis
@@ -120,27 +166,39 @@ class AvisSerializer(serializers.ModelSerializer):
 # Panier
 # ------------------------
 
-class PanierItemSerializer(serializers.ModelSerializer):
+class PanierItemSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     produit = ProduitSerializer(read_only=True)
 
     class Meta:
         model = PanierItem
         fields = ["id", "produit", "quantite"]
 
-class PanierSerializer(serializers.ModelSerializer):
+class PanierSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     items = PanierItemSerializer(many=True, read_only=True)
+    extensions = {"acheteur": UserSerializer}
 
     class Meta:
         model = Panier
-        fields = ["id", "acheteur", "date_creation", "statut", "montant_total", "items"]
-        read_only_fields = ["acheteur"]
+        fields = ["id", "acheteur", "date_creation", "statut", "montant_total", "nb_articles", "items"]
+        read_only_fields = ["acheteur", "montant_total", "nb_articles"]
+
+
+class PanierOperationSerializer(serializers.Serializer):
+    produit = serializers.IntegerField(min_value=1)
+    op = serializers.ChoiceField(choices=["add", "set", "remove"], default="add")
+    quantite = serializers.IntegerField(min_value=0, default=1)
+
+    def validate(self, data):
+        if data["op"] == "add" and data["quantite"] < 1:
+            raise serializers.ValidationError({"quantite": "La quantité ajoutée doit être au moins 1."})
+        return data
 
 
 # ------------------------
 # Agence Livraison
 # ------------------------
 
-class AgenceLivraisonSerializer(serializers.ModelSerializer):
+class AgenceLivraisonSerializer(ChampsDynamiquesMixin, serializers.ModelSerializer):
     class Meta:
         model = AgenceLivraison
         fields = ["id", "nom_agence", "numero_telephone", "localite", "email"]
@@ -0,0 +1,173 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import cache
+from .authentication import invalider_utilisateur
+from .facets import invalider_facettes
+from .images import derives_a_jour, supprimer_derives
+from .models import (
+    AcheteurProfile, AgriculteurProfile, Avis, Categorie, Panier, PanierItem, Produit, ProduitPhoto, User,
+)
+from .notes import appliquer_avis, recalculer_avis
+from .tasks import photos_modifiees, soumettre, traiter_photo_profil, traiter_photos
+
+
+# ------------------------
+# Dérivés d'images
+# ------------------------
+# Générés en arrière-plan (api/tasks.py) ; ProduitSerializer.create insère
+# ses photos par bulk_create et soumet lui-même la tâche.
+
+@receiver(post_save, sender=ProduitPhoto)
+def photo_envoyee(sender, instance, **kwargs):
+    if instance.image and not derives_a_jour(instance.image, instance.derives):
+        if instance.statut != "EN_ATTENTE":
+            instance.statut = "EN_ATTENTE"
+            ProduitPhoto.objects.filter(pk=instance.pk).update(statut="EN_ATTENTE")
+        soumettre(traiter_photos, [instance.pk])
+
+
+@receiver(post_save, sender=AcheteurProfile)
+@receiver(post_save, sender=AgriculteurProfile)
+def photo_profil_envoyee(sender, instance, **kwargs):
+    if instance.photo_profil and not derives_a_jour(instance.photo_profil, instance.photo_derives):
+        soumettre(traiter_photo_profil, sender, instance.pk)
+
+
+@receiver(post_delete, sender=ProduitPhoto)
+def photo_supprimee(sender, instance, **kwargs):
+    # Les dérivés remplacés sont effacés par la tâche (api/tasks.py).
+    # Lu dans __dict__ : un champ différé ne peut plus être chargé
+    derives = instance.__dict__.get("derives")
+    transaction.on_commit(lambda: supprimer_derives(derives))
+
+
+@receiver(post_delete, sender=AcheteurProfile)
+@receiver(post_delete, sender=AgriculteurProfile)
+def profil_supprime(sender, instance, **kwargs):
+    derives = instance.__dict__.get("photo_derives")
+    transaction.on_commit(lambda: supprimer_derives(derives))
+
+
+# ------------------------
+# Invalidation des caches du catalogue
+# ------------------------
+
+@receiver([post_save, post_delete], sender=Produit)
+def produit_modifie(sender, instance, **kwargs):
+    etiquettes = ("produits", f"produit:{instance.pk}")
+    cache.invalider(*etiquettes)
+    # Une lecture concurrente a pu remettre l'ancienne version en cache avant le commit
+    transaction.on_commit(lambda: cache.invalider(*etiquettes))
+    # Après le commit : une lecture concurrente recalculerait sinon les anciens comptes
+    transaction.on_commit(invalider_facettes)
+
+
+@receiver([post_save, post_delete], sender=ProduitPhoto)
+def photo_modifiee(sender, instance, **kwargs):
+    photos_modifiees(instance.produit_id)
+
+
+@receiver([post_save, post_delete], sender=Categorie)
+def categorie_modifiee(sender, instance, **kwargs):
+    # Le texte de recherche des produits dépend aussi de la catégorie
+    etiquettes = ("categories", f"categorie:{instance.pk}", "produits")
+    cache.invalider(*etiquettes)
+    transaction.on_commit(lambda: cache.invalider(*etiquettes))
+    transaction.on_commit(invalider_facettes)
+
+
+@receiver([post_save, post_delete], sender=AgriculteurProfile)
+def agriculteur_modifie(sender, **kwargs):
+    transaction.on_commit(invalider_facettes)
+
+
+# ------------------------
+# Totaux des paniers
+# ------------------------
+# montant_total et nb_articles suivent chaque création, modification ou
+# suppression de ligne (PanierItemViewSet, admin, cascades). Le chemin
+# INSERT ... ON CONFLICT de PanierItem.objects.ajouter applique son
+# propre delta, car il ne passe pas par save().
+
+@receiver(post_save, sender=PanierItem)
+def ligne_panier_enregistree(sender, instance, created, **kwargs):
+    initial = getattr(instance, "_initial", None)
+    if created:
+        Panier.objects.ajuster(instance.panier_id, instance.produit_id, instance.quantite, 1)
+    elif initial is not None:
+        panier_id, produit_id, quantite = initial
+        if (panier_id, produit_id) != (instance.panier_id, instance.produit_id):
+            Panier.objects.ajuster(panier_id, produit_id, -quantite, -1)
+            Panier.objects.ajuster(instance.panier_id, instance.produit_id, instance.quantite, 1)
+        elif quantite != instance.quantite:
+            Panier.objects.ajuster(panier_id, produit_id, instance.quantite - quantite)
+    else:
+        # Ligne chargée partiellement : pas d'état de départ, recalcul complet
+        Panier.objects.recalculer(instance.panier_id)
+    instance.memoriser_etat()
+
+
+@receiver(post_delete, sender=PanierItem)
+def ligne_panier_supprimee(sender, instance, **kwargs):
+    panier_id, produit_id, quantite = getattr(instance, "_initial", None) or (
+        instance.panier_id, instance.produit_id, instance.quantite
+    )
+    Panier.objects.ajuster(panier_id, produit_id, -quantite, -1)
+
+
+@receiver(post_save, sender=Produit)
+def prix_modifie(sender, instance, created, **kwargs):
+    ancien_prix = getattr(instance, "_prix_initial", None)
+    prix = Decimal(str(instance.prix))
+    if not created and ancien_prix is not None and prix != ancien_prix:
+        quantite = PanierItem.objects.filter(panier=OuterRef("pk"), produit=instance.pk).values("quantite")[:1]
+        Panier.objects.filter(statut="EN_COURS", items__produit=instance.pk).update(
+            montant_total=F("montant_total") + ExpressionWrapper(
+                Subquery(quantite) * (prix - ancien_prix),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        )
+    instance._prix_initial = prix
+
+
+# ------------------------
+# Agrégats des notes (api/notes.py)
+# ------------------------
+# Toute écriture d'avis, y compris depuis l'admin ou par suppression en
+# cascade d'un auteur, met à jour les agrégats de l'agriculteur noté.
+
+@receiver(post_save, sender=Avis)
+def avis_enregistre(sender, instance, created, **kwargs):
+    initial = getattr(instance, "_initial", None)
+    actuel = (instance.cible_id, instance.note)
+    if created:
+        appliquer_avis(*actuel)
+    elif initial is None:
+        # Avis chargé partiellement : pas d'état de départ, recalcul complet
+        recalculer_avis(instance.cible_id)
+    elif initial != actuel:
+        appliquer_avis(*initial, signe=-1)
+        appliquer_avis(*actuel)
+    instance.memoriser_etat()
+
+
+@receiver(post_delete, sender=Avis)
+def avis_supprime(sender, instance, **kwargs):
+    appliquer_avis(*(getattr(instance, "_initial", None) or (instance.cible_id, instance.note)), signe=-1)
+
+
+# ------------------------
+# Utilisateurs en cache (authentification JWT)
+# ------------------------
+
+@receiver([post_save, post_delete], sender=User)
+def utilisateur_modifie(sender, instance, **kwargs):
+    invalider_utilisateur(instance.pk)
+    # Une requête concurrente a pu remettre l'ancienne ligne en cache avant le commit
+    user_id = instance.pk
+    transaction.on_commit(lambda: invalider_utilisateur(user_id))
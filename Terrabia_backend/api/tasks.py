@@ -0,0 +1,99 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.functions import Now
+
+from . import cache
+from .images import generer_derives, supprimer_derives
+from .models import Produit, ProduitPhoto
+
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------
+# File de tâches locale (traitement des images)
+# ------------------------
+# Pool de threads du processus (pas de broker externe) : le décodage, le
+# redimensionnement et l'écriture des dérivés se font hors de la requête.
+# Les tâches partent après le commit de la transaction, pour que le worker
+# voie les lignes insérées. La base sert de journal : une photo reste
+# EN_ATTENTE tant qu'elle n'a pas été traitée, et `manage.py generer_derives`
+# reprend celles qu'un redémarrage aurait interrompues.
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, "TACHES_WORKERS", 2),
+                thread_name_prefix="terrabia-taches",
+            )
+    return _executor
+
+
+def soumettre(fonction, *args):
+    """Exécute `fonction(*args)` en arrière-plan après le commit courant."""
+    if getattr(settings, "TACHES_SYNCHRONES", False):
+        transaction.on_commit(lambda: fonction(*args))
+        return
+    transaction.on_commit(lambda: executor().submit(_executer, fonction, *args))
+
+
+def _executer(fonction, *args):
+    try:
+        fonction(*args)
+    except Exception:
+        logger.exception("Echec de la tâche %s%r", fonction.__name__, args)
+    finally:
+        # Chaque thread a sa propre connexion : ne pas la laisser ouverte
+        close_old_connections()
+
+
+# ------------------------
+# Tâches
+# ------------------------
+
+def photos_modifiees(produit_id):
+    """Les photos font partie de la représentation du produit (ETag, cache)."""
+    Produit.objects.filter(pk=produit_id).update(updated_at=Now())
+    etiquettes = ("produits", f"produit:{produit_id}")
+    cache.invalider(*etiquettes)
+    # Une lecture concurrente a pu remettre l'ancienne version en cache avant le commit
+    transaction.on_commit(lambda: cache.invalider(*etiquettes))
+
+
+def traiter_photos(photo_ids):
+    produits = set()
+    for photo in ProduitPhoto.objects.filter(pk__in=photo_ids).only("id", "produit_id", "image", "derives"):
+        try:
+            derives = generer_derives(photo.image)
+        except Exception:
+            # Une photo en échec ne reste pas EN_ATTENTE et n'arrête pas le lot
+            logger.exception("Echec des dérivés de la photo #%s", photo.pk)
+            derives = None
+        ProduitPhoto.objects.filter(pk=photo.pk).update(
+            derives=derives or {},
+            statut="PRET" if derives else "ERREUR",
+        )
+        # Dérivés de l'image précédente (photo remplacée ou régénérée)
+        supprimer_derives(photo.derives, conserves=derives)
+        produits.add(photo.produit_id)
+    for produit_id in produits:
+        photos_modifiees(produit_id)
+
+
+def traiter_photo_profil(model, pk):
+    profil = model.objects.only("id", "photo_profil", "photo_derives").filter(pk=pk).first()
+    if profil is None or not profil.photo_profil:
+        return
+    derives = generer_derives(profil.photo_profil)
+    model.objects.filter(pk=pk).update(photo_derives=derives or {})
+    supprimer_derives(profil.photo_derives, conserves=derives)
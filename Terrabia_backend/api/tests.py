@@ -1,3 +1,1388 @@
-from django.test import TestCase
+import importlib
+import json
+import logging
+import tempfile
+from collections import Counter
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import AsyncClient, AsyncRequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve
+from PIL import Image
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework.throttling import UserRateThrottle
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import asynchrone, cache, throttling, urls, views
+from .audit import SCENARIOS, normaliser, remplir
+from .authentication import CachedJWTAuthentication, cle_utilisateur
+from .mesures import instrumenter, mesurer_sql
+from .notes import agregats_reels
+from .search import fts5_disponible
+
+from .models import (
+    User,
+    AgriculteurProfile,
+    Categorie,
+    Produit,
+    ProduitPhoto,
+    Avis,
+    Panier,
+    PanierItem,
+    AgenceLivraison,
+)
+
+
+# ------------------------
+# Journaux
+# ------------------------
+
+class JournauxDiscretsMixin:
+    """Pas de ligne terrabia.perf / api par requête dans la sortie des tests."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for nom in ("terrabia.perf", "api"):
+            journal = logging.getLogger(nom)
+            cls.addClassCleanup(journal.setLevel, journal.level)
+            journal.setLevel(logging.WARNING)
+
+
+# ------------------------
+# Pas de requêtes N+1 sur les listes
+# ------------------------
+
+class ListeRequetesConstantesTests(JournauxDiscretsMixin, TestCase):
+    """
+    Une liste doit coûter le même nombre de requêtes SQL
+    qu'elle renvoie 1 ligne ou 10.
+    """
+
+    def setUp(self):
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.profil = AgriculteurProfile.objects.create(user=self.agriculteur, specialite="FRUIT")
+        self.acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        self.categorie = Categorie.objects.create(nom="Fruits")
+        self.panier = Panier.objects.create(acheteur=self.acheteur, statut="EN_COURS")
+        self.client = APIClient()
+        self.client.force_authenticate(self.acheteur)
+
+    def ajouter_lignes(self, n):
+        for i in range(n):
+            produit = Produit.objects.create(
+                nom=f"Banane {i}", quantite=10, prix=100 + i, etat="frais",
+                categorie=self.categorie, agriculteur=self.agriculteur,
+            )
+            ProduitPhoto.objects.create(produit=produit, image=f"produits/{i}.jpg")
+            ProduitPhoto.objects.create(produit=produit, image=f"produits/{i}b.jpg")
+            PanierItem.objects.create(panier=self.panier, produit=produit, quantite=1)
+            auteur = User.objects.create_user(f"auteur{i}-{self.id_lot}@test.cm", "x")
+            Avis.objects.create(auteur=auteur, cible=self.profil, note=4, commentaire="Bien")
+            AgenceLivraison.objects.create(
+                nom_agence=f"Agence {i}", numero_telephone="600000000",
+                localite="Douala", email=f"agence{i}-{self.id_lot}@test.cm",
+            )
+            Categorie.objects.create(nom=f"Categorie {i}-{self.id_lot}")
+        self.id_lot += 1
+
+    def compter_requetes(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, url)
+        return len(ctx.captured_queries)
+
+    def test_listes_sans_n_plus_un(self):
+        urls = [
+            "/api/produits/",
+            "/api/produits/?page_size=50",
+            "/api/categories/",
+            "/api/avis/",
+            "/api/paniers/",
+            "/api/items/",
+            "/api/agences/",
+            "/api/panier/utilisateur/",
+        ]
+        self.id_lot = 0
+        self.ajouter_lignes(1)
+        petites = {url: self.compter_requetes(url) for url in urls}
+        self.ajouter_lignes(9)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.compter_requetes(url), petites[url])
+
+
+# ------------------------
+# Pagination par curseur
+# ------------------------
+
+class PaginationTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        caches["catalogue"].clear()
+        self.ids = [
+            AgenceLivraison.objects.create(
+                nom_agence=f"Agence {i}", numero_telephone="600000000", localite="Douala", email=f"agence{i}@test.cm",
+            ).pk
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR"))
+
+    def test_liste_brute_par_defaut(self):
+        data = self.client.get("/api/agences/").data
+        self.assertEqual([ligne["id"] for ligne in data], self.ids)
+        data = self.client.get("/api/agences/", {"page_size": 2, "pagination": "off"}).data
+        self.assertEqual(len(data), 5)
+
+    def test_pages_par_curseur(self):
+        page = self.client.get("/api/agences/", {"page_size": 2}).data
+        ids = [ligne["id"] for ligne in page["results"]]
+        while page["next"]:
+            page = self.client.get(page["next"]).data
+            ids += [ligne["id"] for ligne in page["results"]]
+        self.assertEqual(ids, self.ids)
+        self.assertEqual(len(self.client.get("/api/agences/", {"pagination": "cursor"}).data["results"]), 5)
+
+    @override_settings(API_CURSOR_PAGINATION_DEFAULT=True, API_PAGE_SIZE=2)
+    def test_pagination_par_defaut(self):
+        page = self.client.get("/api/agences/").data
+        self.assertEqual([ligne["id"] for ligne in page["results"]], self.ids[:2])
+        self.assertIsNotNone(page["next"])
+        self.assertEqual(len(self.client.get("/api/agences/", {"pagination": "off"}).data), 5)
+
+
+# ------------------------
+# Cache du catalogue
+# ------------------------
+
+class CacheCatalogueTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        caches["catalogue"].clear()
+        cache.stats.reset()
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.produit = Produit.objects.create(
+            nom="Mangue", quantite=3, prix="500", etat="mûr",
+            categorie=Categorie.objects.create(nom="Fruits"), agriculteur=self.agriculteur,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agriculteur)
+
+    def test_ecriture_puis_lecture(self):
+        url = f"/api/produits/{self.produit.pk}/"
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cache.stats.as_dict(), {"hits": 1, "misses": 1, "invalidations": 0})
+
+        response = self.client.patch(url, {"quantite": 8}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(cache.stats.as_dict()["invalidations"], 0)
+
+        avant = cache.stats.as_dict()
+        self.assertEqual(self.client.get(url).data["quantite"], 8)
+        apres = cache.stats.as_dict()
+        self.assertEqual((apres["hits"], apres["misses"]), (avant["hits"], avant["misses"] + 1))
+
+    def test_remise_en_cache_avant_commit(self):
+        photo = ProduitPhoto.objects.create(produit=self.produit)
+        for url, ecrire in (
+            (f"/api/produits/{self.produit.pk}/", lambda: self.produit.save()),
+            (f"/api/produits/{self.produit.pk}/", lambda: photo.save()),
+            (f"/api/categories/{self.produit.categorie_id}/", lambda: self.produit.categorie.save()),
+        ):
+            with self.subTest(url=url):
+                with self.captureOnCommitCallbacks(execute=True):
+                    ecrire()
+                    # Lecture concurrente entre l'écriture et le commit
+                    self.client.get(url)
+                avant = cache.stats.as_dict()
+                self.client.get(url)
+                self.assertEqual(cache.stats.as_dict()["misses"], avant["misses"] + 1)
+
+
+# ------------------------
+# GET conditionnels (ETag / Last-Modified)
+# ------------------------
+
+class GetConditionnelTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.categorie = Categorie.objects.create(nom="Fruits")
+        self.produit = Produit.objects.create(
+            nom="Mangue", quantite=3, prix="500", etat="mûr", categorie=self.categorie, agriculteur=self.agriculteur,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.agriculteur)
+
+    def test_cle_mal_formee_404(self):
+        for url in ("/api/produits/abc/", "/api/categories/abc/", "/api/agences/abc/", "/api/photos/abc/"):
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+        # La vue asynchrone renvoie vers le même chemin synchrone
+        requete = AsyncRequestFactory().get(
+            "/api/produits/abc/", headers={"authorization": f"Bearer {AccessToken.for_user(self.agriculteur)}"},
+        )
+        requete.resolver_match = resolve(requete.path)
+        response = async_to_sync(asynchrone.produit)(requete, pk="abc")
+        self.assertEqual(response.render().status_code, 404)
+
+    def test_304_si_inchange(self):
+        for url in ("/api/produits/", f"/api/produits/{self.produit.pk}/"):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                etag, last_modified = response["ETag"], response["Last-Modified"]
+
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"autre"').status_code, 200)
+
+    def test_etag_change_apres_ecriture(self):
+        url_detail = f"/api/produits/{self.produit.pk}/"
+        avant = {url: self.client.get(url)["ETag"] for url in ("/api/produits/", url_detail)}
+
+        self.produit.quantite = 7
+        self.produit.save()
+        autre = Produit.objects.create(
+            nom="Papaye", quantite=1, prix="300", etat="mûr", categorie=self.categorie, agriculteur=self.agriculteur,
+        )
+
+        for url, etag in avant.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(self.client.get(url_detail).data["quantite"], 7)
+
+        # Une suppression change le compte de la liste
+        etag = self.client.get("/api/produits/")["ETag"]
+        autre.delete()
+        self.assertEqual(self.client.get("/api/produits/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_expand_suit_les_objets_lies(self):
+        urls = ("/api/produits/?expand=categorie,agriculteur", f"/api/produits/{self.produit.pk}/?expand=categorie,agriculteur")
+        for url in urls:
+            self.client.get(url)
+
+        self.categorie.nom = "Fruits tropicaux"
+        self.categorie.save()
+        self.agriculteur.email = "ferme@test.cm"
+        self.agriculteur.save()
+
+        liste, detail = (self.client.get(url) for url in urls)
+        for produit in (liste.data[0], detail.data):
+            self.assertEqual(produit["categorie"]["nom"], "Fruits tropicaux")
+            self.assertEqual(produit["agriculteur"]["email"], "ferme@test.cm")
+        self.assertNotIn("ETag", detail)
+
+        # Même lecture par la vue asynchrone
+        requete = AsyncRequestFactory().get(
+            urls[1], headers={"authorization": f"Bearer {AccessToken.for_user(self.agriculteur)}"},
+        )
+        requete.resolver_match = resolve(requete.path)
+        data = json.loads(async_to_sync(asynchrone.produit)(requete, pk=self.produit.pk).content)
+        self.assertEqual(data["categorie"]["nom"], "Fruits tropicaux")
+
+
+# ------------------------
+# Lecture rapide (API_LECTURE_RAPIDE)
+# ------------------------
+
+class LectureRapideTests(JournauxDiscretsMixin, TestCase):
+    """La lecture rapide doit rendre exactement les mêmes octets que les serializers."""
+
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        categorie = Categorie.objects.create(nom="Fruits", description="Fruits frais")
+        for i in range(3):
+            produit = Produit.objects.create(
+                nom=f"Mangue {i}", quantite=i, prix=f"{i}.5", etat="mûr",
+                categorie=categorie, agriculteur=agriculteur,
+            )
+            ProduitPhoto.objects.create(produit=produit, image=f"produits/{i}.jpg")
+        ProduitPhoto.objects.filter(produit=produit).update(derives={
+            "source": f"produits/{i}.jpg", "largeur": 800, "hauteur": 600,
+            "tailles": {"miniature": {"fichier": f"produits/derives/{i}_200.webp", "largeur": 200, "hauteur": 150}},
+        })
+        AgenceLivraison.objects.create(
+            nom_agence="Agence", numero_telephone="600000000", localite="Douala", email="agence@test.cm",
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(agriculteur)
+
+    def test_sortie_identique(self):
+        urls = [
+            "/api/produits/",
+            "/api/produits/?page_size=2",
+            "/api/produits/?q=mangue&ordering=-prix",
+            "/api/categories/",
+            "/api/agences/",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with self.settings(API_LECTURE_RAPIDE=False):
+                    attendu = self.client.get(url)
+                cache.invalider("produits", "categories")
+                with self.settings(API_LECTURE_RAPIDE=True):
+                    obtenu = self.client.get(url)
+                self.assertEqual(obtenu.status_code, 200)
+                self.assertEqual(obtenu.content, attendu.content)
+
+
+# ------------------------
+# Vues asynchrones (API_VUES_ASYNC)
+# ------------------------
+
+class VuesAsynchronesTests(JournauxDiscretsMixin, TestCase):
+    """Les vues de api.asynchrone rendent les mêmes statuts, octets et validateurs que les vues DRF."""
+
+    EN_TETES = ("Content-Type", "ETag", "Last-Modified", "Allow")
+
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        categorie = Categorie.objects.create(nom="Fruits", description="Fruits frais")
+        panier = Panier.objects.create(acheteur=acheteur, statut="EN_COURS")
+        for i in range(3):
+            self.produit = Produit.objects.create(
+                nom=f"Mangue {i}", quantite=i + 1, prix=f"{i}.5", etat="mûr",
+                categorie=categorie, agriculteur=agriculteur,
+            )
+            ProduitPhoto.objects.create(produit=self.produit, image=f"produits/{i}.jpg")
+            PanierItem.objects.create(panier=panier, produit=self.produit, quantite=1)
+        AgenceLivraison.objects.create(
+            nom_agence="Agence", numero_telephone="600000000", localite="Douala", email="agence@test.cm",
+        )
+        self.jeton = f"Bearer {AccessToken.for_user(acheteur)}"
+        self.agriculteur = agriculteur
+        fts5_disponible(connection)
+
+    def comparer(self, url, vue, kwargs=None, entetes=None, repli=False):
+        """(réponse DRF, réponse asynchrone), caches vidés avant chaque appel."""
+        entetes = {"authorization": self.jeton, **(entetes or {})}
+        caches["catalogue"].clear()
+        attendu = APIClient().get(url, headers=entetes)
+        caches["catalogue"].clear()
+        requete = AsyncRequestFactory().get(url, headers=entetes)
+        requete.resolver_match = resolve(requete.path)
+        obtenu = async_to_sync(vue)(requete, **(kwargs or {}))
+        # Réponse de la vue DRF de repli, rendue ensuite par le gestionnaire de Django
+        self.assertEqual(isinstance(obtenu, Response), repli)
+        if repli:
+            obtenu.render()
+        self.assertEqual(obtenu.status_code, attendu.status_code)
+        self.assertEqual(obtenu.content, attendu.content)
+        for en_tete in self.EN_TETES:
+            self.assertEqual(obtenu.get(en_tete), attendu.get(en_tete), en_tete)
+        self.assertIn("Accept", obtenu.get("Vary", ""))
+        return attendu, obtenu
+
+    def test_sortie_identique(self):
+        pk = {"pk": str(self.produit.id)}
+        cas = [
+            ("/api/produits/", asynchrone.produits, None),
+            ("/api/produits/?page_size=2", asynchrone.produits, None),
+            ("/api/produits/?q=mangue&ordering=-prix", asynchrone.produits, None),
+            ("/api/produits/?fields=id,nom&expand=categorie", asynchrone.produits, None),
+            (f"/api/produits/{self.produit.id}/", asynchrone.produit, pk),
+            ("/api/categories/", asynchrone.categories, None),
+            ("/api/agences/?page_size=1", asynchrone.agences, None),
+            ("/api/panier/utilisateur/", asynchrone.panier_utilisateur, None),
+        ]
+        for rapide in (False, True):
+            for url, vue, kwargs in cas:
+                with self.subTest(url=url, rapide=rapide), self.settings(API_LECTURE_RAPIDE=rapide):
+                    attendu, _ = self.comparer(url, vue, kwargs)
+                    self.assertEqual(attendu.status_code, 200)
+
+        # Page suivante (curseur) et GET conditionnel
+        page = self.comparer("/api/produits/?page_size=2", asynchrone.produits)[1]
+        suivante = json.loads(page.content)["next"]
+        self.comparer(suivante.replace("http://testserver", ""), asynchrone.produits)
+        _, obtenu = self.comparer(
+            f"/api/produits/{self.produit.id}/", asynchrone.produit, pk, {"if-none-match": page["ETag"]},
+        )
+        etag = obtenu["ETag"]
+        _, obtenu = self.comparer(f"/api/produits/{self.produit.id}/", asynchrone.produit, pk, {"if-none-match": etag})
+        self.assertEqual(obtenu.status_code, 304)
+
+    def test_repli_sur_la_vue_drf(self):
+        # Jeton refusé, produit introuvable, paramètre invalide, rendu HTML ; panier vide servi en asynchrone
+        self.jeton = "Bearer invalide"
+        self.assertEqual(self.comparer("/api/produits/", asynchrone.produits, repli=True)[1].status_code, 401)
+        self.jeton = f"Bearer {AccessToken.for_user(self.agriculteur)}"
+        self.assertEqual(
+            self.comparer("/api/produits/0/", asynchrone.produit, {"pk": "0"}, repli=True)[1].status_code, 404,
+        )
+        self.assertEqual(self.comparer("/api/produits/?prix_min=x", asynchrone.produits, repli=True)[1].status_code, 400)
+        # API navigable : jeton CSRF différent à chaque rendu, seul le repli est vérifié
+        requete = AsyncRequestFactory().get("/api/produits/", headers={"authorization": self.jeton, "accept": "text/html"})
+        self.assertIsInstance(async_to_sync(asynchrone.produits)(requete), Response)
+        self.assertEqual(self.comparer("/api/panier/utilisateur/", asynchrone.panier_utilisateur)[1].status_code, 200)
+
+    def test_mesures_sql_sous_asgi(self):
+        # Connexion ouverte avant le chargement du middleware : pas encore instrumentée
+        connection.execute_wrappers.remove(mesurer_sql)
+        self.addCleanup(instrumenter, connection)
+        response = async_to_sync(AsyncClient().get)("/api/categories/", headers={"authorization": self.jeton})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(mesurer_sql, connection.execute_wrappers)
+        self.assertNotIn('desc="0 req"', response["Server-Timing"])
+
+    def test_actions_du_viewset_avec_vues_asynchrones(self):
+        # Routes lues à l'import : URLconf rechargée avec le drapeau, puis sans
+        def recharger():
+            importlib.reload(urls)
+            importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+            clear_url_caches()
+
+        self.addCleanup(recharger)
+        with self.settings(API_VUES_ASYNC=True):
+            recharger()
+        self.assertIs(resolve(f"/api/produits/{self.produit.id}/").func, asynchrone.produit)
+        self.assertEqual(resolve("/api/produits/facets/").url_name, "produit-facets")
+        self.assertEqual(resolve("/api/produits/import/").url_name, "produit-importer")
+
+        client = APIClient()
+        client.force_authenticate(self.agriculteur)
+        self.assertEqual(client.get("/api/produits/facets/").status_code, 200)
+        self.assertEqual(client.post("/api/produits/import/").status_code, 400)
+
+    def test_repli_compte_une_seule_requete(self):
+        # Limite vérifiée avant la lecture asynchrone : le repli ne la recompte pas
+        class Limite(UserRateThrottle):
+            rate = "2/min"
+
+        caches["default"].clear()
+        self.addCleanup(caches["default"].clear)
+        with mock.patch.object(views.ProduitViewSet, "throttle_classes", [Limite]):
+            statuts = []
+            for _ in range(3):
+                requete = AsyncRequestFactory().get("/api/produits/0/", headers={"authorization": self.jeton})
+                requete.resolver_match = resolve(requete.path)
+                statuts.append(async_to_sync(asynchrone.produit)(requete, pk="0").render().status_code)
+        self.assertEqual(statuts, [404, 404, 429])
+
+
+# ------------------------
+# Budgets de requêtes SQL et d'octets par endpoint
+# ------------------------
+# Une ligne par endpoint de api/urls.py : nombre exact de requêtes SQL et
+# taille maximale de la réponse (octets), pour des jeux de 1, 10 et 100 lignes
+# (BudgetRequetesTests.peupler). Un nombre seul vaut pour les trois tailles ;
+# sinon {taille: valeur}. Un budget qui bouge doit être mis à jour ici, en
+# connaissance de cause : une requête par ligne (N+1) fait échouer le test
+# avec la liste des requêtes émises.
+# {…} est remplacé par les identifiants du jeu (voir peupler) ; une donnée
+# appelable est construite à chaque appel (fichier envoyé en multipart).
+
+def fichier_import():
+    contenu = "nom,quantite,prix,etat,categorie\nPapaye,10,250,frais,Fruits\n"
+    return {"fichier": SimpleUploadedFile("produits.csv", contenu.encode())}
+
+
+BUDGETS_REQUETES = [
+    # (nom, méthode, url, données, utilisateur, requêtes, octets max)
+    ("inscription", "post", "/api/register/", {"email": "nouveau{taille}@test.cm", "password": "x"}, None,
+     3, 58),
+    ("connexion", "post", "/api/login/", {"email": "acheteur@test.cm", "password": "x"}, None,
+     1, 700),
+    ("contact", "post", "/api/contact/", {"user_id": "{vendeur}", "mode": "whatsapp"}, "acheteur",
+     1, 64),
+    ("categories", "get", "/api/categories/", None, "acheteur",
+     2, {1: 230, 10: 1300, 100: 12000}),
+    ("categorie", "get", "/api/categories/{categorie}/", None, "acheteur",
+     2, 110),
+    ("produits", "get", "/api/produits/", None, "acheteur",
+     3, {1: 570, 10: 5700, 100: 58000}),
+    ("produits pagines", "get", "/api/produits/?page_size=20", None, "acheteur",
+     3, {1: 610, 10: 5700, 100: 12000}),
+    # Sans ETag (objets liés) : pas d'agrégat de validation
+    ("produits etendus", "get", "/api/produits/?page_size=20&expand=categorie,agriculteur", None, "acheteur",
+     2, {1: 780, 10: 7400, 100: 15000}),
+    ("recherche", "get", "/api/produits/?q=banane&ordering=-prix&page_size=20", None, "acheteur",
+     3, {1: 610, 10: 5700, 100: 12000}),
+    ("produit", "get", "/api/produits/{produit}/", None, "acheteur",
+     3, 560),
+    ("facettes", "get", "/api/produits/facets/", None, "acheteur",
+     4, 400),
+    ("creation produit", "post", "/api/produits/",
+     {"nom": "Papaye", "quantite": 3, "prix": "250.00", "etat": "frais", "categorie": "{categorie}"}, "agriculteur",
+     3, 140),
+    ("import produits", "post", "/api/produits/import/", fichier_import, "agriculteur",
+     4, 60),
+    ("photos", "get", "/api/photos/", None, "acheteur",
+     2, {1: 430, 10: 4300, 100: 44000}),
+    ("photo", "get", "/api/photos/{photo}/", None, "acheteur",
+     2, 210),
+    ("avis", "get", "/api/avis/", None, "acheteur",
+     1, {1: 140, 10: 1400, 100: 14000}),
+    ("avis etendus", "get", "/api/avis/?page_size=20&expand=cible", None, "acheteur",
+     1, {1: 440, 10: 3900, 100: 7900}),
+    ("un avis", "get", "/api/avis/{avis}/", None, "acheteur",
+     1, 140),
+    ("creation avis", "post", "/api/avis/", {"cible": "{profil}", "note": 5, "commentaire": "Top"}, "agriculteur",
+     5, 140),
+    ("paniers", "get", "/api/paniers/", None, "acheteur",
+     3, {1: 770, 10: 6200, 100: 62000}),
+    ("panier", "get", "/api/paniers/{panier}/", None, "acheteur",
+     3, {1: 770, 10: 6200, 100: 62000}),
+    ("lignes de panier", "get", "/api/items/", None, "acheteur",
+     2, {1: 1200, 10: 13000, 100: 130000}),
+    ("ligne de panier", "get", "/api/items/{item}/", None, "acheteur",
+     2, 600),
+    ("agences", "get", "/api/agences/", None, "acheteur",
+     2, {1: 140, 10: 1400, 100: 14000}),
+    ("agence", "get", "/api/agences/{agence}/", None, "acheteur",
+     2, 140),
+    ("agence whatsapp", "get", "/api/agences/{agence}/contact-whatsapp/", None, "acheteur",
+     1, 110),
+    ("agriculteurs", "get", "/api/agriculteurs/", None, "acheteur",
+     1, {1: 500, 10: 2800, 100: 26000}),
+    ("agriculteur", "get", "/api/agriculteurs/{profil}/", None, "acheteur",
+     1, 250),
+    # SQLite : lecture de la ligne avant l'upsert (ligne créée ou non)
+    ("ajout au panier", "post", "/api/panier/ajouter/", {"produit": "{produit}", "quantite": 1}, "acheteur",
+     8, 610),
+    ("panier utilisateur", "get", "/api/panier/utilisateur/", None, "acheteur",
+     3, {1: 600, 10: 5300, 100: 53000}),
+    # Avec une seule ligne, les deux opérations portent sur le même produit.
+    # delete() relit les lignes retirées et post_delete ajuste les totaux
+    # une fois par ligne (une seule ici)
+    ("panier par lot", "post", "/api/panier/batch/",
+     {"operations": [{"produit": "{produit}", "op": "add"}, {"produit": "{autre_produit}", "op": "remove"}]}, "acheteur",
+     {1: 13, 10: 15, 100: 15}, {1: 76, 10: 4800, 100: 53000}),
+    ("panier (ancienne url)", "get", "/panier/", None, "acheteur",
+     3, {1: 600, 10: 5300, 100: 53000}),
+    ("ajout (ancienne url)", "post", "/panier/ajouter/", {"produit": "{produit}"}, "acheteur",
+     8, 610),
+    ("commande", "post", "/api/commandes/", {"agence_livraison": "{agence}"}, "acheteur",
+     9, 220),
+    # Compteurs du processus (valeurs variables) ; aucune requête lente conservée (seuil à 0)
+    ("stats cache", "get", "/api/cache/stats/", None, "admin",
+     0, 200),
+    ("stats authentification", "get", "/api/auth/stats/", None, "admin",
+     0, 200),
+    ("requetes lentes", "get", "/api/perf/lentes/", None, "admin",
+     0, 2),
+    ("export commandes", "get", "/api/exports/commandes.ndjson", None, "admin",
+     1, {1: 260, 10: 2600, 100: 27000}),
+    ("export produits", "get", "/api/exports/produits.csv", None, "admin",
+     1, {1: 180, 10: 1200, 100: 11000}),
+    ("export avis", "get", "/api/exports/avis.ndjson.gz", None, "admin",
+     1, {1: 120, 10: 190, 100: 730}),
+]
+
+
+def par_taille(budget, taille):
+    return budget[taille] if isinstance(budget, dict) else budget
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    PERF_LENTES_SEUIL_MS=0,
+)
+class BudgetRequetesTests(JournauxDiscretsMixin, TestCase):
+    """Chaque endpoint respecte son budget de BUDGETS_REQUETES, quelle que soit la taille du jeu."""
+
+    tailles = (1, 10, 100)
+
+    def setUp(self):
+        # Détection de FTS5 mise en cache par processus : hors des budgets
+        fts5_disponible(connection)
+        self.utilisateurs = {
+            None: None,
+            "acheteur": User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR"),
+            "agriculteur": User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR"),
+            "admin": User.objects.create_user("admin@test.cm", "x", is_staff=True),
+        }
+        AgriculteurProfile.objects.create(user=self.utilisateurs["agriculteur"], specialite="FRUIT")
+        self.categorie = Categorie.objects.create(nom="Fruits")
+
+    def peupler(self, taille):
+        """`taille` produits, photos, lignes de panier, commandes, avis, agences et catégories."""
+        acheteur = self.utilisateurs["acheteur"]
+        panier = Panier.objects.create(acheteur=acheteur, statut="EN_COURS")
+        refs = {"taille": taille, "categorie": self.categorie.id, "panier": panier.id}
+        for i in range(taille):
+            vendeur = User.objects.create_user(f"vendeur{i}@test.cm", "x", role="AGRICULTEUR")
+            profil = AgriculteurProfile.objects.create(user=vendeur, specialite="FRUIT")
+            produit = Produit.objects.create(
+                nom=f"Banane {i}", quantite=1000, prix=100 + i, etat="frais",
+                categorie=self.categorie, agriculteur=vendeur,
+            )
+            photo = ProduitPhoto.objects.create(produit=produit, image=f"produits/{i}.jpg")
+            ProduitPhoto.objects.create(produit=produit, image=f"produits/{i}b.jpg")
+            item = PanierItem.objects.create(panier=panier, produit=produit, quantite=1)
+            commande = Panier.objects.create(acheteur=acheteur, statut="VALIDE")
+            PanierItem.objects.create(panier=commande, produit=produit, quantite=2)
+            avis = Avis.objects.create(auteur=acheteur, cible=profil, note=4, commentaire="Bien")
+            agence = AgenceLivraison.objects.create(
+                nom_agence=f"Agence {i}", numero_telephone="600000000",
+                localite="Douala", email=f"agence{i}@test.cm",
+            )
+            Categorie.objects.create(nom=f"Categorie {i}")
+            if i == 0:
+                refs.update(
+                    vendeur=vendeur.id, profil=profil.id, produit=produit.id, photo=photo.id,
+                    item=item.id, avis=avis.id, agence=agence.id,
+                )
+        refs["autre_produit"] = produit.id
+        return refs
+
+    def appeler(self, methode, url, donnees, utilisateur):
+        """(réponse, contenu, requêtes SQL) ; caches et limitations vidés, effets annulés."""
+        for alias in settings.CACHES:
+            caches[alias].clear()
+        throttling.backend().vider()
+        client = APIClient()
+        if utilisateur is not None:
+            client.force_authenticate(utilisateur)
+        format = "multipart" if callable(donnees) else "json"
+        donnees = donnees() if callable(donnees) else donnees
+        with transaction.atomic():
+            with CaptureQueriesContext(connection) as capture:
+                response = getattr(client, methode)(url, donnees, format=format)
+                contenu = b"".join(response.streaming_content) if response.streaming else response.content
+            transaction.set_rollback(True)
+        return response, contenu, capture.captured_queries
+
+    @staticmethod
+    def detail_requetes(requetes):
+        """Formes répétées en tête (signature d'un N+1), puis toutes les requêtes."""
+        formes = Counter(normaliser(q["sql"]) for q in requetes)
+        lignes = [f"  {n} x {forme}" for forme, n in formes.most_common() if n > 1]
+        lignes += [f"  {i}. {q['sql']}" for i, q in enumerate(requetes, 1)]
+        return "\n".join(lignes)
+
+    def test_budgets(self):
+        for taille in self.tailles:
+            with transaction.atomic():
+                refs = self.peupler(taille)
+                for nom, methode, url, donnees, utilisateur, requetes, octets in BUDGETS_REQUETES:
+                    url = url.format(**refs)
+                    with self.subTest(taille=taille, endpoint=nom):
+                        response, contenu, captures = self.appeler(
+                            methode, url, remplir(donnees, refs), self.utilisateurs[utilisateur]
+                        )
+                        self.assertLess(response.status_code, 400, f"{methode.upper()} {url} : {contenu[:300]!r}")
+                        attendu = par_taille(requetes, taille)
+                        self.assertEqual(
+                            len(captures), attendu,
+                            f"{methode.upper()} {url} ({taille} lignes) : {len(captures)} requêtes SQL "
+                            f"au lieu de {attendu}\n{self.detail_requetes(captures)}",
+                        )
+                        self.assertLessEqual(
+                            len(contenu), par_taille(octets, taille),
+                            f"{methode.upper()} {url} ({taille} lignes) : réponse de {len(contenu)} octets",
+                        )
+                transaction.set_rollback(True)
+
+
+# ------------------------
+# Audit des plans de requêtes (`manage.py query_audit`)
+# ------------------------
+
+class AuditRequetesTests(JournauxDiscretsMixin, TestCase):
+    def test_commande(self):
+        with self.assertRaisesMessage(CommandError, "Base vide"):
+            call_command("query_audit", stdout=StringIO())
+
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        AgriculteurProfile.objects.create(user=agriculteur, specialite="FRUIT")
+        acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        produit = Produit.objects.create(
+            nom="Mangue", quantite=5, prix="500", etat="mûr",
+            categorie=Categorie.objects.create(nom="Fruits"), agriculteur=agriculteur,
+        )
+        panier = Panier.objects.create(acheteur=acheteur)
+        PanierItem.objects.ajouter(panier.pk, produit.pk, 1)
+
+        sortie = StringIO()
+        call_command("query_audit", "--json", "--seuil", "1", stdout=sortie)
+        rapport = json.loads(sortie.getvalue())
+        self.assertEqual([s["nom"] for s in rapport["scenarios"]], [s[0] for s in SCENARIOS])
+        for scenario in rapport["scenarios"]:
+            with self.subTest(scenario=scenario["nom"]):
+                self.assertLess(scenario["statut"], 500)
+                self.assertGreater(scenario["nb_requetes"], 0)
+        self.assertEqual(rapport["cles_sans_index"], [])
+
+        # Transaction annulée : rien n'a été écrit
+        self.assertEqual(Panier.objects.get(pk=panier.pk).nb_articles, 1)
+        self.assertEqual(Panier.objects.count(), 1)
+
+        sortie = StringIO()
+        call_command("query_audit", "--scenario", "categories", stdout=sortie)
+        self.assertIn("categories", sortie.getvalue())
+
+
+# ------------------------
+# Jeu de données (`manage.py seed_terrabia`)
+# ------------------------
+
+class JeuDeDonneesTests(JournauxDiscretsMixin, TestCase):
+    def test_agregats_coherents(self):
+        options = [
+            "--farmers", "3", "--buyers", "8", "--products", "20", "--carts", "10", "--reviews", "15",
+            "--agences", "2", "--seed", "7",
+        ]
+        call_command("seed_terrabia", *options, stdout=StringIO())
+        self.assertEqual(
+            (User.objects.count(), Produit.objects.count(), Panier.objects.count(), Avis.objects.count()),
+            (11, 20, 10, 15),
+        )
+
+        reels = Panier.objects.totaux_reels()
+        paniers = list(Panier.objects.values(
+            "montant_total", "nb_articles", montant=reels["montant_total"], lignes=reels["nb_articles"],
+        ))
+        self.assertTrue(any(panier["lignes"] for panier in paniers))
+        for panier in paniers:
+            self.assertEqual((panier["montant_total"], panier["nb_articles"]), (panier["montant"], panier["lignes"]))
+
+        agregats = agregats_reels()
+        for profil in AgriculteurProfile.objects.all():
+            with self.subTest(profil=profil.pk):
+                attendus = agregats.get(profil.pk, {"nb_avis": 0, "somme_notes": 0, "note_moyenne": 0})
+                for champ, valeur in attendus.items():
+                    self.assertAlmostEqual(getattr(profil, champ), valeur)
+        self.assertEqual(sum(profil.nb_avis for profil in AgriculteurProfile.objects.all()), 15)
+
+        with self.assertRaisesMessage(CommandError, "--seed 7"):
+            call_command("seed_terrabia", *options, stdout=StringIO())
+
+
+# ------------------------
+# Agrégats des notes des agriculteurs
+# ------------------------
+
+class NotesAgriculteursTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.profil = AgriculteurProfile.objects.create(user=agriculteur, specialite="FRUIT")
+        autre = User.objects.create_user("agri2@test.cm", "x", role="AGRICULTEUR")
+        self.autre_profil = AgriculteurProfile.objects.create(user=autre, specialite="LEGUME")
+        self.acheteurs = [
+            User.objects.create_user(f"acheteur{i}@test.cm", "x", role="ACHETEUR") for i in range(2)
+        ]
+
+    def assertNotes(self, profil, note_moyenne, nb_avis, histogramme):
+        profil.refresh_from_db()
+        self.assertAlmostEqual(profil.note_moyenne, note_moyenne)
+        self.assertEqual(profil.nb_avis, nb_avis)
+        self.assertEqual(profil.histogramme, {note: histogramme.get(note, 0) for note in range(1, 6)})
+
+    def test_api(self):
+        client = APIClient()
+        client.force_authenticate(self.acheteurs[0])
+        response = client.post("/api/avis/", {"cible": self.profil.pk, "note": 4, "commentaire": "Bien"}, format="json")
+        self.assertEqual(response.status_code, 201)
+        client.force_authenticate(self.acheteurs[1])
+        client.post("/api/avis/", {"cible": self.profil.pk, "note": 2, "commentaire": "Moyen"}, format="json")
+        self.assertNotes(self.profil, 3, 2, {4: 1, 2: 1})
+
+        avis_id = response.data["id"]
+        client.force_authenticate(self.acheteurs[0])
+        client.patch(f"/api/avis/{avis_id}/", {"note": 5}, format="json")
+        self.assertNotes(self.profil, 3.5, 2, {5: 1, 2: 1})
+
+        client.delete(f"/api/avis/{avis_id}/")
+        self.assertNotes(self.profil, 2, 1, {2: 1})
+
+    def test_admin_et_cascades(self):
+        avis = Avis.objects.create(auteur=self.acheteurs[0], cible=self.profil, note=5, commentaire="Top")
+        Avis.objects.create(auteur=self.acheteurs[1], cible=self.profil, note=3, commentaire="Bien")
+        self.assertNotes(self.profil, 4, 2, {5: 1, 3: 1})
+
+        # Edition dans l'admin : changement de note puis de cible
+        avis = Avis.objects.get(pk=avis.pk)
+        avis.note = 1
+        avis.save()
+        self.assertNotes(self.profil, 2, 2, {1: 1, 3: 1})
+        avis.cible = self.autre_profil
+        avis.save()
+        self.assertNotes(self.profil, 3, 1, {3: 1})
+        self.assertNotes(self.autre_profil, 1, 1, {1: 1})
+
+        # Chargement partiel : recalcul depuis la table
+        partiel = Avis.objects.only("id", "commentaire").get(pk=avis.pk)
+        partiel.commentaire = "Déçu"
+        partiel.save()
+        self.assertNotes(self.autre_profil, 1, 1, {1: 1})
+
+        # Suppression de l'auteur : ses avis partent en cascade
+        self.acheteurs[1].delete()
+        self.assertNotes(self.profil, 0, 0, {})
+
+    def test_note_hors_bornes(self):
+        client = APIClient()
+        client.force_authenticate(self.acheteurs[0])
+        for note in (0, 6):
+            with self.subTest(note=note):
+                response = client.post(
+                    "/api/avis/", {"cible": self.profil.pk, "note": note, "commentaire": "?"}, format="json",
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("note", response.data)
+                with self.assertRaises(ValidationError):
+                    Avis(auteur=self.acheteurs[0], cible=self.profil, note=note, commentaire="?").full_clean()
+                # Ecriture directe (admin, script) : refusée par la base
+                with self.assertRaises(IntegrityError), transaction.atomic():
+                    Avis.objects.create(auteur=self.acheteurs[0], cible=self.profil, note=note, commentaire="?")
+        self.assertNotes(self.profil, 0, 0, {})
+
+
+# ------------------------
+# Dérivés d'images
+# ------------------------
+
+class DerivesImagesTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = Path(media.name)
+        reglages = override_settings(MEDIA_ROOT=media.name, TACHES_SYNCHRONES=True)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.produit = Produit.objects.create(
+            nom="Mangue", quantite=3, prix="500", etat="mûr",
+            categorie=Categorie.objects.create(nom="Fruits"), agriculteur=agriculteur,
+        )
+
+    @staticmethod
+    def image(largeur, hauteur, nom="photo.png"):
+        tampon = BytesIO()
+        Image.new("RGB", (largeur, hauteur), "orange").save(tampon, "PNG")
+        return SimpleUploadedFile(nom, tampon.getvalue(), content_type="image/png")
+
+    def derives_sur_disque(self):
+        return sorted(chemin.name for chemin in self.media.glob("produits/derives/*"))
+
+    def envoyer(self, photo, image):
+        photo.image = image
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.save()
+        photo.refresh_from_db()
+        return photo
+
+    def test_petite_image_sans_agrandissement(self):
+        photo = self.envoyer(ProduitPhoto(produit=self.produit), self.image(150, 100))
+        self.assertEqual(photo.statut, "PRET")
+        fichiers = {taille["fichier"] for taille in photo.derives["tailles"].values()}
+        self.assertEqual(len(fichiers), 1)
+        self.assertEqual(photo.derives["tailles"]["grande"]["largeur"], 150)
+        self.assertEqual(len(self.derives_sur_disque()), 1)
+
+        photo = self.envoyer(ProduitPhoto(produit=self.produit), self.image(700, 500))
+        self.assertEqual(
+            [taille["largeur"] for taille in photo.derives["tailles"].values()], [200, 600, 700],
+        )
+
+    def test_derives_supprimes(self):
+        photo = self.envoyer(ProduitPhoto(produit=self.produit), self.image(700, 500, "ancienne.png"))
+        anciens = self.derives_sur_disque()
+        self.assertEqual(len(anciens), 3)
+
+        # Remplacement de l'image : les anciens dérivés disparaissent
+        photo = self.envoyer(photo, self.image(300, 200, "nouvelle.png"))
+        nouveaux = self.derives_sur_disque()
+        self.assertTrue(nouveaux)
+        self.assertFalse(set(anciens) & set(nouveaux))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            photo.delete()
+        self.assertEqual(self.derives_sur_disque(), [])
+
+    def test_image_refusee(self):
+        with mock.patch.object(Image, "MAX_IMAGE_PIXELS", 1000):
+            photo = self.envoyer(ProduitPhoto(produit=self.produit), self.image(150, 100))
+        self.assertEqual((photo.statut, photo.derives), ("ERREUR", {}))
+
+        illisible = SimpleUploadedFile("casse.png", b"\x89PNG\r\n\x1a\n" + b"0" * 64, content_type="image/png")
+        photo = self.envoyer(ProduitPhoto(produit=self.produit), illisible)
+        self.assertEqual((photo.statut, photo.derives), ("ERREUR", {}))
+        self.assertEqual(self.derives_sur_disque(), [])
+
+
+# ------------------------
+# Recherche plein texte
+# ------------------------
+
+class RechercheTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        caches["catalogue"].clear()
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.categorie = Categorie.objects.create(nom="Fruits", description="Fruits tropicaux")
+        self.client = APIClient()
+        self.client.force_authenticate(self.agriculteur)
+
+    def trouves(self, texte):
+        # Sans vider les caches : une écriture doit aussi invalider les réponses en cache
+        return [produit["nom"] for produit in self.client.get("/api/produits/", {"q": texte}).data]
+
+    def test_suit_les_ecritures(self):
+        self.assertEqual(self.trouves("mangue"), [])
+        produit = Produit.objects.create(
+            nom="Mangue Kent", quantite=3, prix="500", etat="mûr", categorie=self.categorie, agriculteur=self.agriculteur,
+        )
+        self.assertEqual(self.trouves("mangue"), ["Mangue Kent"])
+        self.assertEqual(self.trouves("ken trop"), ["Mangue Kent"])
+
+        produit.nom = "Papaye solo"
+        produit.save()
+        self.assertEqual(self.trouves("mangue"), [])
+        self.assertEqual(self.trouves("papaye"), ["Papaye solo"])
+
+        # Le texte indexé embarque le nom et la description de la catégorie
+        self.categorie.nom = "Agrumes"
+        self.categorie.description = "Zestes"
+        self.categorie.save()
+        self.assertEqual(self.trouves("fruits"), [])
+        self.assertEqual(self.trouves("agrumes zest"), ["Papaye solo"])
+
+        produit.delete()
+        self.assertEqual(self.trouves("papaye"), [])
+
+        Produit.objects.create(
+            nom="Orange", quantite=1, prix="100", etat="mûr", categorie=self.categorie, agriculteur=self.agriculteur,
+        )
+        self.assertEqual(self.trouves("agrumes"), ["Orange"])
+        self.categorie.delete()
+        self.assertEqual(self.trouves("orange"), [])
+
+
+# ------------------------
+# Facettes du catalogue
+# ------------------------
+
+class FacettesTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        caches["catalogue"].clear()
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.profil = AgriculteurProfile.objects.create(user=self.agriculteur, specialite="FRUIT")
+        self.fruits = Categorie.objects.create(nom="Fruits")
+        self.legumes = Categorie.objects.create(nom="Légumes")
+        self.client = APIClient()
+        self.client.force_authenticate(self.agriculteur)
+
+    def facettes(self, **params):
+        facettes = self.client.get("/api/produits/facets/", params).data
+        return {
+            "total": facettes["total"],
+            "categories": {ligne["nom"]: ligne["count"] for ligne in facettes["categories"]},
+            "etats": {ligne["etat"]: ligne["count"] for ligne in facettes["etats"]},
+            "specialites": {ligne["specialite"]: ligne["count"] for ligne in facettes["specialites"]},
+            "prix": [ligne["count"] for ligne in facettes["prix"]],
+        }
+
+    def test_suivent_les_ecritures(self):
+        # Facettes invalidées au commit de chaque écriture
+        self.assertEqual(self.facettes()["total"], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            mangue = Produit.objects.create(
+                nom="Mangue", quantite=3, prix="400", etat="mûr", categorie=self.fruits, agriculteur=self.agriculteur,
+            )
+            Produit.objects.create(
+                nom="Gombo", quantite=3, prix="1200", etat="frais", categorie=self.legumes, agriculteur=self.agriculteur,
+            )
+        self.assertEqual(self.facettes(), {
+            "total": 2,
+            "categories": {"Fruits": 1, "Légumes": 1},
+            "etats": {"frais": 1, "mûr": 1},
+            "specialites": {"FRUIT": 2},
+            "prix": [1, 0, 1, 0, 0],
+        })
+        self.assertEqual(self.facettes(categorie=self.fruits.pk)["total"], 1)
+
+        mangue.etat, mangue.prix, mangue.categorie = "frais", "6000", self.legumes
+        with self.captureOnCommitCallbacks(execute=True):
+            mangue.save()
+        facettes = self.facettes()
+        self.assertEqual(facettes["categories"], {"Légumes": 2})
+        self.assertEqual(facettes["etats"], {"frais": 2})
+        self.assertEqual(facettes["prix"], [0, 0, 1, 1, 0])
+        self.assertEqual(self.facettes(categorie=self.fruits.pk)["total"], 0)
+
+        self.legumes.nom = "Légumes feuilles"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.legumes.save()
+        self.assertEqual(self.facettes()["categories"], {"Légumes feuilles": 2})
+
+        self.profil.specialite = "LEGUME"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.profil.save()
+            # Pas avant le commit
+            self.assertEqual(self.facettes()["specialites"], {"FRUIT": 2})
+        self.assertEqual(self.facettes()["specialites"], {"LEGUME": 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            mangue.delete()
+        self.assertEqual(self.facettes()["total"], 1)
+
+
+# ------------------------
+# Lignes de panier (INSERT ... ON CONFLICT)
+# ------------------------
+
+class LignesPanierTests(TestCase):
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        categorie = Categorie.objects.create(nom="Fruits")
+        self.mangue, self.papaye, self.ananas = (
+            Produit.objects.create(
+                nom=nom, quantite=100, prix=prix, etat="mûr", categorie=categorie, agriculteur=agriculteur,
+            )
+            for nom, prix in (("Mangue", "500"), ("Papaye", "300"), ("Ananas", "200"))
+        )
+        self.panier = Panier.objects.create(acheteur=acheteur)
+
+    def totaux(self):
+        panier = Panier.objects.get(pk=self.panier.pk)
+        reels = Panier.objects.totaux_reels()
+        reels = Panier.objects.filter(pk=self.panier.pk).values(
+            montant=reels["montant_total"], lignes=reels["nb_articles"],
+        ).get()
+        self.assertEqual((panier.montant_total, panier.nb_articles), (reels["montant"], reels["lignes"]))
+        return panier.montant_total, panier.nb_articles
+
+    def test_ajouter(self):
+        item_id, quantite, cree = PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 2)
+        self.assertEqual((quantite, cree), (2, True))
+        self.assertEqual(self.totaux(), (1000, 1))
+
+        self.assertEqual(PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 3), (item_id, 5, False))
+        self.assertEqual(self.totaux(), (2500, 1))
+
+    def test_ajouter_sur_une_ligne_existante(self):
+        # Ligne insérée par une requête concurrente (ou à quantité nulle) :
+        # l'upsert la met à jour, il ne la crée pas
+        for quantite in (0, 2):
+            with self.subTest(quantite=quantite):
+                PanierItem.objects.filter(panier=self.panier).delete()
+                PanierItem.objects.bulk_create([PanierItem(panier=self.panier, produit=self.papaye, quantite=quantite)])
+                Panier.objects.recalculer(self.panier.pk)
+
+                _, nouvelle_quantite, cree = PanierItem.objects.ajouter(self.panier.pk, self.papaye.pk, 1)
+                self.assertEqual((nouvelle_quantite, cree), (quantite + 1, False))
+                self.assertEqual(self.totaux(), (300 * (quantite + 1), 1))
+
+    def test_appliquer_par_lot(self):
+        PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 2)
+        PanierItem.objects.ajouter(self.panier.pk, self.papaye.pk, 1)
+
+        finales = PanierItem.objects.appliquer(self.panier.pk, [
+            (self.mangue.pk, "add", 1),
+            (self.papaye.pk, "remove", 0),
+            (self.ananas.pk, "set", 4),
+            (self.ananas.pk, "add", 1),
+        ])
+        self.assertEqual(finales, {self.mangue.pk: 3, self.papaye.pk: 0, self.ananas.pk: 5})
+        self.assertEqual(
+            dict(PanierItem.objects.filter(panier=self.panier).values_list("produit_id", "quantite")),
+            {self.mangue.pk: 3, self.ananas.pk: 5},
+        )
+        self.assertEqual(self.totaux(), (2500, 2))
+
+    def test_changement_de_prix(self):
+        PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 2)
+        PanierItem.objects.ajouter(self.panier.pk, self.papaye.pk, 1)
+        valide = Panier.objects.create(acheteur=self.panier.acheteur, statut="VALIDE")
+        PanierItem.objects.ajouter(valide.pk, self.mangue.pk, 3)
+
+        self.mangue.prix = "450"
+        self.mangue.save()
+        self.assertEqual(self.totaux(), (1200, 2))
+        # Le montant d'un panier validé reste celui de la commande
+        self.assertEqual(Panier.objects.get(pk=valide.pk).montant_total, 1500)
+
+    def test_reconcilier_paniers(self):
+        PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 2)
+        Panier.objects.filter(pk=self.panier.pk).update(montant_total=0, nb_articles=5)
+        sortie = StringIO()
+
+        with self.assertRaisesMessage(CommandError, "1 panier(s) avec des totaux faux"):
+            call_command("reconcilier_paniers", "--verifier", stdout=sortie)
+        self.assertEqual(Panier.objects.get(pk=self.panier.pk).nb_articles, 5)
+
+        call_command("reconcilier_paniers", stdout=sortie)
+        self.assertEqual(self.totaux(), (1000, 1))
+        call_command("reconcilier_paniers", "--verifier", stdout=sortie)
+        self.assertIn("Aucun écart", sortie.getvalue())
+
+
+# ------------------------
+# Validation de commande
+# ------------------------
+
+class CommandeTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        categorie = Categorie.objects.create(nom="Fruits")
+        self.mangue, self.papaye = (
+            Produit.objects.create(
+                nom=nom, quantite=stock, prix=prix, etat="mûr", categorie=categorie, agriculteur=agriculteur,
+            )
+            for nom, stock, prix in (("Mangue", 10, "500"), ("Papaye", 3, "300"))
+        )
+        self.agence = AgenceLivraison.objects.create(
+            nom_agence="Agence Centre", numero_telephone="600000000", localite="Douala", email="agence@test.cm",
+        )
+        self.panier = Panier.objects.create(acheteur=self.acheteur)
+        PanierItem.objects.ajouter(self.panier.pk, self.mangue.pk, 4)
+        PanierItem.objects.ajouter(self.panier.pk, self.papaye.pk, 2)
+        self.client = APIClient()
+        self.client.force_authenticate(self.acheteur)
+
+    def stocks(self):
+        return dict(Produit.objects.values_list("nom", "quantite"))
+
+    def test_commande(self):
+        for reference in (self.agence.pk, "Agence Centre"):
+            with self.subTest(agence=reference):
+                with transaction.atomic():
+                    response = self.client.post("/api/commandes/", {"agence_livraison": reference}, format="json")
+                    self.assertEqual(response.status_code, 201)
+                    self.assertEqual(response.data["agence"]["id"], self.agence.pk)
+                    self.assertEqual(response.data["montant_total"], "2600.00")
+                    # Un seul UPDATE ... CASE pour les deux produits
+                    self.assertEqual(self.stocks(), {"Mangue": 6, "Papaye": 1})
+                    self.assertEqual(Panier.objects.get(pk=self.panier.pk).statut, "VALIDE")
+                    transaction.set_rollback(True)
+
+    def test_agence_inconnue(self):
+        for reference in (999, "Agence Nord"):
+            with self.subTest(agence=reference):
+                response = self.client.post("/api/commandes/", {"agence_livraison": reference}, format="json")
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(Panier.objects.get(pk=self.panier.pk).statut, "EN_COURS")
+                self.assertEqual(self.stocks(), {"Mangue": 10, "Papaye": 3})
+
+    def test_stock_insuffisant(self):
+        PanierItem.objects.ajouter(self.panier.pk, self.papaye.pk, 2)
+        response = self.client.post("/api/commandes/", {"agence_livraison": self.agence.pk}, format="json")
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data["details"], [
+            {"produit": self.papaye.pk, "nom": "Papaye", "disponible": 3, "demande": 4},
+        ])
+        # Aucun décrément partiel, pas même sur le produit disponible
+        self.assertEqual(self.stocks(), {"Mangue": 10, "Papaye": 3})
+        self.assertEqual(Panier.objects.get(pk=self.panier.pk).statut, "EN_COURS")
+
+
+# ------------------------
+# Import de produits en masse
+# ------------------------
+
+class ImportProduitsTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        self.agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        Categorie.objects.create(nom="Fruits")
+        self.client = APIClient()
+        self.client.force_authenticate(self.agriculteur)
+
+    def importer(self, contenu, nom="produits.csv"):
+        fichier = SimpleUploadedFile(nom, contenu, content_type="text/csv")
+        return self.client.post("/api/produits/import/", {"fichier": fichier}, format="multipart")
+
+    def test_fichier_latin1(self):
+        contenu = (
+            "nom,quantite,prix,etat,categorie\n"
+            "Ananas,1,200,vert,Fruits\n"
+            "Café,2,300,séché,Fruits\n"
+            "Papaye,3,400,mûr,Fruits\n"
+        ).encode("latin-1")
+        response = self.importer(contenu)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data["lignes"], response.data["crees"]), (3, 1))
+        self.assertEqual([erreur["ligne"] for erreur in response.data["erreurs"]], [3, 4])
+        self.assertEqual(list(Produit.objects.values_list("nom", flat=True)), ["Ananas"])
+
+        ndjson = '{"nom": "Ananas", "quantite": 1, "prix": "200", "etat": "vert", "categorie": "Fruits"}\n'
+        response = self.importer(ndjson.encode() + '{"nom": "Café"}\n'.encode("latin-1"), "produits.ndjson")
+        self.assertEqual(response.data["crees"], 1)
+        self.assertEqual(response.data["erreurs"][0]["ligne"], 2)
+
+    def test_csv_mal_forme(self):
+        # Guillemet non fermé : le champ dépasse csv.field_size_limit()
+        contenu = (
+            "nom,quantite,prix,etat,categorie\n"
+            "Ananas,1,200,vert,Fruits\n"
+            '"Papaye,3,400,mûr,Fruits\n' + ("x" * 1000 + "\n") * 140
+        ).encode()
+        response = self.importer(contenu)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["crees"], 1)
+        self.assertEqual(response.data["erreurs"][0]["ligne"], 3)
+        self.assertIn("CSV mal formé", str(response.data["erreurs"][0]["erreurs"]))
+
+
+# ------------------------
+# Exports
+# ------------------------
+
+class ExportsTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        agriculteur = User.objects.create_user("agri@test.cm", "x", role="AGRICULTEUR")
+        self.categorie = Categorie.objects.create(nom="Fruits")
+        Produit.objects.create(
+            nom="Mangue", quantite=3, prix="500", etat="mûr", categorie=self.categorie, agriculteur=agriculteur,
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user("admin@test.cm", "x", is_staff=True))
+
+    def test_filtres_non_numeriques(self):
+        for url in (
+            "/api/exports/produits.csv?categorie=x",
+            "/api/exports/avis.ndjson?note=5,bien",
+            "/api/exports/avis.csv?cible=1;2",
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data["error"], "Filtre invalide")
+
+        response = self.client.get(f"/api/exports/produits.ndjson?categorie={self.categorie.pk},")
+        self.assertEqual(response.status_code, 200)
+        lignes = b"".join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(ligne)["nom"] for ligne in lignes], ["Mangue"])
+
+
+# ------------------------
+# Utilisateur JWT en cache
+# ------------------------
+
+class UtilisateurEnCacheTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        caches["utilisateurs"].clear()
+        self.acheteur = User.objects.create_user("acheteur@test.cm", "x", role="ACHETEUR")
+        self.authentification = CachedJWTAuthentication()
+        self.jeton = AccessToken.for_user(self.acheteur)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {self.jeton}")
+
+    def utilisateur(self):
+        return self.authentification.get_user(self.jeton)
+
+    def test_sans_requete_une_fois_en_cache(self):
+        with self.assertNumQueries(1):
+            self.utilisateur()
+        with self.assertNumQueries(0):
+            user = self.utilisateur()
+            async_to_sync(self.authentification.aget_user)(self.jeton)
+        self.assertEqual((user.pk, user.email, user.role), (self.acheteur.pk, "acheteur@test.cm", "ACHETEUR"))
+
+    def test_invalide_apres_ecriture(self):
+        cle = cle_utilisateur(self.acheteur.pk)
+        self.utilisateur()
+        self.acheteur.role = "AGRICULTEUR"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acheteur.save()
+        self.assertIsNone(caches["utilisateurs"].get(cle))
+        self.assertEqual(self.utilisateur().role, "AGRICULTEUR")
+
+        self.acheteur.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acheteur.save()
+        self.assertIsNone(caches["utilisateurs"].get(cle))
+        with self.assertRaisesMessage(AuthenticationFailed, "User is inactive"):
+            self.utilisateur()
+        self.assertEqual(self.client.get("/api/panier/utilisateur/").status_code, 401)
+
+        self.acheteur.is_active = True
+        self.acheteur.save()
+        self.utilisateur()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.acheteur.delete()
+        self.assertIsNone(caches["utilisateurs"].get(cle))
+        with self.assertRaisesMessage(AuthenticationFailed, "User not found"):
+            self.utilisateur()
+
+
+# ------------------------
+# Limitation des tentatives d'authentification
+# ------------------------
+
+@override_settings(AUTH_LIMITES={"ip": (2, 1), "email": (5, 5)})
+class LimitationAuthentificationTests(JournauxDiscretsMixin, TestCase):
+    def setUp(self):
+        throttling.backend().vider()
+        self.addCleanup(throttling.backend().vider)
+
+    def tenter(self, i, **en_tetes):
+        donnees = {"email": f"inconnu{i}@test.cm", "password": "x"}
+        return APIClient().post("/api/token/", donnees, format="json", **en_tetes).status_code
+
+    def test_x_forwarded_for_ignore_sans_proxy(self):
+        statuts = [self.tenter(i, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}") for i in range(3)]
+        self.assertEqual(statuts, [401, 401, 429])
+
+    def test_x_forwarded_for_derriere_un_proxy(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}):
+            statuts = [self.tenter(i, HTTP_X_FORWARDED_FOR=f"10.0.0.{i}") for i in range(3)]
+            self.assertEqual(statuts, [401, 401, 401])
+            self.assertEqual(self.tenter(3, HTTP_X_FORWARDED_FOR="10.0.0.0"), 401)
+            self.assertEqual(self.tenter(4, HTTP_X_FORWARDED_FOR="10.0.0.0"), 429)
+
+    @override_settings(
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1}, AUTH_ECHECS_TOLERES={"ip": 50, "email": 50},
+    )
+    def test_seau_par_email(self):
+        # Une IP différente à chaque tentative : seul le seau de l'email se vide
+        emails = ["cible@test.cm", " Cible@Test.cm", "CIBLE@test.cm ", "cible@test.cm", "cible@test.cm", "cible@test.cm"]
+        statuts = [
+            APIClient().post(
+                "/api/token/", {"email": email, "password": "x"}, format="json", HTTP_X_FORWARDED_FOR=f"10.0.0.{i}",
+            ).status_code
+            for i, email in enumerate(emails)
+        ]
+        self.assertEqual(statuts, [401] * 5 + [429])
+        self.assertEqual(self.tenter(0, HTTP_X_FORWARDED_FOR="10.0.1.0"), 401)
+
+    @override_settings(AUTH_ECHECS_TOLERES={"ip": 50, "email": 3}, AUTH_BLOCAGE_BASE=1, AUTH_BLOCAGE_MAX=8)
+    def test_blocage_exponentiel(self):
+        cle, debut = "email:cible", 1000.0
+        blocages = []
+        for _ in range(8):
+            throttling.resultat(cle, False, maintenant=debut)
+            _, attente, bloque = throttling.consommer(cle, 5, 5, maintenant=debut)
+            blocages.append(attente if bloque else 0)
+        self.assertEqual(blocages, [0, 0, 0, 1, 2, 4, 8, 8])
+        # Blocage terminé : le seau reprend la main
+        self.assertEqual(throttling.consommer(cle, 5, 5, maintenant=debut + 8), (True, 0, False))
+
+    @override_settings(
+        REST_FRAMEWORK={**settings.REST_FRAMEWORK, "NUM_PROXIES": 1},
+        AUTH_LIMITES={"ip": (2, 1), "email": (20, 20)},
+        AUTH_ECHECS_TOLERES={"ip": 50, "email": 3},
+        AUTH_BLOCAGE_BASE=60,
+        PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"],
+    )
+    def test_succes_remet_les_echecs_a_zero(self):
+        User.objects.create_user("cible@test.cm", "bon-mot-de-passe", role="ACHETEUR")
+        mots_de_passe = ["x"] * 3 + ["bon-mot-de-passe"] + ["x"] * 5
+        statuts = [
+            APIClient().post(
+                "/api/token/", {"email": "cible@test.cm", "password": mot_de_passe}, format="json",
+                HTTP_X_FORWARDED_FOR=f"10.0.0.{i}",
+            ).status_code
+            for i, mot_de_passe in enumerate(mots_de_passe)
+        ]
+        # Sans remise à zéro, le premier échec après le succès bloquerait l'email
+        self.assertEqual(statuts, [401, 401, 401, 200, 401, 401, 401, 401, 429])
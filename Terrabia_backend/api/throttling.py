@@ -0,0 +1,196 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache import CacheStats
+
+
+# ------------------------
+# Limitation des tentatives d'authentification
+# ------------------------
+# Connexion, inscription et /api/token/ passent par le hacheur de mots de
+# passe, volontairement coûteux. Chaque requête consomme un jeton dans deux
+# seaux : un par IP et un par email (AUTH_LIMITES : capacité, jetons
+# rechargés par minute). Un seau vide rejette la requête en 429 avec
+# Retry-After, dans initial() de DRF, donc avant authenticate().
+# Au-delà de AUTH_ECHECS_TOLERES échecs consécutifs (400/401, seuil par
+# dimension : une IP peut être partagée derrière un NAT), la clé est
+# bloquée AUTH_BLOCAGE_BASE secondes, durée doublée à chaque nouvel échec
+# (plafonnée à AUTH_BLOCAGE_MAX). Un succès remet le compteur à zéro.
+#
+# L'IP est REMOTE_ADDR, sauf si API_NUM_PROXIES (NUM_PROXIES de DRF) indique
+# combien de proxys de confiance ajoutent X-Forwarded-For : sans ce réglage,
+# l'en-tête vient du client, qui changerait de seau à chaque requête.
+#
+# Etat par clé : {"jetons", "maj", "echecs", "bloque_jusqua"}.
+# - backend "memoire" : dictionnaire LRU borné du processus (un seul nœud)
+# - backend "cache" : alias de cache partagé AUTH_LIMITE_CACHE (plusieurs
+#   nœuds, Redis). Lecture puis écriture sans verrou : sous forte
+#   concurrence, quelques requêtes de plus peuvent passer.
+
+stats = CacheStats(("autorisees", "refusees", "bloquees", "echecs", "succes"))
+
+
+class MemoireBackend:
+    def __init__(self, max_cles=100_000):
+        self._etats = OrderedDict()
+        self._lock = threading.Lock()
+        self.max_cles = max_cles
+
+    def modifier(self, cle, fonction, duree):
+        with self._lock:
+            etat, resultat = fonction(self._etats.get(cle))
+            self._etats[cle] = etat
+            self._etats.move_to_end(cle)
+            while len(self._etats) > self.max_cles:
+                self._etats.popitem(last=False)
+            return resultat
+
+    def vider(self):
+        with self._lock:
+            self._etats.clear()
+
+
+class CacheBackend:
+    def __init__(self, alias):
+        self.alias = alias
+
+    def modifier(self, cle, fonction, duree):
+        cache = caches[self.alias]
+        etat, resultat = fonction(cache.get(cle))
+        cache.set(cle, etat, duree)
+        return resultat
+
+    def vider(self):
+        caches[self.alias].clear()
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if getattr(settings, "AUTH_LIMITE_BACKEND", "memoire") == "cache":
+                _backend = CacheBackend(getattr(settings, "AUTH_LIMITE_CACHE", "default"))
+            else:
+                _backend = MemoireBackend()
+    return _backend
+
+
+def limites():
+    return getattr(settings, "AUTH_LIMITES", {"ip": (20, 10), "email": (5, 5)})
+
+
+def duree_etat():
+    # Une clé inactive finit par expirer : seau plein, blocage terminé
+    return int(getattr(settings, "AUTH_BLOCAGE_MAX", 900)) + 3600
+
+
+def etat_initial(capacite, maintenant):
+    return {"jetons": float(capacite), "maj": maintenant, "echecs": 0, "bloque_jusqua": 0.0}
+
+
+def consommer(cle, capacite, par_minute, maintenant=None):
+    """Prend un jeton ; renvoie (autorisé, secondes d'attente, bloqué)."""
+    maintenant = maintenant or time.time()
+    recharge = par_minute / 60.0
+
+    def appliquer(etat):
+        etat = dict(etat or etat_initial(capacite, maintenant))
+        if etat["bloque_jusqua"] > maintenant:
+            return etat, (False, etat["bloque_jusqua"] - maintenant, True)
+        etat["jetons"] = min(capacite, etat["jetons"] + (maintenant - etat["maj"]) * recharge)
+        etat["maj"] = maintenant
+        if etat["jetons"] >= 1:
+            etat["jetons"] -= 1
+            return etat, (True, 0, False)
+        return etat, (False, (1 - etat["jetons"]) / recharge, False)
+
+    return backend().modifier(f"limite:{cle}", appliquer, duree_etat())
+
+
+def resultat(cle, succes, maintenant=None):
+    """Enregistre l'issue d'une tentative : backoff exponentiel sur échecs répétés."""
+    maintenant = maintenant or time.time()
+    dimension = cle.split(":", 1)[0]
+    toleres = getattr(settings, "AUTH_ECHECS_TOLERES", {"ip": 50, "email": 3})[dimension]
+    base = getattr(settings, "AUTH_BLOCAGE_BASE", 1)
+    maximum = getattr(settings, "AUTH_BLOCAGE_MAX", 900)
+
+    def appliquer(etat):
+        etat = dict(etat or etat_initial(limites()[dimension][0], maintenant))
+        if succes:
+            etat["echecs"], etat["bloque_jusqua"] = 0, 0.0
+        else:
+            etat["echecs"] += 1
+            depassement = etat["echecs"] - toleres
+            if depassement > 0:
+                etat["bloque_jusqua"] = maintenant + min(maximum, base * 2 ** (depassement - 1))
+        return etat, None
+
+    backend().modifier(f"limite:{cle}", appliquer, duree_etat())
+
+
+# ------------------------
+# DRF
+# ------------------------
+
+class AuthentificationThrottle(BaseThrottle):
+    """Seaux IP + email ; à utiliser avec ProtectionAuthentificationMixin."""
+
+    def get_ident(self, request):
+        if api_settings.NUM_PROXIES is None:
+            return request.META.get("REMOTE_ADDR")
+        return super().get_ident(request)
+
+    def cles(self, request):
+        cles = [("ip", self.get_ident(request))]
+        email = request.data.get("email") if hasattr(request.data, "get") else None
+        if isinstance(email, str) and email.strip():
+            empreinte = hashlib.sha1(email.strip().lower().encode()).hexdigest()
+            cles.append(("email", empreinte))
+        return cles
+
+    def allow_request(self, request, view):
+        self.attente = 0
+        request.cles_limite = cles = [f"{dimension}:{valeur}" for dimension, valeur in self.cles(request)]
+        for cle in cles:
+            capacite, par_minute = limites()[cle.split(":", 1)[0]]
+            autorise, attente, bloque = consommer(cle, capacite, par_minute)
+            if not autorise:
+                self.attente = attente
+                stats.incr("bloquees" if bloque else "refusees")
+                return False
+        stats.incr("autorisees")
+        return True
+
+    def wait(self):
+        return self.attente
+
+
+class ProtectionAuthentificationMixin:
+    """
+    Vues qui hachent un mot de passe : limitation par IP et par email avant
+    le traitement, puis enregistrement du succès ou de l'échec.
+    """
+    throttle_classes = [AuthentificationThrottle]
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        cles = getattr(request, "cles_limite", None)
+        statut = response.status_code
+        if cles and (200 <= statut < 300 or statut in (400, 401)):
+            succes = statut < 300
+            stats.incr("succes" if succes else "echecs")
+            for cle in cles:
+                resultat(cle, succes)
+        return response
@@ -1,6 +1,7 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import asynchrone, views
 
 # Router DRF
 router = DefaultRouter()
@@ -11,6 +12,7 @@ router.register("avis", views.AvisViewSet, basename="avis")
 router.register("paniers", views.PanierViewSet, basename="panier")
 router.register("items", views.PanierItemViewSet, basename="item")
 router.register("agences", views.AgenceLivraisonViewSet, basename="agence")
+router.register("agriculteurs", views.AgriculteurViewSet, basename="agriculteur")
 
 urlpatterns = [ 
     # Auth
@@ -32,6 +34,9 @@ urlpatterns = [
     
     # Récupérer le panier de l'utilisateur (version simplifiée)
     path("api/panier/utilisateur/", views.get_panier_utilisateur, name="panier-utilisateur"),
+
+    # Modifier le panier par lot (add / set / remove en une transaction)
+    path("api/panier/batch/", views.modifier_panier_lot, name="panier-batch"),
     
     # -------------------------------------------------
     # ROUTES DE COMPATIBILITÉ (pour garder l'existant)
@@ -41,4 +46,30 @@ urlpatterns = [
     path("panier/", views.get_panier_utilisateur, name="panier-legacy"),
     path("panier/ajouter/", views.ajouter_au_panier_simple, name="panier-ajouter-legacy"),
     path('api/commandes/', views.creer_commande, name='creer-commande'),
-]
\ No newline at end of file
+
+    # Supervision
+    path("api/cache/stats/", views.statistiques_cache, name="cache-stats"),
+    path("api/auth/stats/", views.statistiques_authentification, name="auth-stats"),
+    path("api/perf/lentes/", views.requetes_lentes_recentes, name="perf-lentes"),
+
+    # Exports en flux (administration)
+    re_path(
+        r"^api/exports/(?P<ressource>commandes|produits|avis)\.(?P<sortie>ndjson|csv)(?P<gz>\.gz)?$",
+        views.exporter,
+        name="export",
+    ),
+]
+
+# Lectures du catalogue et du panier en vues asynchrones (API_VUES_ASYNC, sous
+# ASGI) : mêmes URL et mêmes réponses, placées avant les routes synchrones.
+# Détail par id numérique seulement : /api/produits/facets/ et
+# /api/produits/import/ restent aux actions du viewset
+if settings.API_VUES_ASYNC:
+    urlpatterns = [
+        path("api/produits/", asynchrone.produits),
+        re_path(r"^api/produits/(?P<pk>\d+)/$", asynchrone.produit),
+        path("api/categories/", asynchrone.categories),
+        path("api/agences/", asynchrone.agences),
+        path("api/panier/utilisateur/", asynchrone.panier_utilisateur),
+        path("panier/", asynchrone.panier_utilisateur),
+    ] + urlpatterns
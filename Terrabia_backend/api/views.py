@@ -1,13 +1,20 @@
+import logging
+from itertools import chain
+
 from rest_framework import viewsets, generics, status
 from rest_framework.response import Response
 from rest_framework.decorators import action, api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.contrib.auth import authenticate
-from django.db.models import Q
+from django.http import StreamingHttpResponse
+from django.db import transaction
+from django.db.models import Q, Prefetch, prefetch_related_objects
 from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.views import TokenObtainPairView
 
 from .models import (
     User,
+    AgriculteurProfile,
     Categorie,
     Produit,
     ProduitPhoto,
@@ -17,30 +24,70 @@ from .models import (
     AgenceLivraison
 )
 
+from .cache import CatalogueCacheMixin, stats as cache_stats
+from .commandes import AgenceInconnue, PanierIntrouvable, PanierVide, StockInsuffisant, passer_commande
+from .conditional import ConditionalGetMixin
+from .facets import facettes_en_cache
+from .exports import FiltreInvalide, flux_octets, flux_texte
+from .fieldsets import ChampsClairsemesMixin
+from .filters import ProduitFilterBackend
+from .lecture import LectureRapideMixin, aphotos_par_produit, photos_par_produit
+from .imports import FormatInvalide, detecter_format, importer_produits, lire_lignes
+from .mesures import chrono, requetes_lentes
+from .pagination import ClassementPagination, KeysetPagination
+from .throttling import ProtectionAuthentificationMixin, stats as auth_stats
+
 from .serializers import (
     UserSerializer,
     RegisterSerializer,
     LoginSerializer,
+    AgriculteurSerializer,
     CategorieSerializer,
     ProduitSerializer,
     ProduitPhotoSerializer,
     AvisSerializer,
     PanierSerializer,
     PanierItemSerializer,
+    PanierOperationSerializer,
     AgenceLivraisonSerializer
 )
 
+logger = logging.getLogger(__name__)
+
+# ------------------------
+# Forme des requêtes (select_related / prefetch_related)
+# ------------------------
+# Chaque vue déclare ici ce que ses serializers vont lire, pour qu'une liste
+# coûte un nombre constant de requêtes quel que soit le nombre de lignes.
+
+# Les viewsets déclarent la même chose par champ (prefetch_champs,
+# select_champs...) : avec ?fields= / ?omit=, seul ce qui est rendu est chargé
+# (voir api/fieldsets.py).
+
+# Un produit sérialisé lit ses photos (ProduitSerializer.images)
+PRODUIT_PREFETCH = ("photos",)
+
+# Un item de panier embarque le produit complet et ses photos
+PANIER_ITEM_QUERYSET = PanierItem.objects.select_related("produit").prefetch_related("produit__photos")
+
+# Un panier embarque ses items (et donc leurs produits)
+PANIER_ITEMS_PREFETCH = Prefetch("items", queryset=PANIER_ITEM_QUERYSET)
+
+
 # ------------------------
 # Authentification
 # ------------------------
 
-class RegisterView(generics.CreateAPIView):
+# Les trois vues hachent un mot de passe : limitées par IP et par email
+# avant tout traitement (voir api/throttling.py)
+
+class RegisterView(ProtectionAuthentificationMixin, generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = RegisterSerializer
     permission_classes = [AllowAny]
 
 
-class LoginView(generics.GenericAPIView):
+class LoginView(ProtectionAuthentificationMixin, generics.GenericAPIView):
     serializer_class = LoginSerializer
     permission_classes = [AllowAny]
 
@@ -51,7 +98,8 @@ class LoginView(generics.GenericAPIView):
         email = serializer.validated_data["email"]
         password = serializer.validated_data["password"]
 
-        user = authenticate(request, email=email, password=password)
+        with chrono("auth"):
+            user = authenticate(request, email=email, password=password)
 
         if not user:
             return Response({"error": "Identifiants invalides"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -75,11 +123,17 @@ class LoginView(generics.GenericAPIView):
         }, status=status.HTTP_200_OK)
 
 
+class TokenObtainView(ProtectionAuthentificationMixin, TokenObtainPairView):
+    pass
+
+
 # ------------------------
 # Catégories
 # ------------------------
 
-class CategorieViewSet(viewsets.ModelViewSet):
+class CategorieViewSet(ChampsClairsemesMixin, ConditionalGetMixin, CatalogueCacheMixin, LectureRapideMixin, viewsets.ModelViewSet):
+    cache_etiquette = "categories"
+    cache_prefixe = "categorie"
     queryset = Categorie.objects.all()
     serializer_class = CategorieSerializer
     permission_classes = [IsAuthenticated]
@@ -89,18 +143,63 @@ class CategorieViewSet(viewsets.ModelViewSet):
 # Produits & Photos
 # ------------------------
 
-class ProduitViewSet(viewsets.ModelViewSet):
+class ProduitViewSet(ChampsClairsemesMixin, ConditionalGetMixin, CatalogueCacheMixin, LectureRapideMixin, viewsets.ModelViewSet):
+    cache_etiquette = "produits"
+    cache_prefixe = "produit"
     queryset = Produit.objects.all()
+    prefetch_champs = {"images": "photos"}
+    extension_champs = {"categorie": "categorie", "agriculteur": "agriculteur"}
+    # Champs de tri possibles (curseur de pagination)
+    colonnes_requises = ("prix", "quantite", "nom")
+    # Lecture rapide : les photos en une requête pour toute la page
+    lecture_speciale = {"images": "id"}
     serializer_class = ProduitSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Recherche plein texte, filtres et tri côté serveur (voir api/filters.py)
+    filter_backends = [ProduitFilterBackend]
+
+    def rendus_speciaux(self, request, lignes):
+        photos = photos_par_produit([ligne["id"] for ligne in lignes], request)
+        return {"images": lambda produit_id: photos.get(produit_id, [])}
+
+    async def arendus_speciaux(self, request, lignes):
+        photos = await aphotos_par_produit([ligne["id"] for ligne in lignes], request)
+        return {"images": lambda produit_id: photos.get(produit_id, [])}
+
+    @action(detail=False, methods=["get"])
+    def facets(self, request):
+        # Comptes pour la barre latérale, avec les mêmes filtres que la liste
+        queryset = self.filter_queryset(Produit.objects.all())
+        return Response(facettes_en_cache(queryset, request.query_params))
+
+    @action(detail=False, methods=["post"], url_path="import")
+    def importer(self, request):
+        """
+        Import en masse pour l'agriculteur connecté : fichier CSV ou NDJSON
+        (champ `fichier`, colonnes nom, quantite, prix, etat, categorie).
+        Les lignes invalides sont signalées sans bloquer les autres.
+        """
+        fichier = request.FILES.get("fichier")
+        if fichier is None:
+            return Response(
+                {"error": "Fichier manquant", "details": "Le champ 'fichier' est requis"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            format = detecter_format(fichier.name, request.data.get("format"))
+        except FormatInvalide as e:
+            return Response({"error": "Format invalide", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        rapport = importer_produits(lire_lignes(fichier, format), request.user)
+        return Response(rapport, status=status.HTTP_201_CREATED if rapport["crees"] else status.HTTP_400_BAD_REQUEST)
 
     def perform_create(self, serializer):
-        print(f"🔍 User connecté: {self.request.user.id} - {self.request.user.email}")
-        serializer.save(agriculteur=self.request.user)
-        print(f"✅ Produit créé pour agriculteur #{self.request.user.id}")
+        produit = serializer.save(agriculteur=self.request.user)
+        logger.info("Produit #%s créé par l'agriculteur #%s", produit.id, self.request.user.id)
 
 
-class ProduitPhotoViewSet(viewsets.ModelViewSet):
+class ProduitPhotoViewSet(ChampsClairsemesMixin, ConditionalGetMixin, viewsets.ModelViewSet):
     queryset = ProduitPhoto.objects.all()
     serializer_class = ProduitPhotoSerializer
     permission_classes = [IsAuthenticated]
@@ -110,27 +209,63 @@ class ProduitPhotoViewSet(viewsets.ModelViewSet):
 # Avis
 # ------------------------
 
-class AvisViewSet(viewsets.ModelViewSet):
+class AvisViewSet(ChampsClairsemesMixin, viewsets.ModelViewSet):
     queryset = Avis.objects.all()
+    select_champs = {"auteur": "auteur"}
+    extension_champs = {"cible": "cible__user"}
     serializer_class = AvisSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
+    # Les agrégats de note de l'agriculteur (api/notes.py, par les signaux)
+    # évoluent dans la même transaction que l'avis
+    @transaction.atomic
     def perform_create(self, serializer):
         serializer.save(auteur=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        instance.delete()
+
+
+# ------------------------
+# Agriculteurs
+# ------------------------
+
+class AgriculteurViewSet(ChampsClairsemesMixin, viewsets.ReadOnlyModelViewSet):
+    # Classement par note : une seule requête servie par agriculteur_classement_idx
+    queryset = AgriculteurProfile.objects.order_by("-note_moyenne", "-nb_avis", "id")
+    select_champs = {"user": "user"}
+    colonnes_requises = ("note_moyenne", "nb_avis")
+    serializer_class = AgriculteurSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = ClassementPagination
+
 
 # ------------------------
 # Panier - Vues existantes
 # ------------------------
 
-class PanierViewSet(viewsets.ModelViewSet):
+class PanierViewSet(ChampsClairsemesMixin, viewsets.ModelViewSet):
     queryset = Panier.objects.all()
     serializer_class = PanierSerializer
     permission_classes = [IsAuthenticated]
+    prefetch_champs = {"items": "items", "items.produit.images": "items__produit__photos"}
+
+    def relations(self):
+        select, prefetch = super().relations()
+        if self.selection().rendu("items.produit"):
+            # Les lignes et leur produit en une seule requête
+            prefetch[0] = Prefetch("items", queryset=PanierItem.objects.select_related("produit"))
+        return select, prefetch
 
     def get_queryset(self):
         # Retourner seulement le panier de l'utilisateur connecté
-        return Panier.objects.filter(acheteur=self.request.user)
+        return super().get_queryset().filter(acheteur=self.request.user)
 
     def list(self, request, *args, **kwargs):
         # Récupérer ou créer le panier de l'utilisateur
@@ -138,6 +273,7 @@ class PanierViewSet(viewsets.ModelViewSet):
             acheteur=request.user,
             statut="EN_COURS"
         )
+        prefetch_related_objects([panier], *self.relations()[1])
         serializer = self.get_serializer(panier)
         return Response(serializer.data)
 
@@ -145,10 +281,12 @@ class PanierViewSet(viewsets.ModelViewSet):
         serializer.save(acheteur=self.request.user)
 
 
-class PanierItemViewSet(viewsets.ModelViewSet):
+class PanierItemViewSet(ChampsClairsemesMixin, viewsets.ModelViewSet):
     queryset = PanierItem.objects.all()
     serializer_class = PanierItemSerializer
     permission_classes = [IsAuthenticated]
+    select_champs = {"produit": "produit"}
+    prefetch_champs = {"produit.images": "produit__photos"}
 
     def perform_create(self, serializer):
         # Récupérer le panier de l'utilisateur
@@ -161,87 +299,59 @@ class PanierItemViewSet(viewsets.ModelViewSet):
 
     def get_queryset(self):
         # Retourner seulement les items du panier de l'utilisateur
-        return PanierItem.objects.filter(panier__acheteur=self.request.user)
+        return super().get_queryset().filter(panier__acheteur=self.request.user)
+
 
 
+# ------------------------
+# Commandes
+# ------------------------
 
-##############################
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def creer_commande(request):
     """
     Créer une commande à partir du panier de l'utilisateur
+    (vérification et décrément du stock dans la même transaction, voir api/commandes.py)
     """
     try:
-        agence_id = request.data.get('agence_livraison')
-        
-        if not agence_id:
-            return Response(
-                {'error': 'Agence de livraison requise'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Récupérer le panier EN_COURS de l'utilisateur
-        panier = Panier.objects.filter(
-            acheteur=request.user,
-            statut='EN_COURS'
-        ).first()
-        
-        if not panier:
-            return Response(
-                {'error': 'Aucun panier en cours'},
-                status=status.HTTP_404_NOT_FOUND
-            )
-        
-        if not panier.items.exists():
-            return Response(
-                {'error': 'Le panier est vide'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Vérifier que l'agence existe
         try:
-            agence = AgenceLivraison.objects.get(id=agence_id)
-        except AgenceLivraison.DoesNotExist:
+            # Agence de livraison : id ou nom, vérifiée avant la validation
+            panier, agence = passer_commande(request.user, request.data.get('agence_livraison'))
+        except PanierIntrouvable as e:
+            return Response({'error': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except (PanierVide, AgenceInconnue) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StockInsuffisant as e:
             return Response(
-                {'error': 'Agence introuvable'},
-                status=status.HTTP_404_NOT_FOUND
+                {'error': str(e), 'details': e.details},
+                status=status.HTTP_409_CONFLICT
             )
-        
-        # Calculer le montant total
-        montant_total = sum(
-            item.produit.prix * item.quantite 
-            for item in panier.items.all()
-        )
-        
-        # Mettre à jour le panier
-        panier.statut = 'VALIDE'
-        panier.montant_total = montant_total
-        panier.save()
-        
-        print(f"✅ Commande créée: Panier #{panier.id}, Montant: {montant_total} FCFA")
-        
+
+        logger.info("Commande créée : panier #%s, montant %s FCFA", panier.id, panier.montant_total)
+
         return Response({
             'success': True,
             'message': 'Commande créée avec succès',
             'id': panier.id,
-            'montant_total': str(montant_total),
+            'panier_id': panier.id,
+            'statut': panier.statut,
+            'montant_total': str(panier.montant_total),
             'agence': {
                 'id': agence.id,
                 'nom': agence.nom_agence,
                 'localite': agence.localite,
-            }
+            } if agence else None
         }, status=status.HTTP_201_CREATED)
-        
+
     except Exception as e:
-        print(f"❌ Erreur création commande: {e}")
+        logger.exception("Erreur à la création de la commande")
         return Response(
             {'error': f'Erreur serveur: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
-
 # ------------------------
 # Nouvelles vues pour le panier (simplifiées)
 # ------------------------
@@ -262,10 +372,17 @@ def ajouter_au_panier_simple(request):
                 {"error": "ID produit manquant", "details": "Le champ 'produit' est requis"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        quantite = int(quantite)
+        if quantite < 1:
+            return Response(
+                {"error": "Quantité invalide", "details": "La quantité doit être un entier positif"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         # Vérifier si le produit existe
         try:
-            produit = Produit.objects.get(id=produit_id)
+            produit = Produit.objects.prefetch_related(*PRODUIT_PREFETCH).get(id=produit_id)
         except Produit.DoesNotExist:
             return Response(
                 {"error": "Produit non trouvé", "details": f"Le produit avec ID {produit_id} n'existe pas"},
@@ -278,23 +395,12 @@ def ajouter_au_panier_simple(request):
             statut="EN_COURS"
         )
         
-        # Vérifier si le produit est déjà dans le panier
-        try:
-            item = PanierItem.objects.get(panier=panier, produit=produit)
-            item.quantite += int(quantite)
-            item.save()
-            message = "Quantité mise à jour"
-            created_new = False
-        except PanierItem.DoesNotExist:
-            item = PanierItem.objects.create(
-                panier=panier,
-                produit=produit,
-                quantite=quantite
-            )
-            message = "Produit ajouté au panier"
-            created_new = True
-        
-        # Sérialiser la réponse
+        # Ajout atomique : INSERT ... ON CONFLICT DO UPDATE quantite = quantite + n
+        item_id, nouvelle_quantite, created_new = PanierItem.objects.ajouter(panier.id, produit.id, quantite)
+        message = "Produit ajouté au panier" if created_new else "Quantité mise à jour"
+
+        # Sérialiser la réponse (réutilise le produit déjà chargé avec ses photos)
+        item = PanierItem(id=item_id, panier=panier, produit=produit, quantite=nouvelle_quantite)
         serializer = PanierItemSerializer(item)
         
         return Response({
@@ -320,11 +426,11 @@ def get_panier_utilisateur(request):
     Récupérer le panier complet de l'utilisateur connecté
     """
     try:
-        # Récupérer le panier en cours de l'utilisateur
+        # Récupérer le panier en cours de l'utilisateur avec ses lignes
         panier = Panier.objects.filter(
             acheteur=request.user,
             statut="EN_COURS"
-        ).first()
+        ).prefetch_related(PANIER_ITEMS_PREFETCH).first()
         
         if not panier:
             return Response({
@@ -336,24 +442,7 @@ def get_panier_utilisateur(request):
                 "count": 0
             }, status=status.HTTP_200_OK)
         
-        # Récupérer tous les items du panier
-        items = PanierItem.objects.filter(panier=panier).select_related('produit')
-        
-        # Sérialiser les items
-        serializer = PanierItemSerializer(items, many=True)
-        
-        # Calculer le total
-        total = 0
-        for item in items:
-            total += float(item.produit.prix) * item.quantite
-        
-        return Response({
-            "success": True,
-            "panier_id": panier.id,
-            "items": serializer.data,
-            "total": total,
-            "count": items.count()
-        }, status=status.HTTP_200_OK)
+        return Response(contenu_panier(panier), status=status.HTTP_200_OK)
         
     except Exception as e:
         return Response({
@@ -363,6 +452,133 @@ def get_panier_utilisateur(request):
         }, status=status.HTTP_400_BAD_REQUEST)
 
 
+def contenu_panier(panier):
+    """Représentation du panier complet (lignes préchargées avec PANIER_ITEMS_PREFETCH)"""
+    serializer = PanierItemSerializer(panier.items.all(), many=True)
+
+    # Totaux tenus à jour à chaque modification des lignes (voir api/signals.py)
+    return {
+        "success": True,
+        "panier_id": panier.id,
+        "items": serializer.data,
+        "total": float(panier.montant_total),
+        "count": panier.nb_articles
+    }
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def modifier_panier_lot(request):
+    """
+    Applique un lot d'opérations sur le panier en une seule transaction :
+    {"operations": [{"produit": 3, "op": "add|set|remove", "quantite": 2}, ...]}
+    Le lot est appliqué en entier ou pas du tout ; renvoie le panier complet.
+    """
+    donnees = request.data if isinstance(request.data, list) else request.data.get("operations")
+    serializer = PanierOperationSerializer(data=donnees, many=True, max_length=200)
+    if not serializer.is_valid():
+        return Response(
+            {"success": False, "error": "Opérations invalides", "details": serializer.errors},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    operations = [(op["produit"], op["op"], op["quantite"]) for op in serializer.validated_data]
+    if not operations:
+        return Response(
+            {"success": False, "error": "Opérations invalides", "details": "La liste d'opérations est vide"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    produit_ids = {produit_id for produit_id, _, _ in operations}
+    inconnus = produit_ids - set(Produit.objects.filter(id__in=produit_ids).values_list("id", flat=True))
+    if inconnus:
+        return Response(
+            {"success": False, "error": "Produit non trouvé", "details": sorted(inconnus)},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    with transaction.atomic():
+        panier, _ = Panier.objects.get_or_create(acheteur=request.user, statut="EN_COURS")
+        PanierItem.objects.appliquer(panier.id, operations)
+
+    panier.refresh_from_db(fields=["montant_total", "nb_articles"])
+    prefetch_related_objects([panier], PANIER_ITEMS_PREFETCH)
+    return Response(contenu_panier(panier), status=status.HTTP_200_OK)
+
+
+# ------------------------
+# Supervision
+# ------------------------
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def statistiques_cache(request):
+    """
+    Compteurs hits / misses / invalidations du cache du catalogue (processus courant)
+    """
+    return Response(cache_stats.as_dict())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def statistiques_authentification(request):
+    """
+    Compteurs de la limitation des connexions / inscriptions (processus courant)
+    """
+    return Response(auth_stats.as_dict())
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def requetes_lentes_recentes(request):
+    """
+    Dernières requêtes lentes échantillonnées (PERF_LENTES_SEUIL_MS),
+    avec leurs requêtes SQL, de la plus récente à la plus ancienne
+    """
+    return Response(requetes_lentes())
+
+
+# ------------------------
+# Exports (administration)
+# ------------------------
+
+TYPES_EXPORT = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def exporter(request, ressource, sortie, gz=None):
+    """
+    Export complet en flux : /api/exports/<commandes|produits|avis>.<ndjson|csv>[.gz]
+    Filtres : depuis / jusqu_a (dates ISO), statut (commandes, VALIDE par défaut),
+    categorie (produits), note / cible (avis).
+    """
+    lignes = flux_texte(ressource, sortie, request.query_params)
+    try:
+        # Valide les filtres avant d'envoyer les en-têtes
+        premiere = next(lignes, "")
+    except FiltreInvalide as e:
+        return Response({"error": "Filtre invalide", "details": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    nom = f"{ressource}.{sortie}"
+    if gz:
+        # Fichier .gz explicite
+        response = StreamingHttpResponse(
+            flux_octets(chain([premiere], lignes), compresser=True), content_type="application/gzip"
+        )
+        nom += ".gz"
+    else:
+        compresser = "gzip" in request.headers.get("Accept-Encoding", "")
+        response = StreamingHttpResponse(
+            flux_octets(chain([premiere], lignes), compresser=compresser),
+            content_type=f"{TYPES_EXPORT[sortie]}; charset=utf-8",
+        )
+        if compresser:
+            response["Content-Encoding"] = "gzip"
+        response["Vary"] = "Accept-Encoding"
+    response["Content-Disposition"] = f'attachment; filename="{nom}"'
+    return response
+
+
 # ------------------------
 # Contact
 # ------------------------
@@ -390,10 +606,11 @@ class ContactView(generics.GenericAPIView):
 # Agences de Livraison
 # ------------------------
 
-class AgenceLivraisonViewSet(viewsets.ModelViewSet):
+class AgenceLivraisonViewSet(ChampsClairsemesMixin, ConditionalGetMixin, LectureRapideMixin, viewsets.ModelViewSet):
     queryset = AgenceLivraison.objects.all()
     serializer_class = AgenceLivraisonSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = KeysetPagination
 
     @action(detail=True, methods=["get"], url_path="contact-whatsapp")
     def contact_whatsapp(self, request, pk=None):
@@ -404,22 +621,3 @@ class AgenceLivraisonViewSet(viewsets.ModelViewSet):
             "whatsapp_link": f"https://wa.me/{numero}"
         })
 
-
-
-# views.py
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def creer_commande(request):
-    panier = Panier.objects.filter(acheteur=request.user, statut="EN_COURS").first()
-    if not panier:
-        return Response({"error": "Panier non trouvé"}, status=404)
-    
-    # Changer le statut du panier
-    panier.statut = "VALIDE"
-    panier.save()
-    
-    return Response({
-        "message": "Commande créée",
-        "panier_id": panier.id,
-        "statut": panier.statut
-    })
\ No newline at end of file